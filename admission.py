@@ -0,0 +1,317 @@
+"""Admission control: bounded concurrency and queueing per endpoint class.
+
+Routes are grouped into classes by the resource they mostly use (CPU-bound
+NLP analysis, I/O-bound recognition and uploads, media decoding and
+rendering). Each class admits a limited number of concurrent requests and
+queues a limited number more; a request that finds the queue full, or waits
+longer than the queue timeout, is rejected with 503 and a Retry-After
+estimate. Slots are handed to waiters in arrival order.
+
+Under gunicorn the ASGI gateway (gateway.py) admits requests on its event
+loop, before any thread is taken: queued requests are coroutines, and each
+class runs its admitted requests on a thread pool of its own sized to its
+concurrency, so a burst on one class cannot occupy the threads of another.
+Class concurrency is capped below SERVER_THREADS, the size of the pool for
+unclassified routes. Under the development server the limit() decorator
+admits requests on the server thread that is already serving them.
+
+Requests run in one of two lanes. Interactive requests (the default) are
+handed free slots ahead of queued bulk requests and may push the newest bulk
+request out of a full queue; bulk requests (X-Priority: bulk, or an API key
+listed in PRIORITY_BULK_API_KEYS) still receive at least BULK_MIN_SHARE of the
+slots handed out while both lanes are waiting, so backfills keep progressing,
+but never hold more than BULK_MAX_SHARE of a class's slots (always fewer than
+all of them): the rest, and the threads behind them, stay free for
+interactive requests even while a backfill saturates the class.
+
+Limits are per process, like the server's own thread pool.
+"""
+import asyncio
+import collections
+import contextlib
+import functools
+import math
+import threading
+import time
+
+from flask import jsonify, request
+
+from metrics import REGISTRY, Counter, Histogram
+
+LANES = ('interactive', 'bulk')
+# Set in the WSGI environ of requests admitted before they reached the app
+ADMITTED_ENVIRON_KEY = 'admission.admitted'
+
+QUEUE_WAIT_SECONDS = Histogram('admission_queue_wait_seconds', 'Time requests waited for an admission slot',
+                               ('endpoint_class', 'lane'))
+LANE_SECONDS = Histogram('lane_request_duration_seconds', 'Latency of admitted requests including queue wait',
+                         ('endpoint_class', 'lane'))
+REJECTIONS = Counter('admission_rejections_total', 'Requests rejected by admission control',
+                     ('endpoint_class', 'lane', 'reason'))
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; carries the suggested Retry-After in seconds"""
+
+    def __init__(self, endpoint_class, reason, retry_after):
+        super().__init__(f"Server busy ({endpoint_class} requests {reason}), retry in {retry_after}s")
+        self.endpoint_class = endpoint_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Waiter:
+    """A queued request; `outcome` is set to 'granted' or 'evicted' when it is woken.
+
+    `notify`, if given, is also called on wake-up (from whichever thread wakes it).
+    """
+
+    def __init__(self, lane, notify=None):
+        self.lane = lane
+        self.outcome = None
+        self.event = threading.Event()
+        self.notify = notify
+
+    def wake(self, outcome):
+        self.outcome = outcome
+        self.event.set()
+        if self.notify is not None:
+            self.notify()
+
+
+class EndpointClass:
+    """At most `concurrency` requests running, at most `queue_depth` waiting up to `queue_timeout` seconds"""
+
+    def __init__(self, name, concurrency, queue_depth, queue_timeout, bulk_min_share=0.2, bulk_max_share=0.5):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        # Slots bulk requests may hold at once; below `concurrency` whenever there is more than one
+        self.bulk_concurrency = max(1, min(self.concurrency - 1, int(self.concurrency * float(bulk_max_share))))
+        self.queue_depth = max(0, int(queue_depth))
+        self.queue_timeout = float(queue_timeout)
+        # Interactive grants allowed in a row while bulk requests wait (0.2 -> 4)
+        share = min(1.0, max(0.01, float(bulk_min_share)))
+        self.interactive_per_bulk = max(0, math.ceil((1 - share) / share))
+        self.lock = threading.Lock()
+        self.active = 0
+        self.active_bulk = 0
+        self.waiters = {lane: collections.deque() for lane in LANES}
+        self.bulk_passed_over = 0
+        # Smoothed service time, used to estimate Retry-After
+        self.service_seconds = 1.0
+
+    def queued(self):
+        return sum(len(waiters) for waiters in self.waiters.values())
+
+    def retry_after(self):
+        backlog = self.queued() + 1
+        return max(1, math.ceil(self.service_seconds * backlog / self.concurrency))
+
+    def _enqueue(self, lane, notify=None):
+        """Take a free slot (returns None) or queue a Waiter; raises Overloaded if the queue is full"""
+        with self.lock:
+            # Free slots only coexist with waiters that cannot take them (bulk at its limit)
+            if self.active < self.concurrency and not self.waiters[lane] and self._may_start(lane):
+                self.active += 1
+                self.active_bulk += lane == 'bulk'
+                QUEUE_WAIT_SECONDS.observe(0.0, endpoint_class=self.name, lane=lane)
+                return None
+            if self.queued() >= self.queue_depth:
+                if lane != 'interactive' or not self.waiters['bulk']:
+                    REJECTIONS.inc(endpoint_class=self.name, lane=lane, reason='queue_full')
+                    raise Overloaded(self.name, 'queue full', self.retry_after())
+                # Interactive work takes the place of the most recently queued bulk request
+                self.waiters['bulk'].pop().wake('evicted')
+            waiter = Waiter(lane, notify)
+            self.waiters[lane].append(waiter)
+            return waiter
+
+    def _give_up(self, waiter, outcome):
+        """Withdraw a waiter that stopped waiting; returns True if a slot had been granted meanwhile"""
+        with self.lock:
+            # The waiter may have been woken between giving up and taking the lock
+            if waiter.outcome is None:
+                self.waiters[waiter.lane].remove(waiter)
+                waiter.outcome = outcome
+        return waiter.outcome == 'granted'
+
+    def _finish_wait(self, waiter, started):
+        lane = waiter.lane
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, endpoint_class=self.name, lane=lane)
+        if waiter.outcome != 'granted':
+            reason = 'preempted' if waiter.outcome == 'evicted' else 'timeout'
+            REJECTIONS.inc(endpoint_class=self.name, lane=lane, reason=reason)
+            raise Overloaded(self.name, 'queue timeout' if reason == 'timeout' else 'preempted by interactive requests',
+                             self.retry_after())
+
+    def acquire(self, lane='interactive'):
+        """Wait on the calling thread for a slot"""
+        started = time.perf_counter()
+        waiter = self._enqueue(lane)
+        if waiter is None:
+            return
+        if not waiter.event.wait(self.queue_timeout):
+            self._give_up(waiter, 'timeout')
+        self._finish_wait(waiter, started)
+
+    async def acquire_async(self, lane='interactive'):
+        """Wait on the event loop for a slot, without holding a thread"""
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        waiter = self._enqueue(lane, notify=lambda: loop.call_soon_threadsafe(woken.set))
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(woken.wait(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._give_up(waiter, 'timeout')
+        except asyncio.CancelledError:
+            # The client went away while queued; pass on a slot granted in the meantime
+            if self._give_up(waiter, 'cancelled'):
+                self.release(self.service_seconds, lane)
+            raise
+        self._finish_wait(waiter, started)
+
+    def _may_start(self, lane):
+        return lane != 'bulk' or self.active_bulk < self.bulk_concurrency
+
+    def _next_waiter(self):
+        interactive = self.waiters['interactive']
+        bulk = self.waiters['bulk'] if self._may_start('bulk') else None
+        if bulk and (not interactive or self.bulk_passed_over >= self.interactive_per_bulk):
+            self.bulk_passed_over = 0
+            return bulk.popleft()
+        if interactive:
+            if bulk:
+                self.bulk_passed_over += 1
+            return interactive.popleft()
+        return None
+
+    def release(self, service_seconds, lane='interactive'):
+        with self.lock:
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * service_seconds
+            self.active_bulk -= lane == 'bulk'
+            waiter = self._next_waiter()
+            if waiter is not None:
+                # Hand the slot straight to the chosen waiter; `active` stays the same
+                self.active_bulk += waiter.lane == 'bulk'
+                waiter.wake('granted')
+            else:
+                self.active -= 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'concurrency': self.concurrency,
+                'bulk_concurrency': self.bulk_concurrency,
+                'queue_depth': self.queue_depth,
+                'active': self.active,
+                'active_bulk': self.active_bulk,
+                'queued': {lane: len(waiters) for lane, waiters in self.waiters.items()},
+                'service_seconds': round(self.service_seconds, 4)
+            }
+
+
+class AdmissionController:
+    """Flask extension limiting concurrent requests per endpoint class"""
+
+    def __init__(self, app=None):
+        self.classes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('ADMISSION_ENABLED', True))
+        self.bulk_api_keys = set(app.config.get('PRIORITY_BULK_API_KEYS', ()))
+        bulk_min_share = float(app.config.get('BULK_MIN_SHARE', 0.2))
+        bulk_max_share = float(app.config.get('BULK_MAX_SHARE', 0.5))
+        # A class never gets as many threads as the pool serving every other route
+        self.max_concurrency = max(1, int(app.config.get('SERVER_THREADS', 8)) - 1)
+        for name, limits in app.config.get('ADMISSION_CLASSES', {}).items():
+            concurrency = int(limits['concurrency'])
+            if concurrency > self.max_concurrency:
+                print(f"Admission class '{name}': concurrency {concurrency} capped to {self.max_concurrency} "
+                      f"(below SERVER_THREADS)")
+                concurrency = self.max_concurrency
+            self.classes[name] = EndpointClass(name, concurrency, limits['queue_depth'],
+                                               limits.get('queue_timeout', 10), bulk_min_share, bulk_max_share)
+        app.extensions['admission_controller'] = self
+        app.register_error_handler(Overloaded, self._overloaded_response)
+        REGISTRY.add_collector('admission_active_requests', 'Requests holding an admission slot', 'gauge',
+                               ('endpoint_class',), lambda: self._collect('active'))
+        REGISTRY.add_collector('admission_queued_requests', 'Requests waiting for an admission slot', 'gauge',
+                               ('endpoint_class', 'lane'), self._collect_queued)
+
+    def _collect(self, key):
+        return {(name,): endpoint_class.stats()[key] for name, endpoint_class in self.classes.items()}
+
+    def _collect_queued(self):
+        return {(name, lane): count for name, endpoint_class in self.classes.items()
+                for lane, count in endpoint_class.stats()['queued'].items()}
+
+    def lane_for(self, headers):
+        """'bulk' for requests marked as bulk or made with a bulk API key, else 'interactive'"""
+        if headers.get('X-API-Key', '') in self.bulk_api_keys:
+            return 'bulk'
+        return 'bulk' if headers.get('X-Priority', '').lower() == 'bulk' else 'interactive'
+
+    def request_lane(self):
+        return self.lane_for(request.headers)
+
+    def endpoint_class_of(self, view):
+        """The enabled endpoint class a view function was decorated with, or None"""
+        endpoint_class = self.classes.get(getattr(view, 'admission_class', None))
+        return endpoint_class if self.enabled else None
+
+    @contextlib.contextmanager
+    def admitted(self, endpoint_class, lane):
+        """Hold a slot of `endpoint_class` on the calling thread; raises Overloaded"""
+        queued = time.perf_counter()
+        endpoint_class.acquire(lane)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            endpoint_class.release(finished - started, lane)
+            LANE_SECONDS.observe(finished - queued, endpoint_class=endpoint_class.name, lane=lane)
+
+    @contextlib.asynccontextmanager
+    async def admitted_async(self, endpoint_class, lane):
+        """Hold a slot of `endpoint_class`, waiting for it on the event loop; raises Overloaded"""
+        queued = time.perf_counter()
+        await endpoint_class.acquire_async(lane)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            endpoint_class.release(finished - started, lane)
+            LANE_SECONDS.observe(finished - queued, endpoint_class=endpoint_class.name, lane=lane)
+
+    def _overloaded_response(self, error):
+        response = jsonify({"success": False, "error": str(error), "retry_after": error.retry_after})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    def limit(self, name):
+        """Decorator admitting calls of a view through endpoint class `name`.
+
+        Requests the gateway already admitted (see gateway.py) run straight through.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                endpoint_class = self.classes.get(name)
+                if not self.enabled or endpoint_class is None or request.environ.get(ADMITTED_ENVIRON_KEY):
+                    return view(*args, **kwargs)
+                with self.admitted(endpoint_class, self.request_lane()):
+                    return view(*args, **kwargs)
+            wrapper.admission_class = name
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {name: endpoint_class.stats() for name, endpoint_class in self.classes.items()}
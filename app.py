@@ -1,8 +1,32 @@
 import os
-from flask import Flask, render_template, request, jsonify
+import uuid
+import base64
+import json
+import time
+import hashlib
+import io
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, url_for
 from flask_sqlalchemy import SQLAlchemy
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import DeclarativeBase
-from utils import generate_title, transcribe_audio, enhance_description, assign_playlist, generate_hierarchical_number, upload_video, extract_video_frame, create_thumbnail_from_frame, create_custom_thumbnail, thumbnail_to_base64, detect_language_from_audio, extract_audio_features, generate_video_tags, suggest_youtube_category, analyze_content_for_tags, analyze_content_for_playlists
+from werkzeug.utils import secure_filename
+from jobs import JobQueue
+from pipeline import Pipeline
+from progress import ProgressBroker, SubscriberLimitReached, format_sse, is_valid_operation_id, parse_last_event_id
+from profiling import RequestProfiler
+from json_provider import FastJSONProvider
+from compression import ResponseCompressor
+from admission import AdmissionController
+from singleflight import GROUP as SINGLEFLIGHT
+from assets import AssetManifest
+from numbering import allocate_hierarchical_number
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, fallbacks, instrument_app, lru_cache_collector
+from render_cache import RenderCache
+from variants import render_variants, validate_specs
+from media_store import spool_upload, media_path, sidecar_path, derived_dir, store_temporary, load_temporary
+from thumbnails import create_thumbnail_from_frame, create_custom_thumbnail, encode_thumbnail, resize_thumbnail_variants, frame_fingerprint, THUMBNAIL_RENDERER_VERSION, YOUTUBE_THUMBNAIL_MAX_BYTES
+from utils import generate_title, enhance_description, assign_playlist, upload_video, extract_video_frame, select_best_frames, load_or_build_scene_index, generate_storyboard, detect_language_from_audio, detect_language_from_stream, transcribe_stream, generate_video_tags, suggest_youtube_category, analyze_content_for_tags, analyze_content_for_playlists, generate_intelligent_summary, extract_advanced_keywords, categorize_content, extract_named_entities, MEMO_CACHES
 
 class Base(DeclarativeBase):
     pass
@@ -11,16 +35,90 @@ db = SQLAlchemy(model_class=Base)
 app = Flask(__name__)
 
 app.secret_key = os.environ.get("FLASK_SECRET_KEY") or "a secret key"
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///youtube_automation.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///youtube_automation.db")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+app.config["UPLOAD_FOLDER"] = os.path.join(app.instance_path, "uploads")
+app.config["MEDIA_FOLDER"] = os.path.join(app.instance_path, "media")
+app.config["THUMBNAIL_FOLDER"] = os.path.join(app.instance_path, "thumbnails")
+app.config["THUMBNAIL_URL_TTL"] = int(os.environ.get("THUMBNAIL_URL_TTL", 600))
+app.config["RENDER_CACHE_FOLDER"] = os.path.join(app.instance_path, "render_cache")
+app.config["RENDER_CACHE_MAX_BYTES"] = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+app.config["JOB_LEASE_SECONDS"] = int(os.environ.get("JOB_LEASE_SECONDS", 60))
+app.config["PIPELINE_WORKERS"] = int(os.environ.get("PIPELINE_WORKERS", 8))
+app.config["PROGRESS_KEEPALIVE_SECONDS"] = int(os.environ.get("PROGRESS_KEEPALIVE_SECONDS", 15))
+# Open progress streams per worker process; further subscribers get 503
+app.config["PROGRESS_MAX_SUBSCRIBERS"] = int(os.environ.get("PROGRESS_MAX_SUBSCRIBERS", 500))
+# Threads per worker process running views under the ASGI gateway (see asgi.py)
+app.config["SERVER_THREADS"] = int(os.environ.get("GUNICORN_THREADS", 8))
+app.config["PROFILING_FOLDER"] = os.path.join(app.instance_path, "profiles")
+app.config["PROFILING_TOKEN"] = os.environ.get("PROFILING_TOKEN", "")
+app.config["PROFILING_SAMPLE_RATE"] = float(os.environ.get("PROFILING_SAMPLE_RATE", 0.0))
+app.config["PROFILING_INTERVAL"] = float(os.environ.get("PROFILING_INTERVAL", 0.005))
+app.config["PROFILING_KEEP"] = int(os.environ.get("PROFILING_KEEP", 200))
+app.config["JSON_BACKEND"] = os.environ.get("JSON_BACKEND", "orjson")
+app.config["COMPRESS_ENABLED"] = os.environ.get("COMPRESS_ENABLED", "true").lower() == "true"
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+app.config["COMPRESS_GZIP_LEVEL"] = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+app.config["COMPRESS_BROTLI_QUALITY"] = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4))
+app.config["ADMISSION_ENABLED"] = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+# Concurrent and queued requests per endpoint class, per worker process. Under the gateway each class
+# runs on threads of its own; its concurrency stays below SERVER_THREADS (see admission.py)
+app.config["ADMISSION_CLASSES"] = {
+    "cpu": {
+        "concurrency": int(os.environ.get("ADMISSION_CPU_CONCURRENCY",
+                                          min(os.cpu_count() or 2, app.config["SERVER_THREADS"] - 1))),
+        "queue_depth": int(os.environ.get("ADMISSION_CPU_QUEUE", 32)),
+        "queue_timeout": float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 10))
+    },
+    "io": {
+        "concurrency": int(os.environ.get("ADMISSION_IO_CONCURRENCY", app.config["SERVER_THREADS"] - 1)),
+        "queue_depth": int(os.environ.get("ADMISSION_IO_QUEUE", 64)),
+        "queue_timeout": float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 10))
+    },
+    "media": {
+        "concurrency": int(os.environ.get("ADMISSION_MEDIA_CONCURRENCY",
+                                          min(max(2, os.cpu_count() or 2), app.config["SERVER_THREADS"] - 1))),
+        "queue_depth": int(os.environ.get("ADMISSION_MEDIA_QUEUE", 16)),
+        "queue_timeout": float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 10))
+    }
+}
+# Requests marked bulk (X-Priority: bulk or one of these API keys) queue behind interactive ones
+app.config["PRIORITY_BULK_API_KEYS"] = [key for key in os.environ.get("PRIORITY_BULK_API_KEYS", "").split(",") if key]
+app.config["BULK_MIN_SHARE"] = float(os.environ.get("BULK_MIN_SHARE", 0.2))
+# Largest fraction of a class's slots (and threads) bulk requests may hold at once
+app.config["BULK_MAX_SHARE"] = float(os.environ.get("BULK_MAX_SHARE", 0.5))
+app.json = FastJSONProvider(app)
 db.init_app(app)
+progress_broker = ProgressBroker(max_subscribers=app.config["PROGRESS_MAX_SUBSCRIBERS"])
+job_queue = JobQueue(app, db, broker=progress_broker)
+video_pipeline = Pipeline(app)
+render_cache = RenderCache(app.config["RENDER_CACHE_FOLDER"], app.config["RENDER_CACHE_MAX_BYTES"])
+instrument_app(app)
+request_profiler = RequestProfiler(app)
+response_compressor = ResponseCompressor(app)
+admission = AdmissionController(app)
+asset_manifest = AssetManifest(app)
+
+# Cache statistics are only read when /metrics is scraped
+REGISTRY.add_collector('render_cache_lookups_total', 'Render cache lookups by result', 'counter', ('result',),
+                       lambda: {('hit',): render_cache.hits, ('miss',): render_cache.misses})
+REGISTRY.add_collector('render_cache_evictions_total', 'Render cache entries evicted', 'counter', (),
+                       lambda: {(): render_cache.evictions})
+REGISTRY.add_collector('memo_cache_lookups_total', 'In-memory memoization lookups by cache and result', 'counter',
+                       ('cache', 'result'), lru_cache_collector(MEMO_CACHES))
+REGISTRY.add_collector('singleflight_in_flight', 'Distinct coalescable computations currently running', 'gauge', (),
+                       lambda: {(): SINGLEFLIGHT.in_flight()})
+REGISTRY.add_collector('progress_subscribers', 'Open progress event streams', 'gauge', (),
+                       lambda: {(): progress_broker.stats()['subscribers']})
 
 with app.app_context():
     import models
     db.create_all()
+    models.add_missing_columns(db.engine)
 
 @app.route('/')
 def index():
@@ -35,19 +133,32 @@ def download_manual():
     return app.send_static_file('../PRODUCT_MANUAL.md')
 
 @app.route('/generate_title', methods=['POST'])
+@admission.limit('cpu')
 def generate_title_route():
     try:
         content = request.json['content']
         title_options = request.json.get('options', {})
         
-        result = generate_title(content, title_options)
+        # Stored under the same key /process_video uses for this text and title options
+        content_hash = request_content_hash(content, {'title': title_options} if title_options else None)
+        cached = stored_results(content_hash, ['title'], request.json)
+        if cached is not None:
+            result = cached.stage_results()['title']
+        else:
+            with fallbacks() as degraded:
+                result = generate_title(content, title_options)
+            # A fallback taken on a transient failure must not become the stored answer
+            if not degraded:
+                save_content_results(content_hash, 'content', {'title': result})
         
         return jsonify({
             "success": True,
             "titles": result['titles'],
             "analysis": result['analysis'],
             "recommendations": result['recommendations'],
-            "engagement_insights": result.get('engagement_insights', [])
+            "engagement_insights": result.get('engagement_insights', []),
+            "stored": cached is not None,
+            "content_hash": content_hash
         })
     except Exception as e:
         return jsonify({
@@ -58,26 +169,92 @@ def generate_title_route():
             "recommendations": []
         })
 
+def request_operation_id(params):
+    """Id, issued by POST /operations, under which a synchronous request publishes its progress"""
+    operation_id = params.get('operation_id')
+    if is_valid_operation_id(operation_id) and progress_broker.is_known(operation_id):
+        return operation_id
+    return None
+
+def transcription_progress(operation_id):
+    """Progress callback for transcribe_stream publishing percent done and partial transcripts"""
+    def report(fraction, text):
+        progress_broker.publish(operation_id, 'progress', {
+            "stage": "transcribing",
+            "progress": round(fraction, 4) if fraction is not None else None,
+            "partial_transcript": text
+        })
+    return report
+
+def transcribe_video(video_hash, video_path, language, operation_id=None):
+    """(transcribe_stream result, audio features) of a stored video.
+
+    Concurrent requests for the same video and language share one decoding and
+    recognition pass; progress is published to the operation of the request that runs it.
+    """
+    def transcribe():
+        features = {}
+        result = transcribe_stream(video_path, language=language, audio_features=features,
+                                   progress_callback=transcription_progress(operation_id))
+        return result, features
+    return SINGLEFLIGHT.do(('transcribe_video', video_hash, language), transcribe)
+
 @app.route('/transcribe', methods=['POST'])
+@admission.limit('io')
 def transcribe_route():
+    operation_id = request_operation_id(request.form)
     try:
-        audio_file = request.files['audio']
         language = request.form.get('language', 'en-US')
         auto_detect = request.form.get('auto_detect', 'false').lower() == 'true'
         
-        # Auto-detect language if requested
+        # Keyed like the transcription stage of /process_video for the same media and options
+        options = {}
+        if 'language' in request.form:
+            options['language'] = language
         if auto_detect:
-            detected_language = detect_language_from_audio(audio_file)
-            language = detected_language
-            # Reset file pointer after detection
-            audio_file.seek(0)
+            options['auto_detect'] = True
+        
+        if 'audio' not in request.files:
+            # Video upload (or stored video_hash): stream its audio track through ffmpeg
+            video_hash, video_path = resolve_video_source()
+            content_hash = request_content_hash(options=options, video_hash=video_hash)
+        else:
+            audio_file = request.files['audio']
+            content_hash = request_content_hash(options=options, audio=audio_file)
         
-        # Extract audio features
-        features = extract_audio_features(audio_file)
-        audio_file.seek(0)  # Reset file pointer
+        cached = stored_results(content_hash, ['transcription'], request.form)
+        if cached is not None:
+            response = {key: value for key, value in cached.stage_results()['transcription'].items()
+                        if key != 'source'}
+            response.update(stored=True, content_hash=content_hash)
+            progress_broker.publish(operation_id, 'result', response, final=True)
+            return jsonify(response)
         
-        # Transcribe audio with enhanced features
-        result = transcribe_audio(audio_file, language=language)
+        with fallbacks() as degraded:
+            if 'audio' not in request.files:
+                if auto_detect:
+                    progress_broker.publish(operation_id, 'stage', {"stage": "detecting_language"})
+                    language = detect_language_from_stream(video_path)
+                
+                progress_broker.publish(operation_id, 'stage', {"stage": "transcribing", "language": language})
+                result, features = transcribe_video(video_hash, video_path, language, operation_id)
+                features['video_hash'] = video_hash
+                source = 'video'
+            else:
+                # Auto-detect language if requested
+                if auto_detect:
+                    progress_broker.publish(operation_id, 'stage', {"stage": "detecting_language"})
+                    detected_language = detect_language_from_audio(audio_file)
+                    language = detected_language
+                    # Reset file pointer after detection
+                    audio_file.seek(0)
+                
+                # Transcribe audio and extract its features in the same streaming pass
+                features = {}
+                progress_broker.publish(operation_id, 'stage', {"stage": "transcribing", "language": language})
+                result = transcribe_stream(audio_file, language=language, audio_features=features,
+                                           progress_callback=transcription_progress(operation_id))
+                source = 'audio'
         
         if len(result) == 5:
             transcription, summary, confidence, word_count, duration = result
@@ -86,7 +263,7 @@ def transcribe_route():
             transcription, summary = result[:2]
             confidence, word_count, duration = 0.0, 0, 0
         
-        return jsonify({
+        response = {
             "transcription": transcription,
             "summary": summary,
             "confidence": confidence,
@@ -94,9 +271,16 @@ def transcribe_route():
             "duration_seconds": duration,
             "detected_language": language,
             "audio_features": features
-        })
+        }
+        # A failed recognition returns its error as the transcription; only real results are kept
+        if word_count and not degraded:
+            save_content_results(content_hash, source, {'transcription': dict(response, source=source)})
+        response.update(stored=False, content_hash=content_hash)
+        progress_broker.publish(operation_id, 'result', response, final=True)
+        return jsonify(response)
         
     except Exception as e:
+        progress_broker.publish(operation_id, 'error', {"error": str(e)}, final=True)
         return jsonify({
             "transcription": "Error occurred during transcription",
             "summary": "No summary available",
@@ -105,6 +289,7 @@ def transcribe_route():
         })
 
 @app.route('/detect_language', methods=['POST'])
+@admission.limit('io')
 def detect_language_route():
     try:
         audio_file = request.files['audio']
@@ -114,6 +299,7 @@ def detect_language_route():
         return jsonify({"error": str(e), "detected_language": "en-US"})
 
 @app.route('/enhance_description', methods=['POST'])
+@admission.limit('cpu')
 def enhance_description_route():
     try:
         data = request.json
@@ -159,6 +345,7 @@ def enhance_description_route():
         })
 
 @app.route('/analyze_content', methods=['POST'])
+@admission.limit('cpu')
 def analyze_content_route():
     """Endpoint for content analysis without enhancement"""
     try:
@@ -182,6 +369,7 @@ def analyze_content_route():
         return jsonify({"error": str(e)})
 
 @app.route('/assign_playlist', methods=['POST'])
+@admission.limit('cpu')
 def assign_playlist_route():
     """Enhanced playlist assignment endpoint with comprehensive SEO analysis"""
     try:
@@ -196,21 +384,32 @@ def assign_playlist_route():
         if not content:
             return jsonify({'error': 'Content is required for playlist assignment'})
         
-        # Get comprehensive playlist assignment
-        assignment_result = assign_playlist(content, options)
-        
-        if 'error' in assignment_result:
-            return jsonify({'error': assignment_result['error']})
+        content_hash = request_content_hash(content, {'playlist': options} if options else None)
+        cached = stored_results(content_hash, ['playlist'], data)
+        if cached is not None:
+            assignment_result = cached.stage_results()['playlist']
+        else:
+            # Get comprehensive playlist assignment
+            with fallbacks() as degraded:
+                assignment_result = assign_playlist(content, options)
+            
+            if 'error' in assignment_result:
+                return jsonify({'error': assignment_result['error']})
+            if not degraded:
+                save_content_results(content_hash, 'content', {'playlist': assignment_result})
         
         return jsonify({
             'assignment': assignment_result,
-            'success': True
+            'success': True,
+            'stored': cached is not None,
+            'content_hash': content_hash
         })
         
     except Exception as e:
         return jsonify({'error': f'Error assigning playlist: {str(e)}'})
 
 @app.route('/analyze_playlist_content', methods=['POST'])
+@admission.limit('cpu')
 def analyze_playlist_content_route():
     """Endpoint for content analysis specifically for playlist assignment"""
     try:
@@ -236,86 +435,584 @@ def analyze_playlist_content_route():
 
 @app.route('/generate_number', methods=['POST'])
 def generate_number_route():
-    video_type = request.json['video_type']
-    parent_number = request.json.get('parent_number')
-    number = generate_hierarchical_number(video_type, parent_number)
-    return jsonify({"number": number})
+    """Reserve the next hierarchical number for a main video, follow-up or clarification"""
+    try:
+        number = allocate_hierarchical_number(db.session, request.json['video_type'], request.json.get('parent_number'))
+        db.session.commit()
+        return jsonify({"number": number})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)})
+
+@job_queue.handler('upload_video')
+def upload_video_job(payload, report_progress):
+    """Background handler for queued YouTube uploads"""
+    try:
+        video_id = upload_video(
+            payload['title'],
+            payload['description'],
+            payload['tags'],
+            payload['category_id'],
+            payload['privacy_status'],
+            payload['file_path'],
+            progress_callback=lambda fraction: report_progress(fraction, stage='uploading')
+        )
+
+        if not video_id:
+            raise Exception("Failed to upload video")
+
+        return {"video_id": video_id}
+    finally:
+        # Failed jobs are not retried, so the spooled file is not needed either way. A
+        # process that dies mid-upload never gets here and keeps it for the job's recovery.
+        if os.path.exists(payload['file_path']):
+            os.remove(payload['file_path'])
 
 @app.route('/upload_video', methods=['POST'])
+@admission.limit('io')
 def upload_video_route():
-    title = request.form['title']
-    description = request.form['description']
-    tags = request.form['tags'].split(',')
-    category_id = request.form['category_id']
-    privacy_status = request.form['privacy_status']
-    video_file = request.files['video']
-    
-    temp_path = f"temp_{video_file.filename}"
-    video_file.save(temp_path)
-    
-    video_id = upload_video(title, description, tags, category_id, privacy_status, temp_path)
-    
-    os.remove(temp_path)
-    
-    if video_id:
-        return jsonify({"success": True, "video_id": video_id})
-    else:
-        return jsonify({"success": False, "error": "Failed to upload video"})
+    """Accept an upload and queue it; the YouTube transfer runs in the background"""
+    try:
+        title = request.form['title']
+        description = request.form['description']
+        tags = request.form['tags'].split(',')
+        category_id = request.form['category_id']
+        privacy_status = request.form['privacy_status']
+        video_file = request.files['video']
+
+        # Spool the file somewhere that outlives the request (and the process)
+        os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+        spool_name = f"{uuid.uuid4().hex}_{secure_filename(video_file.filename) or 'video'}"
+        file_path = os.path.join(app.config["UPLOAD_FOLDER"], spool_name)
+        video_file.save(file_path)
+
+        job_id = job_queue.submit('upload_video', {
+            "title": title,
+            "description": description,
+            "tags": tags,
+            "category_id": category_id,
+            "privacy_status": privacy_status,
+            "file_path": file_path
+        })
+
+        return jsonify({"success": True, "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/jobs/<job_id>')
+def job_status_route(job_id):
+    """Report state, progress and result of a background job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+
+    response = {"success": True, **job}
+    if job['result'] and 'video_id' in job['result']:
+        response['video_id'] = job['result']['video_id']
+    return jsonify(response)
+
+@app.route('/operations', methods=['POST'])
+def register_operation_route():
+    """Issue an operation id to send with a synchronous request and follow at /events/<id>"""
+    operation_id = progress_broker.register()
+    return jsonify({"success": True, "operation_id": operation_id,
+                    "events_url": url_for('progress_events_route', operation_id=operation_id)})
+
+def open_progress_stream(operation_id, last_event_id=0):
+    """Subscribe to the progress of a registered operation or a job.
+
+    Raises LookupError for any other id, and SubscriberLimitReached when this process
+    already serves PROGRESS_MAX_SUBSCRIBERS streams. Also used by the ASGI gateway,
+    which serves these streams on its event loop.
+    """
+    if not is_valid_operation_id(operation_id):
+        raise LookupError("Invalid operation id")
+    if progress_broker.is_known(operation_id):
+        return progress_broker.subscribe(operation_id, last_event_id, app.config["PROGRESS_KEEPALIVE_SECONDS"])
+    if job_queue.get(operation_id) is None:
+        raise LookupError("Unknown operation id")
+    # A job submitted through another server process: relay its database row
+    subscription = progress_broker.subscribe(operation_id, last_event_id, app.config["PROGRESS_KEEPALIVE_SECONDS"])
+    job_queue.follow(operation_id)
+    return subscription
+
+@app.route('/events/<operation_id>')
+def progress_events_route(operation_id):
+    """Server-Sent Events stream of an operation's progress.
+
+    `operation_id` is a job id or an id issued by POST /operations. Reconnecting
+    clients resume after Last-Event-ID. Comment lines are sent while idle so proxies
+    keep the connection open; the stream ends after the final 'result' or 'error'
+    event. Under gunicorn the gateway in asgi.py serves this route instead, without
+    holding a thread per stream.
+    """
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    try:
+        subscription = open_progress_stream(operation_id, last_event_id)
+    except LookupError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except SubscriberLimitReached as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {'Retry-After': str(e.retry_after)}
+
+    def stream():
+        yield "retry: 3000\n\n"
+        for entry in subscription:
+            yield ": keepalive\n\n" if entry is None else format_sse(*entry)
+
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.call_on_close(subscription.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Disable response buffering in nginx-style reverse proxies
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/events/stats')
+def progress_stats_route():
+    """Progress channel and subscriber counts for monitoring"""
+    return jsonify({"progress": progress_broker.stats()})
+
+def resolve_video_source():
+    """Return (video_hash, path) for an uploaded 'video' file or a previously stored 'video_hash'"""
+    if 'video' in request.files:
+        return spool_upload(request.files['video'], app.config["MEDIA_FOLDER"])
+
+    video_hash = request.form.get('video_hash') or (request.get_json(silent=True) or {}).get('video_hash', '')
+    path = media_path(app.config["MEDIA_FOLDER"], video_hash)
+    if path is None:
+        raise ValueError("Provide a video file or the video_hash of a previously uploaded video")
+    return video_hash, path
+
+@app.route('/scene_index', methods=['POST'])
+@admission.limit('media')
+def scene_index_route():
+    """Detect scenes in a video and persist the index so thumbnails can seek straight to them"""
+    try:
+        video_hash, video_path = resolve_video_source()
+        index_path = sidecar_path(app.config["MEDIA_FOLDER"], video_hash, 'scenes')
+        index = load_or_build_scene_index(video_path, index_path)
+
+        if index is None:
+            return jsonify({"success": False, "error": "Failed to detect scenes"})
+
+        return jsonify({
+            "success": True,
+            "video_hash": video_hash,
+            "duration_seconds": index['duration_seconds'],
+            "scenes": index['scenes']
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+def storyboard_paths(video_hash, interval, tile_width):
+    name = f"storyboard-{interval:g}-{tile_width}"
+    return (sidecar_path(app.config["MEDIA_FOLDER"], video_hash, name),
+            derived_dir(app.config["MEDIA_FOLDER"], video_hash, name))
+
+def storyboard_with_urls(video_hash, index):
+    name = f"storyboard-{index['interval_seconds']:g}-{index['tile_width']}"
+    for sheet in index['sheets']:
+        sheet['url'] = f"/storyboard/{video_hash}/{name}/{sheet['file']}"
+    return index
+
+@job_queue.handler('storyboard')
+def storyboard_job(payload, report_progress):
+    """Background handler building storyboard sheets for long videos"""
+    video_path = media_path(app.config["MEDIA_FOLDER"], payload['video_hash'])
+    index_path, output_dir = storyboard_paths(payload['video_hash'], payload['interval'], payload['tile_width'])
+
+    def sheet_written(fraction, sheets):
+        report_progress(fraction if fraction is not None else 0.0, stage='storyboard', sheets=sheets)
+
+    index = generate_storyboard(video_path, output_dir, payload['interval'], payload['tile_width'],
+                                progress_callback=sheet_written)
+    if index is None:
+        raise Exception("Failed to generate storyboard")
+
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(index_path + '.tmp', index_path)
+
+    return storyboard_with_urls(payload['video_hash'], index)
+
+@app.route('/storyboard', methods=['POST'])
+@admission.limit('media')
+def storyboard_route():
+    """Return the storyboard index for a video, queueing its generation on first request"""
+    try:
+        video_hash, _ = resolve_video_source()
+        params = request.form if request.form else (request.get_json(silent=True) or {})
+        interval = max(1.0, float(params.get('interval', 10)))
+        tile_width = min(480, max(64, int(params.get('tile_width', 160))))
+
+        index_path, _ = storyboard_paths(video_hash, interval, tile_width)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            return jsonify({"success": True, "video_hash": video_hash, "storyboard": storyboard_with_urls(video_hash, index)})
+
+        # Requests arriving while the storyboard is being generated follow the same job
+        job_id = job_queue.submit('storyboard', {"video_hash": video_hash, "interval": interval, "tile_width": tile_width},
+                                  unique=True)
+        return jsonify({"success": True, "video_hash": video_hash, "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/storyboard/<video_hash>/<name>/<filename>')
+def storyboard_sheet_route(video_hash, name, filename):
+    """Serve a storyboard sprite sheet; sheets never change, so they are cached for a long time"""
+    try:
+        sheet_dir = derived_dir(app.config["MEDIA_FOLDER"], video_hash, secure_filename(name))
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid video hash"}), 404
+    return send_from_directory(sheet_dir, secure_filename(filename), max_age=31536000)
 
 @app.route('/generate_thumbnail_from_video', methods=['POST'])
+@admission.limit('media')
 def generate_thumbnail_from_video_route():
+    operation_id = request_operation_id(request.form)
     try:
-        video_file = request.files['video']
         title = request.form.get('title', '')
         timestamp = request.form.get('timestamp')
+        scene = request.form.get('scene')
+        mode = request.form.get('mode', 'timestamp')
         
         if timestamp:
             timestamp = float(timestamp)
         else:
             timestamp = None
         
-        # Save video temporarily
-        temp_path = f"temp_{video_file.filename}"
-        video_file.save(temp_path)
+        # Store the video by content hash so follow-up requests can reuse it
+        progress_broker.publish(operation_id, 'stage', {"stage": "storing_video"})
+        video_hash, video_path = resolve_video_source()
         
-        # Extract frame
-        frame = extract_video_frame(temp_path, timestamp)
+        # A thumbnail rendered before for this video, frame choice, title and encoding is
+        # returned without decoding or scoring any frame
+        encoding = thumbnail_output_options(request.form)
+        choice = {"mode": mode, "timestamp": timestamp, "scene": scene or None,
+                  "format": encoding['format'], "quality": encoding['quality'], "max_bytes": encoding['max_bytes']}
+        if mode == 'best':
+            choice.update(candidates=int(request.form.get('candidates', 24)), top_k=int(request.form.get('top_k', 3)))
+        content_hash = request_content_hash(title, {'thumbnail': choice}, video_hash=video_hash)
+        cached = stored_results(content_hash, ['thumbnail'], request.form)
+        if cached is not None:
+            stored = cached.stage_results()['thumbnail']
+            extra = {"video_hash": video_hash, "stored": True, "content_hash": content_hash}
+            if 'candidates' in stored:
+                extra["candidates"] = stored['candidates']
+            # Sizes missing from the render cache are derived from the stored image
+            response = thumbnail_response(lambda: Image.open(io.BytesIO(cached.thumbnail)).convert('RGB'),
+                                          stored['render_inputs'], encoding, extra)
+            progress_broker.publish(operation_id, 'result', {"stage": "done", "video_hash": video_hash}, final=True)
+            return response
         
-        # Clean up temp file
-        os.remove(temp_path)
+        if scene is not None and scene != '':
+            # Seek straight to the scene's representative frame using the persisted index
+            index_path = sidecar_path(app.config["MEDIA_FOLDER"], video_hash, 'scenes')
+            index = load_or_build_scene_index(video_path, index_path)
+            scenes = index['scenes'] if index else []
+            scene = int(scene)
+            if not 0 <= scene < len(scenes):
+                return jsonify({"success": False, "error": f"Scene {scene} does not exist"})
+            timestamp = scenes[scene]['representative_timestamp']
+        
+        candidates = []
+        with fallbacks() as degraded:
+            if mode == 'best':
+                # Score sampled frames and keep the sharpest, best exposed ones
+                progress_broker.publish(operation_id, 'stage', {"stage": "selecting_frames", "video_hash": video_hash})
+                best_frames = select_best_frames(video_path, choice['candidates'], choice['top_k'])
+                frame = best_frames[0]['frame'] if best_frames else extract_video_frame(video_path, timestamp)
+                candidates = [{key: value for key, value in candidate.items() if key != 'frame'} for candidate in best_frames]
+            else:
+                # Extract frame
+                progress_broker.publish(operation_id, 'stage', {"stage": "extracting_frame", "video_hash": video_hash})
+                frame = extract_video_frame(video_path, timestamp)
         
         if frame is not None:
-            # Create thumbnail
-            thumbnail = create_thumbnail_from_frame(frame, title)
-            if thumbnail:
-                # Convert to base64 for web display
-                thumbnail_b64 = thumbnail_to_base64(thumbnail)
-                return jsonify({"success": True, "thumbnail": thumbnail_b64})
+            progress_broker.publish(operation_id, 'stage', {"stage": "rendering", "video_hash": video_hash})
+            extra = {"video_hash": video_hash, "stored": False, "content_hash": content_hash}
+            if mode == 'best':
+                extra["candidates"] = candidates
+            render_inputs = {"renderer": "frame", "title": title, "frame": frame_fingerprint(frame)}
+            render = lambda: create_thumbnail_from_frame(frame, title)
+            # Create thumbnail (skipped entirely when this frame and title were rendered before)
+            response = thumbnail_response(render, render_inputs, encoding, extra)
+            
+            data, meta = cached_thumbnail(render_inputs, encoding, 'maxres', render)
+            result = dict(meta, title=title, bytes=len(data), render_inputs=render_inputs,
+                          timestamp=candidates[0]['timestamp'] if candidates else timestamp)
+            if mode == 'best':
+                result['candidates'] = candidates
+            if not degraded:
+                save_content_results(content_hash, 'video', {'thumbnail': result}, data)
+            progress_broker.publish(operation_id, 'result', {"stage": "done", "video_hash": video_hash}, final=True)
+            return response
         
+        progress_broker.publish(operation_id, 'error', {"error": "Failed to generate thumbnail from video"}, final=True)
         return jsonify({"success": False, "error": "Failed to generate thumbnail from video"})
+    except Exception as e:
+        progress_broker.publish(operation_id, 'error', {"error": str(e)}, final=True)
+        return jsonify({"success": False, "error": str(e)})
+
+def thumbnail_output_options(params):
+    """Read encoding/response options shared by the thumbnail routes from JSON or form data"""
+    sizes = params.get('sizes') or []
+    if isinstance(sizes, str):
+        sizes = [size.strip() for size in sizes.split(',') if size.strip()]
+
+    max_bytes = params.get('max_bytes')
+    if str(params.get('size_budget', 'false')).lower() == 'true':
+        max_bytes = max_bytes or YOUTUBE_THUMBNAIL_MAX_BYTES
+
+    return {
+        'format': params.get('format', 'png'),
+        'quality': int(params.get('quality', 90)),
+        'max_bytes': int(max_bytes) if max_bytes else None,
+        'sizes': sizes,
+        'response': params.get('response', 'json')
+    }
+
+def thumbnail_cache_key(render_inputs, options):
+    """Render cache key for a thumbnail's inputs and encoding settings (before sizing)"""
+    return RenderCache.make_key(
+        renderer=THUMBNAIL_RENDERER_VERSION,
+        inputs=render_inputs,
+        format=options['format'],
+        quality=options['quality'],
+        max_bytes=options['max_bytes']
+    )
+
+def cached_thumbnail(render_inputs, options, size_name, get_image):
+    """Encoded thumbnail (data, meta) at `size_name`, from the render cache or rendered and stored.
+
+    `get_image()` returns the full-size render and is only called on a miss; other sizes
+    are downscaled from it.
+    """
+    key = RenderCache.make_key(base=thumbnail_cache_key(render_inputs, options), size=size_name)
+
+    def render():
+        image = get_image()
+        if image is None:
+            raise Exception("Failed to render thumbnail")
+        if size_name != 'maxres':
+            image = resize_thumbnail_variants(image, [size_name])[size_name]
+        data, fmt, mime_type, quality = encode_thumbnail(image, options['format'], options['quality'], options['max_bytes'])
+        meta = {"format": fmt, "mime_type": mime_type, "quality": quality, "width": image.width, "height": image.height}
+        render_cache.put(key, data, meta)
+        return data, meta
+
+    cached = render_cache.get(key)
+    if cached is None:
+        # Concurrent misses on the same key render once
+        cached = SINGLEFLIGHT.do(('render_thumbnail', key), render)
+    return cached
+
+def thumbnail_response(render, render_inputs, options, extra=None):
+    """Return a thumbnail inline (base64), as raw bytes or as a short-lived URL.
+
+    Encoded outputs are served from the render cache when the same inputs were rendered
+    before; `render` is only called (once) on a miss. JSON and binary responses carry an
+    ETag so clients can revalidate with If-None-Match.
+    """
+    base_key = thumbnail_cache_key(render_inputs, options)
+    size_names = ['maxres'] if options['response'] == 'binary' else ['maxres'] + options['sizes']
+    etag = RenderCache.make_key(base=base_key, sizes=size_names, response=options['response'], extra=extra)
+
+    if options['response'] != 'url' and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    # Every size missing from the cache is derived from the same single render
+    rendered = {}
+    def get_image():
+        if 'image' not in rendered:
+            rendered['image'] = render()
+        return rendered['image']
+
+    outputs = {name: cached_thumbnail(render_inputs, options, name, get_image) for name in size_names}
+
+    data, meta = outputs['maxres']
+    if options['response'] == 'binary':
+        response = app.response_class(data, mimetype=meta['mime_type'])
+        response.headers['Content-Disposition'] = f'inline; filename="thumbnail.{meta["format"]}"'
+        response.headers['X-Render-Cache'] = 'miss' if rendered else 'hit'
+        response.set_etag(etag)
+        return response
+
+    def describe(encoded, entry_meta):
+        entry = {"width": entry_meta['width'], "height": entry_meta['height'], "bytes": len(encoded)}
+        if options['response'] == 'url':
+            token = store_temporary(app.config["THUMBNAIL_FOLDER"], encoded, entry_meta['format'], app.config["THUMBNAIL_URL_TTL"])
+            entry["url"] = url_for('temporary_thumbnail_route', token=token)
+        else:
+            entry["thumbnail"] = base64.b64encode(encoded).decode()
+        return entry
+
+    result = {"success": True, "format": meta['format'], "mime_type": meta['mime_type'], "quality": meta['quality']}
+    result.update(describe(data, meta))
+
+    # Preview sizes are downscaled from the same render and encoded with the same settings
+    if options['sizes']:
+        result["variants"] = {name: describe(*outputs[name]) for name in options['sizes']}
+
+    if extra:
+        result.update(extra)
+    response = jsonify(result)
+    response.headers['X-Render-Cache'] = 'miss' if rendered else 'hit'
+    if options['response'] != 'url':
+        response.set_etag(etag)
+    return response
+
+@app.route('/metrics')
+def metrics_route():
+    """Prometheus text-format metrics of this server process"""
+    return app.response_class(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/admin/profiles')
+def list_profiles_route():
+    """Stored request profiles, slowest first (?sort=recent for newest); admin only"""
+    if not request_profiler.is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    limit = min(200, max(1, int(request.args.get('limit', 20))))
+    profiles = request_profiler.list_profiles(request.args.get('sort', 'slowest'), limit, request.args.get('route'))
+    for profile in profiles:
+        profile['download_url'] = url_for('download_profile_route', request_id=profile['request_id'])
+    return jsonify({"success": True, "profiles": profiles})
+
+@app.route('/admin/profiles/<request_id>')
+def download_profile_route(request_id):
+    """Collapsed-stack profile of one request, ready for flamegraph.pl or speedscope; admin only"""
+    if not request_profiler.is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    path = request_profiler.collapsed_path(request_id)
+    if path is None:
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=f"{request_id}.collapsed")
+
+@app.route('/cache/stats')
+def cache_stats_route():
+    """Render cache statistics for monitoring"""
+    return jsonify({"render_cache": render_cache.stats()})
+
+@app.route('/thumbnails/<token>')
+def temporary_thumbnail_route(token):
+    """Serve a rendered thumbnail handed out by URL; links expire after THUMBNAIL_URL_TTL seconds"""
+    path = load_temporary(app.config["THUMBNAIL_FOLDER"], token, app.config["THUMBNAIL_URL_TTL"])
+    if path is None:
+        return jsonify({"success": False, "error": "Thumbnail not found or expired"}), 404
+    return send_file(path, max_age=app.config["THUMBNAIL_URL_TTL"])
+
+@app.route('/generate_thumbnail_variants', methods=['POST'])
+@admission.limit('media')
+def generate_thumbnail_variants_route():
+    """Render several thumbnail variants for one video in parallel from frames decoded once"""
+    try:
+        started = time.perf_counter()
+        params = request.form if request.files or request.form else (request.get_json() or {})
+        specs = params.get('variants') or []
+        if isinstance(specs, str):
+            specs = json.loads(specs)
+        # Reject oversized or malformed requests before storing the video or decoding frames
+        validate_specs(specs)
+        response_mode = params.get('response', 'json')
+
+        video_hash, video_path = resolve_video_source()
+
+        # Resolve every variant's source to a timestamp and decode each distinct frame once
+        scenes = None
+        frames = {}
+        for spec in specs:
+            if spec.get('scene') is not None:
+                if scenes is None:
+                    index_path = sidecar_path(app.config["MEDIA_FOLDER"], video_hash, 'scenes')
+                    index = load_or_build_scene_index(video_path, index_path)
+                    scenes = index['scenes'] if index else []
+                scene = int(spec['scene'])
+                if not 0 <= scene < len(scenes):
+                    return jsonify({"success": False, "error": f"Scene {scene} does not exist"})
+                timestamp = scenes[scene]['representative_timestamp']
+            else:
+                timestamp = spec.get('timestamp')
+
+            key = 'middle' if timestamp is None else f"{float(timestamp):.3f}"
+            if key not in frames:
+                frame = extract_video_frame(video_path, None if timestamp is None else float(timestamp))
+                if frame is None:
+                    return jsonify({"success": False, "error": f"Unable to extract frame at {key}"})
+                frames[key] = frame
+            spec['frame'] = key
+        decode_ms = (time.perf_counter() - started) * 1000
+
+        results = render_variants(frames, specs)
+
+        variants = []
+        for number, (spec, result) in enumerate(zip(specs, results)):
+            entry = {"index": number, "source": spec['frame']}
+            if 'error' in result:
+                entry["error"] = result['error']
+            else:
+                entry.update({
+                    "format": result['format'],
+                    "mime_type": result['mime_type'],
+                    "bytes": len(result['data']),
+                    "render_ms": result['render_ms']
+                })
+                if response_mode == 'url':
+                    token = store_temporary(app.config["THUMBNAIL_FOLDER"], result['data'], result['format'], app.config["THUMBNAIL_URL_TTL"])
+                    entry["url"] = url_for('temporary_thumbnail_route', token=token)
+                else:
+                    entry["thumbnail"] = base64.b64encode(result['data']).decode()
+            variants.append(entry)
+
+        return jsonify({
+            "success": True,
+            "video_hash": video_hash,
+            "variants": variants,
+            "decode_ms": round(decode_ms, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2)
+        })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 @app.route('/generate_custom_thumbnail', methods=['POST'])
+@admission.limit('media')
 def generate_custom_thumbnail_route():
     try:
         title = request.json.get('title', '')
         subtitle = request.json.get('subtitle', '')
         template = request.json.get('template', 'gradient')
+        template_options = request.json.get('template_options')
         
-        # Create custom thumbnail
-        thumbnail = create_custom_thumbnail(title, subtitle, template)
+        # The blurred_frame template uses a frame from a previously uploaded video as backdrop
+        frame = None
+        video_hash = request.json.get('video_hash')
+        if video_hash:
+            video_path = media_path(app.config["MEDIA_FOLDER"], video_hash)
+            if video_path is None:
+                return jsonify({"success": False, "error": "Unknown video_hash"})
+            frame = extract_video_frame(video_path, request.json.get('timestamp'))
         
-        if thumbnail:
-            # Convert to base64 for web display
-            thumbnail_b64 = thumbnail_to_base64(thumbnail)
-            return jsonify({"success": True, "thumbnail": thumbnail_b64})
-        else:
-            return jsonify({"success": False, "error": "Failed to generate custom thumbnail"})
+        render_inputs = {
+            "renderer": "custom",
+            "title": title,
+            "subtitle": subtitle,
+            "template": template,
+            "template_options": template_options,
+            "frame": frame_fingerprint(frame) if frame is not None else None
+        }
+        
+        # Create custom thumbnail (skipped entirely when the same inputs were rendered before)
+        return thumbnail_response(
+            lambda: create_custom_thumbnail(title, subtitle, template, template_options=template_options, frame=frame),
+            render_inputs,
+            thumbnail_output_options(request.json)
+        )
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 @app.route('/generate_tags', methods=['POST'])
+@admission.limit('cpu')
 def generate_tags_route():
     """Endpoint for intelligent video tag generation"""
     try:
@@ -336,11 +1033,20 @@ def generate_tags_route():
             'category': data.get('category', 'auto')
         }
         
-        # Generate tags
-        tag_data = generate_video_tags(content, options)
-        
-        # Get category suggestion
-        category_suggestion = suggest_youtube_category(content, tag_data.get('topics'))
+        content_hash = request_content_hash(content, {'tags': options})
+        cached = stored_results(content_hash, ['tags', 'category'], data)
+        if cached is not None:
+            stored = cached.stage_results()
+            tag_data, category_suggestion = stored['tags'], stored['category']
+        else:
+            with fallbacks() as degraded:
+                # Generate tags
+                tag_data = generate_video_tags(content, options)
+                
+                # Get category suggestion
+                category_suggestion = suggest_youtube_category(content, tag_data.get('topics'))
+            if not degraded:
+                save_content_results(content_hash, 'content', {'tags': tag_data, 'category': category_suggestion})
         
         return jsonify({
             'tags': tag_data['tags'],
@@ -352,7 +1058,9 @@ def generate_tags_route():
                 'topics': tag_data['topics'],
                 'entities': tag_data['entities'],
                 'tag_count': len(tag_data['tags'])
-            }
+            },
+            'stored': cached is not None,
+            'content_hash': content_hash
         })
         
     except Exception as e:
@@ -360,6 +1068,7 @@ def generate_tags_route():
         return jsonify({'error': f'Error generating tags: {str(e)}'})
 
 @app.route('/suggest_category', methods=['POST'])
+@admission.limit('cpu')
 def suggest_category_route():
     """Endpoint for YouTube category suggestion"""
     try:
@@ -369,11 +1078,21 @@ def suggest_category_route():
         if not content:
             return jsonify({'error': 'Content is required for category suggestion'})
         
-        category_suggestion = suggest_youtube_category(content)
+        content_hash = request_content_hash(content)
+        cached = stored_results(content_hash, ['category'], data)
+        if cached is not None:
+            category_suggestion = cached.stage_results()['category']
+        else:
+            with fallbacks() as degraded:
+                category_suggestion = suggest_youtube_category(content)
+            if not degraded:
+                save_content_results(content_hash, 'content', {'category': category_suggestion})
         
         return jsonify({
             'category': category_suggestion,
-            'success': True
+            'success': True,
+            'stored': cached is not None,
+            'content_hash': content_hash
         })
         
     except Exception as e:
@@ -381,6 +1100,7 @@ def suggest_category_route():
         return jsonify({'error': f'Error suggesting category: {str(e)}'})
 
 @app.route('/analyze_tags_content', methods=['POST'])
+@admission.limit('cpu')
 def analyze_tags_content_route():
     """Endpoint for content analysis specifically for tag generation"""
     try:
@@ -401,5 +1121,370 @@ def analyze_tags_content_route():
         print(f"Error analyzing content for tags: {str(e)}")
         return jsonify({'error': f'Error analyzing content: {str(e)}'})
 
+# Stages of the one-shot /process_video pipeline. Each receives the request inputs and the
+# results of the stages it requires; independent stages run concurrently.
+
+@video_pipeline.stage('transcription')
+def transcription_stage(inputs, results):
+    content = inputs['content']
+    if content:
+        return {"transcription": content, "summary": generate_intelligent_summary(content), "source": "content"}
+
+    source = inputs['audio'] or inputs['video_path']
+    if source is None:
+        raise ValueError("Provide content, an audio file or a video")
+
+    language = inputs['options'].get('language', 'en-US')
+    if inputs['options'].get('auto_detect'):
+        if inputs['audio'] is not None:
+            language = detect_language_from_audio(inputs['audio'])
+            inputs['audio'].seek(0)
+        else:
+            language = detect_language_from_stream(inputs['video_path'])
+
+    if inputs['audio'] is not None:
+        features = {}
+        result = transcribe_stream(inputs['audio'], language=language, audio_features=features,
+                                   progress_callback=transcription_progress(inputs['operation_id']))
+    else:
+        result, features = transcribe_video(inputs['video_hash'], inputs['video_path'], language,
+                                            inputs['operation_id'])
+    transcription, summary, confidence, word_count, duration = result
+    if not word_count:
+        raise Exception(transcription)
+    return {
+        "transcription": transcription,
+        "summary": summary,
+        "confidence": confidence,
+        "word_count": word_count,
+        "duration_seconds": duration,
+        "detected_language": language,
+        "audio_features": features,
+        "source": "audio" if inputs['audio'] is not None else "video"
+    }
+
+@video_pipeline.stage('analysis', requires=('transcription',))
+def analysis_stage(inputs, results):
+    # Tokenizing and tagging here warms the memoized NLP results the downstream stages reuse
+    text = results['transcription']['transcription']
+    return {
+        "keywords": extract_advanced_keywords(text),
+        "topics": categorize_content(text),
+        "entities": extract_named_entities(text),
+        "word_count": len(text.split())
+    }
+
+@video_pipeline.stage('title', requires=('transcription', 'analysis'))
+def title_stage(inputs, results):
+    return generate_title(results['transcription']['transcription'], inputs['options'].get('title', {}))
+
+@video_pipeline.stage('description', requires=('transcription', 'analysis'))
+def description_stage(inputs, results):
+    options = dict(inputs['options'].get('description', {}))
+    base = options.pop('content', None) or results['transcription']['summary']
+    description = enhance_description(base, results['transcription']['transcription'], options or None)
+    return {"description": description, "word_count": len(description.split())}
+
+@video_pipeline.stage('tags', requires=('transcription', 'analysis'))
+def tags_stage(inputs, results):
+    return generate_video_tags(results['transcription']['transcription'], inputs['options'].get('tags'))
+
+@video_pipeline.stage('category', requires=('transcription', 'analysis'))
+def category_stage(inputs, results):
+    return suggest_youtube_category(results['transcription']['transcription'], results['analysis']['topics'])
+
+@video_pipeline.stage('playlist', requires=('transcription', 'analysis'))
+def playlist_stage(inputs, results):
+    assignment = assign_playlist(results['transcription']['transcription'], inputs['options'].get('playlist', {}))
+    if 'error' in assignment:
+        raise Exception(assignment['error'])
+    return assignment
+
+@video_pipeline.stage('frames')
+def frames_stage(inputs, results):
+    # Frame scoring only needs the video, so it overlaps with transcription
+    if inputs['video_path'] is None:
+        return []
+    options = inputs['options'].get('thumbnail', {})
+    return select_best_frames(inputs['video_path'], int(options.get('candidates', 24)), int(options.get('top_k', 3)))
+
+@video_pipeline.stage('thumbnail', requires=('title', 'frames'))
+def thumbnail_stage(inputs, results):
+    options = inputs['options'].get('thumbnail', {})
+    title = options.get('title') or results['title']['titles'][0]
+    frames = results['frames']
+
+    if frames:
+        frame = frames[0]['frame']
+        render_inputs = {"renderer": "frame", "title": title, "frame": frame_fingerprint(frame)}
+        render = lambda: create_thumbnail_from_frame(frame, title)
+    else:
+        template = options.get('template', 'gradient')
+        render_inputs = {"renderer": "custom", "title": title, "subtitle": "", "template": template,
+                         "template_options": None, "frame": None}
+        render = lambda: create_custom_thumbnail(title, "", template)
+
+    # Upload-ready by default: JPEG within YouTube's thumbnail size limit
+    encoding = thumbnail_output_options(dict({'format': 'jpeg', 'size_budget': 'true'}, **options))
+    data, meta = cached_thumbnail(render_inputs, encoding, 'maxres', render)
+    return dict(meta, title=title, bytes=len(data), data=data,
+                timestamp=frames[0]['timestamp'] if frames else None)
+
+def public_stage_result(stage, value):
+    """JSON view of a stage result: decoded frames and encoded thumbnails stay server-side"""
+    if stage == 'frames':
+        return [{key: item for key, item in candidate.items() if key != 'frame'} for candidate in value]
+    if stage == 'thumbnail':
+        return {key: item for key, item in value.items() if key != 'data'}
+    return value
+
+def video_content_hash(inputs):
+    """Key of stored pipeline results: the submitted text and media plus the options used"""
+    digest = hashlib.sha256()
+    digest.update(b'text:' + inputs['content'].encode('utf-8'))
+    if inputs['video_hash']:
+        digest.update(b'video:' + inputs['video_hash'].encode())
+    if inputs['audio'] is not None:
+        digest.update(b'audio:')
+        stream = inputs['audio'].stream
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+        stream.seek(0)
+    digest.update(b'options:' + json.dumps(inputs['options'], sort_keys=True).encode())
+    return digest.hexdigest()
+
+def request_content_hash(content='', options=None, video_hash=None, audio=None):
+    """video_content_hash of an editor request, so it shares stored results with /process_video"""
+    return video_content_hash({'content': content, 'video_hash': video_hash, 'audio': audio,
+                               'options': options or {}})
+
+def stored_results(content_hash, stages, params, kinds=(models.Video, models.ContentResult)):
+    """First row of the `kinds` models holding results of every stage in `stages`.
+
+    None if there is none or 'refresh' is true. Editor routes also reuse results of
+    /process_video; /process_video only reuses its own Video rows.
+    """
+    if str(params.get('refresh', 'false')).lower() == 'true':
+        return None
+    for kind in kinds:
+        row = kind.query.filter_by(content_hash=content_hash).first()
+        if row is not None and all(stage in row.stage_results() for stage in stages):
+            return row
+    return None
+
+def stored_video_response(video, stages):
+    results = video.stage_results()
+    return {
+        "success": True,
+        "stored": True,
+        "video_id": video.id,
+        "content_hash": video.content_hash,
+        "hierarchical_number": video.hierarchical_number,
+        "stages": stages,
+        "results": {stage: results[stage] for stage in stages},
+        "errors": {}
+    }
+
+def storable_results(results):
+    """Return the stage results that may be stored, dropping any carrying an error marker."""
+    def failed(value):
+        return isinstance(value, dict) and bool(
+            value.get('error') or isinstance(value.get('analysis'), dict) and value['analysis'].get('error'))
+    return {stage: value for stage, value in results.items() if not failed(value)}
+
+def save_video_results(content_hash, source, results, thumbnail=None):
+    """Persist public stage results under `content_hash`, merged with any stored before.
+
+    `thumbnail` holds the encoded image of the 'thumbnail' result. Results carrying an
+    error marker are skipped. Returns the Video row, or None if nothing was stored.
+    """
+    results = storable_results(results)
+    if not results:
+        return None
+    if 'thumbnail' in results:
+        results = dict(results, thumbnail=dict(
+            results['thumbnail'], url=url_for('stored_thumbnail_route', content_hash=content_hash)))
+
+    def create():
+        # The number is reserved in this transaction and released if the insert fails
+        return models.Video(content_hash=content_hash, title='', description='',
+                            hierarchical_number=allocate_hierarchical_number(db.session, 'main'))
+
+    def update(video):
+        stored = dict(video.stage_results(), **results)
+        video.results = app.json.dumps(stored)
+        video.source = source or video.source
+        if 'transcription' in stored:
+            video.transcription = stored['transcription']['transcription']
+            video.summary = stored['transcription']['summary']
+        if stored.get('title', {}).get('titles'):
+            video.title = stored['title']['titles'][0][:100]
+        if 'description' in stored:
+            video.description = stored['description']['description']
+        if 'tags' in stored:
+            video.tags = json.dumps(stored['tags']['tags'])
+        if 'category' in stored:
+            video.category_id = stored['category']['category_id']
+        if 'playlist' in stored:
+            video.playlist = stored['playlist']['primary_playlist']['name'][:100]
+        if thumbnail is not None and 'thumbnail' in results:
+            video.thumbnail = thumbnail
+            video.thumbnail_mime_type = results['thumbnail']['mime_type']
+
+    return upsert_content_row(models.Video, content_hash, create, update)
+
+def save_content_results(content_hash, source, results, thumbnail=None):
+    """Cache public stage results of an editor route under `content_hash`, merged with any cached before.
+
+    Unlike save_video_results this creates no catalog Video and takes no hierarchical
+    number. Results carrying an error marker are skipped. Returns the ContentResult
+    row, or None if nothing was stored.
+    """
+    results = storable_results(results)
+    if not results:
+        return None
+
+    def update(row):
+        row.results = app.json.dumps(dict(row.stage_results(), **results))
+        row.source = source or row.source
+        if thumbnail is not None and 'thumbnail' in results:
+            row.thumbnail = thumbnail
+            row.thumbnail_mime_type = results['thumbnail']['mime_type']
+
+    return upsert_content_row(models.ContentResult, content_hash,
+                              lambda: models.ContentResult(content_hash=content_hash), update)
+
+def upsert_content_row(model, content_hash, create, update):
+    """Apply update(row) to the `model` row of `content_hash`, created with create() if missing, and commit.
+
+    Returns the row, or None if it could not be stored.
+    """
+    for _ in range(2):
+        try:
+            row = model.query.filter_by(content_hash=content_hash).first()
+            if row is None:
+                row = create()
+                db.session.add(row)
+            update(row)
+            db.session.commit()
+            return row
+        except IntegrityError:
+            # A concurrent request stored the same content first; merge into its row
+            db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error saving results: {str(e)}")
+            return None
+    print(f"Error saving results: could not store {content_hash}")
+    return None
+
+@app.route('/process_video', methods=['POST'])
+@admission.limit('media')
+def process_video_route():
+    """Run transcription, analysis and metadata generation for one video in a single request.
+
+    Accepts multipart form data (a 'video' or 'audio' file, or a video_hash) or JSON with
+    'content' text or a 'video_hash'. 'stages' selects any subset of stages (their
+    dependencies are added automatically) and 'options' holds per-stage options.
+
+    Results are stored under a hash of the submitted content and options; submitting the
+    same content again returns the stored results without recomputing them, unless
+    'refresh' is true.
+    """
+    operation_id = request_operation_id(request.form or request.get_json(silent=True) or {})
+    try:
+        if request.files or request.form:
+            params = request.form
+            options = json.loads(params.get('options') or '{}')
+        else:
+            params = request.get_json(silent=True) or {}
+            options = params.get('options') or {}
+
+        stages = params.get('stages') or list(video_pipeline.stages)
+        if isinstance(stages, str):
+            stages = [stage.strip() for stage in stages.split(',') if stage.strip()]
+
+        inputs = {'content': params.get('content', ''), 'audio': None, 'video_hash': None, 'video_path': None,
+                  'options': options, 'operation_id': operation_id}
+        if 'audio' in request.files:
+            inputs['audio'] = request.files['audio']
+        elif 'video' in request.files or params.get('video_hash'):
+            inputs['video_hash'], inputs['video_path'] = resolve_video_source()
+
+        content_hash = video_content_hash(inputs)
+        requested = video_pipeline.resolve(stages)
+        video = stored_results(content_hash, requested, params, kinds=(models.Video,))
+        if video is not None:
+            response = dict(stored_video_response(video, requested), video_hash=inputs['video_hash'])
+            progress_broker.publish(operation_id, 'result', response, final=True)
+            return jsonify(response)
+
+        def on_event(stage, state, details):
+            if 'result' in details:
+                details = dict(details, result=public_stage_result(stage, details['result']))
+            progress_broker.publish(operation_id, 'stage', dict(details, stage=stage, state=state))
+
+        started = time.perf_counter()
+        results, timings, errors, degraded = video_pipeline.run(stages, inputs, on_event=on_event)
+        thumbnail = results['thumbnail']['data'] if 'thumbnail' in results else None
+        results = {stage: public_stage_result(stage, value) for stage, value in results.items()}
+
+        # Stages that fell back to a default value are returned but not stored
+        storable = {stage: value for stage, value in results.items() if stage not in degraded}
+        source = results['transcription']['source'] if 'transcription' in results else None
+        video = save_video_results(content_hash, source, storable,
+                                   thumbnail if 'thumbnail' in storable else None) if storable else None
+        if video is not None and 'thumbnail' in storable:
+            results['thumbnail']['url'] = url_for('stored_thumbnail_route', content_hash=content_hash)
+        elif thumbnail is not None:
+            # Not stored: hand the thumbnail out through a short-lived URL instead
+            token = store_temporary(app.config["THUMBNAIL_FOLDER"], thumbnail, results['thumbnail']['format'],
+                                    app.config["THUMBNAIL_URL_TTL"])
+            results['thumbnail']['url'] = url_for('temporary_thumbnail_route', token=token)
+
+        response = {
+            "success": not any(stage in errors for stage in stages),
+            "stored": False,
+            "video_id": video.id if video is not None else None,
+            "content_hash": content_hash,
+            "hierarchical_number": video.hierarchical_number if video is not None else None,
+            "video_hash": inputs['video_hash'],
+            "stages": requested,
+            "results": results,
+            "errors": errors,
+            "timings_ms": timings,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        progress_broker.publish(operation_id, 'result', response, final=True)
+        return jsonify(response)
+    except Exception as e:
+        progress_broker.publish(operation_id, 'error', {"error": str(e)}, final=True)
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/videos/<content_hash>')
+def stored_video_route(content_hash):
+    """Stored pipeline results for a content hash returned by /process_video"""
+    video = models.Video.query.filter_by(content_hash=content_hash).first()
+    if video is None:
+        return jsonify({"success": False, "error": "Video not found"}), 404
+    return jsonify(stored_video_response(video, list(video.stage_results())))
+
+@app.route('/videos/<content_hash>/thumbnail')
+def stored_thumbnail_route(content_hash):
+    """Persisted thumbnail of a processed video (replaced when the video is reprocessed with 'refresh')"""
+    video = models.Video.query.filter_by(content_hash=content_hash).first()
+    if video is None or video.thumbnail is None:
+        return jsonify({"success": False, "error": "Thumbnail not found"}), 404
+    response = app.response_class(video.thumbnail, mimetype=video.thumbnail_mime_type)
+    response.set_etag(hashlib.sha256(video.thumbnail).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config["THUMBNAIL_URL_TTL"]
+    return response.make_conditional(request)
+
+# Resume uploads that were queued or interrupted before the last shutdown. Under the
+# production server this happens in each worker after fork instead (see gunicorn.conf.py).
+if os.environ.get("JOB_RECOVER_ON_START", "true").lower() == "true":
+    job_queue.recover()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""ASGI entry point for the production server.
+
+Wraps the app from wsgi.py (so the app and NLP models are still preloaded in
+gunicorn's master) in the gateway that serves progress streams on the event
+loop and runs every other request on SERVER_THREADS threads per worker. Run
+with:
+
+    gunicorn -c gunicorn.conf.py
+"""
+from app import app, open_progress_stream
+from gateway import Gateway
+from wsgi import application as wsgi_application
+
+application = Gateway(wsgi_application, threads=app.config["SERVER_THREADS"],
+                      event_streams={'progress_events_route': open_progress_stream})
@@ -0,0 +1,268 @@
+"""Static asset build and fingerprinted, long-cached asset serving.
+
+`python assets.py` minifies the CSS and JavaScript under static/, copies them
+to static/dist/ under content-hashed names (css/custom.3f2a9c1e04.css), writes
+gzip and brotli variants next to each file and records the mapping in
+static/dist/manifest.json. With --vendor it also downloads the third-party
+CSS/JS the templates load from CDNs, so pages need no cross-origin requests.
+
+At runtime the `asset_url()` template helper resolves a source path through
+the manifest to /assets/<fingerprinted name>, served with a one-year
+immutable Cache-Control and the best precompressed variant the client
+accepts. Since the name changes whenever the content does, browsers never
+need to revalidate. Without a build, in debug mode, or for a source file
+edited after the last build, the helper falls back to the plain static URL
+(or the CDN URL for vendor assets), so edits show up without rebuilding.
+
+Builds are additive: files of earlier builds stay in static/dist/ so pages
+rendered (or cached) before a deploy can still load the assets they name.
+A file that is no longer in the manifest is deleted once it has been out of
+it for PRUNE_GRACE_SECONDS (--keep-days).
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import time
+import urllib.request
+
+from flask import abort, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_FOLDER = os.path.join(ROOT, 'static')
+DIST_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+# When each built file dropped out of the manifest, for pruning
+RETIRED_NAME = 'retired.json'
+PRUNE_GRACE_SECONDS = 7 * 24 * 3600
+
+# Third-party assets the templates would otherwise fetch from CDNs on every page load
+VENDOR_ASSETS = {
+    'vendor/bootstrap-agent-dark-theme.min.css': 'https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css',
+    'vendor/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js'
+}
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_MAX_AGE = 31536000
+
+
+def minify(source_path, data):
+    """Minified bytes of a CSS or JS file; other files and missing minifiers pass through"""
+    if source_path.endswith('.min.css') or source_path.endswith('.min.js'):
+        return data
+    if source_path.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(data.decode('utf-8')).encode('utf-8')
+    if source_path.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(data.decode('utf-8')).encode('utf-8')
+    return data
+
+
+def fingerprinted_name(name, data):
+    root, extension = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{extension}"
+
+
+def write_atomic(path, data):
+    """Write a file so concurrent readers see either the old or the complete new content"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def write_asset(dist_dir, name, data):
+    """Write `data` under its fingerprinted name plus precompressed variants; returns that name"""
+    output_name = fingerprinted_name(name, data)
+    output_path = os.path.join(dist_dir, output_name)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if os.path.exists(output_path):
+        # The name is derived from the content, so an earlier build already wrote it
+        return output_name
+    if output_name.endswith(COMPRESSIBLE_EXTENSIONS):
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            # Only keep variants that are actually smaller
+            if len(compressed) < len(data):
+                write_atomic(output_path + suffix, compressed)
+    # Written last, so a file that exists always has its variants
+    write_atomic(output_path, data)
+    return output_name
+
+
+def source_assets(static_folder):
+    """Relative paths of the files under static/ that are built (everything but the output)"""
+    for directory, subdirectories, filenames in os.walk(static_folder):
+        relative_dir = os.path.relpath(directory, static_folder)
+        if relative_dir == DIST_DIRNAME or relative_dir.startswith(DIST_DIRNAME + os.sep):
+            subdirectories[:] = []
+            continue
+        for filename in sorted(filenames):
+            yield os.path.normpath(os.path.join(relative_dir, filename)).replace(os.sep, '/')
+
+
+def prune_assets(dist_dir, manifest, grace_seconds=PRUNE_GRACE_SECONDS):
+    """Delete built files that have been out of `manifest` for longer than `grace_seconds`"""
+    retired_path = os.path.join(dist_dir, RETIRED_NAME)
+    try:
+        with open(retired_path) as f:
+            retired = json.load(f)
+    except (OSError, ValueError):
+        retired = {}
+
+    current = set(manifest.values())
+    now = time.time()
+    still_retired = {}
+    for directory, _, filenames in os.walk(dist_dir):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, dist_dir).replace(os.sep, '/')
+            if name in (MANIFEST_NAME, RETIRED_NAME) or name.endswith(('.gz', '.br', '.part')) or name in current:
+                continue
+            retired_at = retired.get(name, now)
+            if now - retired_at < grace_seconds:
+                still_retired[name] = retired_at
+                continue
+            for suffix in ('', '.gz', '.br'):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+
+    write_atomic(retired_path, json.dumps(still_retired, indent=2, sort_keys=True).encode('utf-8'))
+    return still_retired
+
+
+def build_assets(static_folder=STATIC_FOLDER, vendor=False, grace_seconds=PRUNE_GRACE_SECONDS):
+    """Build static/dist/ and its manifest; returns the manifest {source name: built name}"""
+    dist_dir = os.path.join(static_folder, DIST_DIRNAME)
+    os.makedirs(dist_dir, exist_ok=True)
+
+    manifest = {}
+    for name in source_assets(static_folder):
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        manifest[name] = write_asset(dist_dir, name, minify(name, data))
+
+    if vendor:
+        for name, url in VENDOR_ASSETS.items():
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    manifest[name] = write_asset(dist_dir, name, response.read())
+            except Exception as e:
+                print(f"Error downloading {url}: {str(e)}")
+
+    write_atomic(os.path.join(dist_dir, MANIFEST_NAME),
+                 json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    prune_assets(dist_dir, manifest, grace_seconds)
+    return manifest
+
+
+class AssetManifest:
+    """Flask extension providing asset_url() and the /assets route for built assets"""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.manifest_mtime = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.static_folder = app.static_folder
+        self.dist_dir = os.path.join(app.static_folder, DIST_DIRNAME)
+        self.manifest_path = os.path.join(self.dist_dir, MANIFEST_NAME)
+        self._load()
+        app.extensions['asset_manifest'] = self
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_url_rule('/assets/<path:filename>', 'built_asset', self.serve)
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+            if mtime == self.manifest_mtime:
+                return
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            self.manifest_mtime = mtime
+        except FileNotFoundError:
+            self.manifest = {}
+        except (OSError, ValueError) as e:
+            print(f"Error loading asset manifest: {str(e)}")
+            self.manifest = {}
+
+    def asset_url(self, filename, cdn=None):
+        """URL of a static asset: fingerprinted when built, else the CDN or plain static URL"""
+        # A stat per call lets a rebuild take effect without restarting the server
+        self._load()
+        built = self.manifest.get(filename)
+        if built is not None and not self.app.debug and not self._edited_since_build(filename):
+            return url_for('built_asset', filename=built)
+        if cdn is not None:
+            return cdn
+        return url_for('static', filename=filename)
+
+    def _edited_since_build(self, filename):
+        try:
+            return os.path.getmtime(os.path.join(self.static_folder, filename)) > self.manifest_mtime
+        except OSError:
+            # Vendor assets have no source file under static/
+            return False
+
+    def serve(self, filename):
+        """Serve a built asset, preferring a precompressed variant the client accepts"""
+        path = safe_join(self.dist_dir, filename)
+        if path is None or filename in (MANIFEST_NAME, RETIRED_NAME) or filename.endswith(('.gz', '.br', '.part')):
+            abort(404)
+        for encoding, suffix in PRECOMPRESSED:
+            if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+                response = send_from_directory(self.dist_dir, filename + suffix, max_age=IMMUTABLE_MAX_AGE,
+                                               mimetype=mimetypes.guess_type(filename)[0], conditional=True)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.dist_dir, filename, max_age=IMMUTABLE_MAX_AGE, conditional=True)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed static assets')
+    parser.add_argument('--vendor', action='store_true', help='also download CDN assets used by the templates')
+    parser.add_argument('--keep-days', type=float, default=PRUNE_GRACE_SECONDS / 86400,
+                        help='days to keep files of earlier builds after they leave the manifest')
+    args = parser.parse_args()
+    manifest = build_assets(vendor=args.vendor, grace_seconds=args.keep_days * 86400)
+    for name, built in sorted(manifest.items()):
+        print(f"{name} -> {DIST_DIRNAME}/{built}")
+
+
+if __name__ == '__main__':
+    main()
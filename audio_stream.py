@@ -0,0 +1,139 @@
+"""Stream decoded audio out of an ffmpeg subprocess.
+
+ffmpeg demuxes only the audio stream of any audio or video container and
+resamples it to 16-bit little-endian PCM, which is read from its stdout pipe
+in fixed-size blocks. No decoded audio is written to disk, and consumers can
+start working on the first block while the rest of the file is still decoding.
+
+ffmpeg reads files, not pipes: MP4, M4A and MOV files usually keep their index
+(the moov atom) at the end, which ffmpeg can only reach by seeking, so
+uploads are spooled to a temporary file first.
+"""
+import collections
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+PIPE_CHUNK_SIZE = 64 * 1024
+
+
+def ffmpeg_available():
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+def spool_to_temp(source):
+    """Copy a readable file-like source to a temporary file in chunks; returns its path"""
+    name = getattr(source, 'filename', None) or getattr(source, 'name', None) or ''
+    extension = os.path.splitext(name if isinstance(name, str) else '')[1].lower()
+    if not re.match(r'^\.[a-z0-9]{1,8}$', extension):
+        extension = ''
+    fd, path = tempfile.mkstemp(suffix=extension)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(source, out, PIPE_CHUNK_SIZE)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+STREAM_INFO_PATTERN = re.compile(r'Stream #\d+:\d+.*?: Audio: (\w+).*?, (\d+) Hz, ([^,]+)')
+DURATION_PATTERN = re.compile(r'Duration: (\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+CHANNEL_LAYOUTS = {'mono': 1, 'stereo': 2, '2.1': 3, 'quad': 4, '4.0': 4, '5.0': 5, '5.1': 6, '6.1': 7, '7.1': 8}
+
+
+def _parse_channels(layout):
+    layout = layout.strip().split('(')[0]
+    if layout in CHANNEL_LAYOUTS:
+        return CHANNEL_LAYOUTS[layout]
+    match = re.match(r'(\d+) channels', layout)
+    return int(match.group(1)) if match else 0
+
+
+def _drain_stderr(stderr, lines, stream_info):
+    for raw_line in iter(stderr.readline, b''):
+        line = raw_line.decode('utf-8', 'replace').strip()
+        if stream_info is not None and 'duration' not in stream_info:
+            match = DURATION_PATTERN.search(line)
+            if match:
+                hours, minutes, seconds = match.groups()
+                stream_info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                continue
+        if stream_info is not None and 'codec' not in stream_info:
+            match = STREAM_INFO_PATTERN.search(line)
+            if match:
+                stream_info.update({
+                    'codec': match.group(1),
+                    'sample_rate': int(match.group(2)),
+                    'channels': _parse_channels(match.group(3))
+                })
+                continue
+        lines.append(line)
+    stderr.close()
+
+
+def iter_pcm_blocks(source, block_seconds=30.0, sample_rate=SAMPLE_RATE, channels=1, stream_info=None):
+    """Yield the audio track of `source` as blocks of s16le PCM bytes.
+
+    `source` is a file path or a readable file-like object (e.g. an uploaded file), which
+    is spooled to a temporary file for ffmpeg to read and removed afterwards. Every block
+    holds `block_seconds` of audio except possibly the last. Memory use is bounded by one
+    block plus the OS pipe buffers. Raises if ffmpeg fails before producing any audio.
+
+    If `stream_info` is a dict it receives the codec, sample rate and channel count of the
+    source stream as reported by ffmpeg (complete once the generator is exhausted), and
+    the container duration when known, usually before the first block is yielded.
+    """
+    block_bytes = max(1, int(block_seconds * sample_rate)) * SAMPLE_WIDTH * channels
+    spooled = None
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+    else:
+        path = spooled = spool_to_temp(source)
+
+    # Stream details are only printed at info level; errors still end up in `errors`
+    log_level = 'info' if stream_info is not None else 'error'
+    command = [FFMPEG_BINARY, '-hide_banner', '-nostats', '-loglevel', log_level, '-nostdin', '-i', path,
+               '-vn', '-map', '0:a:0', '-ac', str(channels), '-ar', str(sample_rate), '-f', 's16le', 'pipe:1']
+
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except Exception:
+        if spooled is not None:
+            os.remove(spooled)
+        raise
+
+    errors = collections.deque(maxlen=20)
+    drain = threading.Thread(target=_drain_stderr, args=(process.stderr, errors, stream_info), daemon=True)
+    drain.start()
+
+    produced = False
+    try:
+        while True:
+            block = process.stdout.read(block_bytes)
+            if not block:
+                break
+            produced = True
+            yield block
+
+        process.wait()
+        drain.join(timeout=1)
+        if process.returncode != 0 and not produced:
+            raise Exception(f"ffmpeg failed to decode audio: {' '.join(errors) or process.returncode}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        drain.join(timeout=1)
+        if spooled is not None:
+            try:
+                os.remove(spooled)
+            except OSError:
+                pass
@@ -0,0 +1,84 @@
+"""Check that the streaming audio stages keep memory bounded on long files.
+
+Synthesises (and caches) a long stereo 44.1 kHz MP3, runs extract_audio_features()
+and transcribe_audio() against a fake recogniser, and fails if peak RSS grows by
+more than the configured ceiling over the post-import baseline.
+
+    python benchmarks/bench_audio_memory.py --hours 3 --ceiling-mb 64
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speech_recognition as sr  # noqa: E402
+
+from audio_stream import FFMPEG_BINARY  # noqa: E402
+from utils import extract_audio_features, transcribe_audio  # noqa: E402
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthesize_audio(path, seconds):
+    subprocess.run([
+        FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}',
+        '-f', 'lavfi', '-i', f'anoisesrc=color=pink:sample_rate=44100:amplitude=0.1:duration={seconds}',
+        '-filter_complex', 'amix=inputs=2,aformat=channel_layouts=stereo',
+        '-c:a', 'libmp3lame', '-b:a', '64k', path
+    ], check=True)
+
+
+def fake_recognize_google(self, audio_data, language='en-US', show_all=False, **kwargs):
+    transcript = f"block of {len(audio_data.frame_data)} bytes"
+    return {'alternative': [{'transcript': transcript, 'confidence': 0.9}]} if show_all else transcript
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=3.0)
+    parser.add_argument('--ceiling-mb', type=float, default=float(os.environ.get('AUDIO_MEMORY_CEILING_MB', 64)))
+    parser.add_argument('--audio', help='use an existing file instead of a synthetic one')
+    args = parser.parse_args()
+
+    path = args.audio
+    if not path:
+        seconds = int(args.hours * 3600)
+        path = os.path.join(tempfile.gettempdir(), f'bench_audio_{seconds}s.mp3')
+        if not os.path.exists(path):
+            print(f'Synthesizing {seconds}s stereo MP3 at {path} ...')
+            synthesize_audio(path, seconds)
+
+    sr.Recognizer.recognize_google = fake_recognize_google
+
+    baseline = peak_rss_mb()
+    print(f'baseline peak RSS: {baseline:8.1f} MB')
+
+    start = time.perf_counter()
+    features = extract_audio_features(path)
+    print(f'extract_audio_features: {time.perf_counter() - start:8.2f}s  duration={features.get("duration_seconds", 0):.0f}s  '
+          f'peak RSS {peak_rss_mb():.1f} MB')
+
+    start = time.perf_counter()
+    result = transcribe_audio(path)
+    print(f'transcribe_audio:       {time.perf_counter() - start:8.2f}s  words={result[3]}  '
+          f'peak RSS {peak_rss_mb():.1f} MB')
+
+    growth = peak_rss_mb() - baseline
+    print(f'peak RSS growth: {growth:.1f} MB (ceiling {args.ceiling_mb:.0f} MB)')
+    if growth > args.ceiling_mb:
+        print('FAIL: audio pipeline exceeded its memory ceiling')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
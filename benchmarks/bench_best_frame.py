@@ -0,0 +1,84 @@
+"""Benchmark single-pass best-frame selection against per-candidate seeking.
+
+Generates (and caches) a synthetic 1080p video, then times select_best_frames()
+and the equivalent seek-per-candidate approach built on extract_video_frame().
+
+    python benchmarks/bench_best_frame.py --duration 600 --candidates 24
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import extract_video_frame, score_frame_quality, select_best_frames  # noqa: E402
+
+
+def synthesize_video(path, duration, width=1920, height=1080, fps=30):
+    """Write a deterministic test video with moving shapes and blurred stretches"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    rng = np.random.default_rng(42)
+    base = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    base = cv2.resize(base, (width, height), interpolation=cv2.INTER_NEAREST)
+
+    for i in range(int(duration * fps)):
+        frame = np.roll(base, i * 4, axis=1)
+        cv2.circle(frame, ((i * 7) % width, height // 2), 120, (255, 255, 255), -1)
+        if (i // fps) % 5 == 0:
+            frame = cv2.GaussianBlur(frame, (31, 31), 0)
+        writer.write(frame)
+    writer.release()
+
+
+def seek_per_candidate(path, num_candidates, top_k):
+    cap = cv2.VideoCapture(path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    scored = []
+    for i in range(num_candidates):
+        timestamp = total_frames * (i + 0.5) / num_candidates / fps
+        frame = extract_video_frame(path, timestamp)
+        if frame is not None:
+            scored.append((score_frame_quality(frame)['score'], timestamp))
+    return sorted(scored, reverse=True)[:top_k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=120, help='video length in seconds')
+    parser.add_argument('--candidates', type=int, default=24)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--video', help='benchmark an existing file instead of a synthetic one')
+    args = parser.parse_args()
+
+    path = args.video
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), f'bench_1080p_{int(args.duration)}s.mp4')
+        if not os.path.exists(path):
+            print(f'Synthesizing {args.duration:.0f}s 1080p video at {path} ...')
+            synthesize_video(path, args.duration)
+
+    start = time.perf_counter()
+    best = select_best_frames(path, args.candidates, args.top_k)
+    single_pass = time.perf_counter() - start
+
+    start = time.perf_counter()
+    seek_per_candidate(path, args.candidates, args.top_k)
+    seeking = time.perf_counter() - start
+
+    print(f'single pass:        {single_pass:8.2f}s')
+    print(f'seek per candidate: {seeking:8.2f}s')
+    for candidate in best:
+        print(f"  t={candidate['timestamp']:8.2f}s score={candidate['score']:.3f} "
+              f"sharp={candidate['sharpness']:.3f} exposure={candidate['exposure']:.3f} color={candidate['colorfulness']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Measure JSON serialization time and bytes on the wire for large responses.
+
+Captures real response payloads from the app (playlist assignment, description
+enhancement, title generation and a base64 thumbnail), then compares Flask's
+default JSON provider with the orjson-backed FastJSONProvider, and the body
+size without compression against gzip and (if installed) brotli at the levels
+the app uses.
+
+    python benchmarks/bench_json_compression.py --iterations 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TRANSCRIPT = (
+    "In this Python programming tutorial we build a Flask web application step by step. "
+    "You will learn how to design routes, connect a database and deploy the app with Docker. "
+    "We compare Google Cloud and Microsoft Azure hosting, review the best tips for beginners "
+    "and finish with a complete project you can ship. "
+) * 12
+
+REQUESTS = {
+    'assign_playlist': ('/assign_playlist', {'content': TRANSCRIPT}),
+    'enhance_description': ('/enhance_description', {'content': 'My new video.', 'video_content': TRANSCRIPT}),
+    'generate_title': ('/generate_title', {'content': TRANSCRIPT}),
+    'custom_thumbnail_base64': ('/generate_custom_thumbnail', {'title': 'Flask in 10 minutes', 'subtitle': 'Tutorial',
+                                                                'format': 'jpeg', 'sizes': ['standard', 'medium']}),
+}
+
+
+def best_of(func, iterations):
+    """Mean seconds per call over the fastest of three batches"""
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        timings.append((time.perf_counter() - started) / iterations)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench-json-'), 'bench.db')
+    os.environ['JOB_RECOVER_ON_START'] = 'false'
+    from flask.json.provider import DefaultJSONProvider
+
+    from app import app
+    from compression import available_encodings, compress
+    from json_provider import FastJSONProvider
+
+    providers = {'flask': DefaultJSONProvider(app), 'fast': FastJSONProvider(app)}
+    print(f"Fast provider backend: {providers['fast'].backend}; encodings: {', '.join(available_encodings())}")
+
+    client = app.test_client()
+    header = (f"{'payload':26s} {'flask ms':>9s} {'fast ms':>8s} {'speedup':>8s} {'identity':>9s} "
+              + ' '.join(f'{encoding:>8s} {encoding + " ms":>8s}' for encoding in available_encodings()))
+    print(header)
+    print('-' * len(header))
+
+    for name, (path, payload) in REQUESTS.items():
+        response = client.post(path, json=payload, headers={'Accept-Encoding': 'identity'})
+        obj = response.get_json()
+
+        seconds = {key: best_of(lambda: provider.response(obj).get_data(), args.iterations)
+                   for key, provider in providers.items()}
+        body = providers['fast'].response(obj).get_data()
+        row = (f"{name:26s} {seconds['flask'] * 1000:9.3f} {seconds['fast'] * 1000:8.3f} "
+               f"{seconds['flask'] / seconds['fast']:7.1f}x {len(body):9d}")
+
+        levels = {'gzip': app.config['COMPRESS_GZIP_LEVEL'], 'br': app.config['COMPRESS_BROTLI_QUALITY']}
+        for encoding in available_encodings():
+            compressed = compress(body, encoding, levels[encoding])
+            elapsed = best_of(lambda: compress(body, encoding, levels[encoding]), max(1, args.iterations // 10))
+            row += f" {len(compressed):8d} {elapsed * 1000:8.3f}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Compare request throughput of the Flask development server and gunicorn.
+
+Starts each server in a subprocess on a free port, drives it with a pool of
+client threads for a fixed duration and reports requests per second and
+latency percentiles. The default endpoint exercises the NLP title path.
+
+    python benchmarks/bench_server.py --duration 20 --clients 16
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAYLOAD = {
+    'content': 'A hands-on tutorial covering Python web development with Flask, '
+                   'background jobs, thumbnail rendering and speech recognition.'
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return True
+        except Exception:
+            time.sleep(0.25)
+    return False
+
+
+def start_server(kind, port):
+    env = dict(os.environ, JOB_RECOVER_ON_START='false')
+    if kind == 'flask':
+        code = f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"
+        command = [sys.executable, '-c', code]
+    else:
+        env['BIND'] = f'127.0.0.1:{port}'
+        env['GUNICORN_ACCESS_LOG'] = '/dev/null'
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def drive(url, duration, clients):
+    body = json.dumps(PAYLOAD).encode('utf-8')
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        local = []
+        while time.perf_counter() < stop_at:
+            request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(request, timeout=30).read()
+                local.append(time.perf_counter() - started)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    if not latencies:
+        return {'requests': 0, 'errors': errors[0]}
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--path', default='/generate_title')
+    parser.add_argument('--servers', default='flask,gunicorn')
+    args = parser.parse_args()
+
+    for kind in args.servers.split(','):
+        port = free_port()
+        process = start_server(kind, port)
+        try:
+            if not wait_until_up(f'http://127.0.0.1:{port}/'):
+                print(f"{kind}: server did not start")
+                continue
+            # One warm-up request so lazily loaded state is not billed to the run
+            drive(f'http://127.0.0.1:{port}{args.path}', 1, 1)
+            result = drive(f'http://127.0.0.1:{port}{args.path}', args.duration, args.clients)
+            print(f"{kind:10s} {json.dumps(result)}")
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
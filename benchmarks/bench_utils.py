@@ -0,0 +1,278 @@
+"""Micro-benchmark suite for the utils processing functions.
+
+Generates deterministic synthetic inputs (transcripts of 1k to 1M words, audio
+of 10 s to 1 h, short videos at several resolutions), times the text
+generators, summarisation, transcription against a fake recogniser, frame
+extraction and the thumbnail renderers, and reports throughput and peak Python
+memory (tracemalloc, measured in a separate run so it does not skew timings).
+
+Results are written as JSON and compared against a stored baseline; any case
+slower (or hungrier) than the baseline by more than the threshold is reported
+as a regression and makes the script exit non-zero.
+
+    python benchmarks/bench_utils.py                      # full suite
+    python benchmarks/bench_utils.py --quick              # small inputs only
+    python benchmarks/bench_utils.py --only title,summary --words 1000,10000
+    python benchmarks/bench_utils.py --update-baseline    # accept current numbers
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import cv2  # noqa: E402
+import speech_recognition as sr  # noqa: E402
+
+from bench_audio_memory import fake_recognize_google, synthesize_audio  # noqa: E402
+from bench_best_frame import synthesize_video  # noqa: E402
+from thumbnails import create_custom_thumbnail, create_thumbnail_from_frame, encode_thumbnail  # noqa: E402
+from utils import (MEMO_CACHES, assign_playlist, enhance_description, extract_video_frame,  # noqa: E402
+                   generate_intelligent_summary, generate_title, generate_video_tags, transcribe_audio)
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+RESULTS_FOLDER = os.path.join(HERE, 'results')
+CACHE_FOLDER = os.path.join(tempfile.gettempdir(), 'bench_utils_inputs')
+
+WORD_COUNTS = (1000, 10000, 100000, 1000000)
+AUDIO_SECONDS = (10, 60, 600, 3600)
+VIDEO_RESOLUTIONS = {'480p': (854, 480), '720p': (1280, 720), '1080p': (1920, 1080)}
+THUMBNAIL_TEMPLATES = ('gradient', 'pattern', 'vignette', 'blurred_frame')
+
+TOPIC_WORDS = ['python', 'tutorial', 'programming', 'flask', 'database', 'design', 'marketing', 'fitness',
+               'recipe', 'camera', 'music', 'science', 'startup', 'investment', 'travel', 'game', 'review']
+COMMON_WORDS = ['the', 'a', 'and', 'of', 'to', 'in', 'is', 'you', 'that', 'it', 'for', 'on', 'with', 'we',
+                'this', 'learn', 'how', 'build', 'make', 'first', 'step', 'simple', 'best', 'really', 'today']
+NAMES = ['Google', 'Python', 'London', 'Microsoft', 'Alice', 'YouTube', 'Berlin', 'Tesla']
+
+
+def synthetic_transcript(words, seed=7):
+    """Deterministic transcript-like text with sentences, topic words and proper nouns"""
+    rng = random.Random(seed)
+    sentences, count = [], 0
+    while count < words:
+        length = min(words - count, rng.randint(6, 20))
+        sentence = []
+        for _ in range(length):
+            roll = rng.random()
+            if roll < 0.15:
+                sentence.append(rng.choice(TOPIC_WORDS))
+            elif roll < 0.2:
+                sentence.append(rng.choice(NAMES))
+            else:
+                sentence.append(rng.choice(COMMON_WORDS))
+        sentence[0] = sentence[0].capitalize()
+        sentences.append(' '.join(sentence) + rng.choice(['.', '.', '.', '?', '!']))
+        count += length
+    return ' '.join(sentences)
+
+
+def cached_input(name, build):
+    """Path of a generated input file, built once and reused across runs"""
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    path = os.path.join(CACHE_FOLDER, name)
+    if not os.path.exists(path):
+        print(f'  generating {name} ...', flush=True)
+        build(path + '.part' + os.path.splitext(name)[1])
+        os.replace(path + '.part' + os.path.splitext(name)[1], path)
+    return path
+
+
+def clear_memo_caches():
+    # Every repeat measures the cold path, not a memoized hit
+    for func in MEMO_CACHES.values():
+        func.cache_clear()
+
+
+def build_cases(args):
+    """List of (name, function, units processed, unit name)"""
+    cases = []
+    only = set(args.only.split(',')) if args.only else None
+
+    def add(group, name, func, units, unit):
+        if only is None or group in only:
+            cases.append((name, func, units, unit))
+
+    for words in args.word_counts:
+        text = synthetic_transcript(words)
+        summary = text[:500]
+        add('title', f'generate_title[{words}w]', lambda t=text: generate_title(t), words, 'words')
+        add('description', f'enhance_description[{words}w]', lambda t=text, s=summary: enhance_description(s, t), words, 'words')
+        add('tags', f'generate_video_tags[{words}w]', lambda t=text: generate_video_tags(t), words, 'words')
+        add('playlist', f'assign_playlist[{words}w]', lambda t=text: assign_playlist(t), words, 'words')
+        add('summary', f'generate_intelligent_summary[{words}w]', lambda t=text: generate_intelligent_summary(t), words, 'words')
+
+    if only is None or 'transcribe' in only:
+        for seconds in args.audio_seconds:
+            path = cached_input(f'audio_{seconds}s.mp3', lambda out, s=seconds: synthesize_audio(out, s))
+            add('transcribe', f'transcribe_audio[{seconds}s]', lambda p=path: transcribe_audio(p), seconds, 'audio s')
+
+    frames = {}
+    if only is None or only & {'frame', 'thumbnail'}:
+        for label, (width, height) in VIDEO_RESOLUTIONS.items():
+            if label not in args.resolutions:
+                continue
+            path = cached_input(f'video_{label}.mp4', lambda out, w=width, h=height: synthesize_video(out, 10, w, h))
+            add('frame', f'extract_video_frame[{label}]', lambda p=path: extract_video_frame(p, 5.0), 1, 'frames')
+            frames[label] = extract_video_frame(path, 5.0)
+
+    for label, frame in frames.items():
+        add('thumbnail', f'create_thumbnail_from_frame[{label}]',
+            lambda f=frame: create_thumbnail_from_frame(f, 'Benchmark Title For Thumbnails'), 1, 'renders')
+    source_frame = next(iter(frames.values()), None)
+    for template in THUMBNAIL_TEMPLATES:
+        if template == 'blurred_frame' and source_frame is None:
+            continue
+        add('thumbnail', f'create_custom_thumbnail[{template}]',
+            lambda t=template: create_custom_thumbnail('Benchmark Title', 'Subtitle text', t, frame=source_frame), 1, 'renders')
+    if only is None or 'thumbnail' in only:
+        image = create_custom_thumbnail('Benchmark Title', 'Subtitle text', 'gradient')
+        add('thumbnail', 'encode_thumbnail[jpeg]', lambda: encode_thumbnail(image, 'jpeg', 90), 1, 'encodes')
+        add('thumbnail', 'encode_thumbnail[jpeg,2MB budget]',
+            lambda: encode_thumbnail(image, 'jpeg', 95, 2 * 1024 * 1024), 1, 'encodes')
+    return cases
+
+
+def run_case(func, units, repeats):
+    timings = []
+    for _ in range(repeats):
+        clear_memo_caches()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    clear_memo_caches()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        'seconds': round(best, 6),
+        'median_seconds': round(statistics.median(timings), 6),
+        'throughput': round(units / best, 2) if best > 0 else None,
+        'peak_mb': round(peak / (1024 * 1024), 3)
+    }
+
+
+def compare(results, baseline, time_threshold, memory_threshold):
+    """Return a list of regression messages against the baseline results"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous['seconds'] > 0 and current['seconds'] > previous['seconds'] * (1 + time_threshold):
+            regressions.append(f"{name}: {current['seconds']:.4f}s vs baseline {previous['seconds']:.4f}s "
+                               f"(+{(current['seconds'] / previous['seconds'] - 1) * 100:.0f}%)")
+        # Ignore noise in tiny allocations
+        if previous['peak_mb'] >= 1 and current['peak_mb'] > previous['peak_mb'] * (1 + memory_threshold):
+            regressions.append(f"{name}: peak {current['peak_mb']:.1f} MB vs baseline {previous['peak_mb']:.1f} MB")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(value, cast=int):
+    return tuple(cast(item) for item in value.split(',') if item)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='1k/10k words, 10 s audio, 480p video')
+    parser.add_argument('--only', help='comma-separated groups: title,description,tags,playlist,summary,'
+                                       'transcribe,frame,thumbnail')
+    parser.add_argument('--words', help='comma-separated transcript sizes in words')
+    parser.add_argument('--audio', help='comma-separated audio durations in seconds')
+    parser.add_argument('--resolutions', help='comma-separated video resolutions (480p,720p,1080p)')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before failing (0.25 = 25%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25)
+    args = parser.parse_args()
+
+    args.word_counts = parse_list(args.words) if args.words else ((1000, 10000) if args.quick else WORD_COUNTS)
+    args.audio_seconds = parse_list(args.audio) if args.audio else ((10,) if args.quick else AUDIO_SECONDS)
+    args.resolutions = parse_list(args.resolutions, str) if args.resolutions else (
+        ('480p',) if args.quick else tuple(VIDEO_RESOLUTIONS))
+
+    # Recognition is replaced by a deterministic stub so only local work is timed
+    sr.Recognizer.recognize_google = fake_recognize_google
+
+    print('Preparing inputs ...')
+    cases = build_cases(args)
+
+    results = {}
+    for name, func, units, unit in cases:
+        result = run_case(func, units, args.repeats)
+        result['unit'] = unit
+        results[name] = result
+        print(f"{name:45s} {result['seconds'] * 1000:10.2f} ms  {result['throughput'] or 0:12.1f} {unit}/s  "
+              f"peak {result['peak_mb']:8.2f} MB", flush=True)
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'repeats': args.repeats
+        },
+        'results': results
+    }
+
+    output = args.output or os.path.join(RESULTS_FOLDER, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f'Results written to {output}')
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f).get('results', {})
+        # Merge, so a partial run only replaces the cases it measured
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'meta': report['meta'], 'results': baseline}, f, indent=2, sort_keys=True)
+        print(f'Baseline updated: {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare against (run with --update-baseline to create one)')
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f).get('results', {})
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print('REGRESSIONS:')
+        for message in regressions:
+            print(f'  {message}')
+        sys.exit(1)
+    print(f'OK: no regressions beyond {args.threshold * 100:.0f}% against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
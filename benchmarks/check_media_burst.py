@@ -0,0 +1,134 @@
+"""Check that CPU routes keep being served during a burst of media requests.
+
+Starts gunicorn with the production configuration (one worker, a few threads)
+on a private database, stores a fixture video, then keeps many more media
+requests (thumbnail variant rendering) in flight than the media class admits
+while timing a steady stream of /generate_title requests. Exits non-zero if a
+title request fails or their p95 latency exceeds --max-p95. With
+--compare-gthread the same scenario also runs on gunicorn's gthread worker,
+where admission waits on server threads, for comparison (not checked).
+
+    python benchmarks/check_media_burst.py
+    python benchmarks/check_media_burst.py --compare-gthread --threads 4
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from bench_server import ROOT, free_port, wait_until_up
+from loadtest import Fixtures, is_error, send
+
+
+def start_server(worker, port, args, database_path):
+    env = dict(os.environ, JOB_RECOVER_ON_START='false', WEB_CONCURRENCY='1', GUNICORN_THREADS=str(args.threads),
+               BIND=f'127.0.0.1:{port}', GUNICORN_ACCESS_LOG='/dev/null', DATABASE_URL=f'sqlite:///{database_path}')
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+    if worker == 'gthread':
+        command += ['-k', 'gthread', '--threads', str(args.threads), 'wsgi:application']
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_burst(base_url, args):
+    fixtures = Fixtures(base_url)
+    fixtures.setup()
+    stop = threading.Event()
+    lock = threading.Lock()
+    media = collections.Counter()
+
+    def media_client(number):
+        rng = random.Random(number)
+        while not stop.is_set():
+            method, path, body, content_type = fixtures.request('generate_thumbnail_variants', rng)
+            try:
+                status, payload, _ = send(base_url, method, path, body, content_type, timeout=args.timeout)
+            except Exception:
+                status, payload = 'failed', None
+            with lock:
+                media[status] += 1
+            if status == 503:
+                # Back off like a well-behaved client instead of hammering the server
+                stop.wait((payload or {}).get('retry_after', 1))
+
+    clients = [threading.Thread(target=media_client, args=(number,), daemon=True)
+               for number in range(args.media_clients)]
+    for client in clients:
+        client.start()
+    # Let the burst fill the media queue before timing CPU requests
+    time.sleep(2)
+
+    rng = random.Random(0)
+    latencies, failures = [], 0
+    stop_at = time.perf_counter() + args.duration
+    while time.perf_counter() < stop_at:
+        method, path, body, content_type = fixtures.request('generate_title', rng)
+        started = time.perf_counter()
+        try:
+            status, payload, _ = send(base_url, method, path, body, content_type, timeout=args.timeout)
+            ok = not is_error(status, payload)
+        except Exception:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            failures += 1
+        time.sleep(args.interval)
+
+    stop.set()
+    for client in clients:
+        client.join(args.timeout)
+
+    latencies.sort()
+    return {
+        'cpu_requests': len(latencies),
+        'cpu_failures': failures,
+        'cpu_p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'cpu_p95_ms': round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 1) if latencies else None,
+        'media_responses': {str(status): count for status, count in sorted(media.items(), key=str)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds of CPU requests during the burst')
+    parser.add_argument('--interval', type=float, default=0.2, help='pause between CPU requests')
+    parser.add_argument('--media-clients', type=int, default=32, help='concurrent media clients in the burst')
+    parser.add_argument('--threads', type=int, default=4, help='GUNICORN_THREADS of the server under test')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--max-p95', type=float, default=2.0, help='seconds allowed for the p95 CPU latency')
+    parser.add_argument('--compare-gthread', action='store_true', help='also run on the gthread worker')
+    args = parser.parse_args()
+
+    passed = True
+    for worker in ['asgi', 'gthread'] if args.compare_gthread else ['asgi']:
+        port = free_port()
+        with tempfile.TemporaryDirectory() as directory:
+            process = start_server(worker, port, args, os.path.join(directory, 'burst.db'))
+            try:
+                if not wait_until_up(f'http://127.0.0.1:{port}/'):
+                    raise SystemExit(f"{worker}: server did not start")
+                result = run_burst(f'http://127.0.0.1:{port}', args)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+        print(f"{worker:8s} {json.dumps(result)}")
+        if worker == 'asgi':
+            passed = (result['cpu_requests'] > 0 and not result['cpu_failures']
+                      and result['cpu_p95_ms'] <= args.max_p95 * 1000)
+
+    print('PASS' if passed else 'FAIL: CPU requests were starved by the media burst')
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+"""HTTP load generator for the Flask endpoints.
+
+Replays a weighted mix of requests covering every route in app.py, built
+from fixture payloads (synthetic transcripts, a short WAV file and a short
+video), and reports latency percentiles, throughput and error rates per
+endpoint.
+
+Load is either closed-loop (a fixed number of concurrent clients) or
+open-loop (Poisson arrivals at a target rate; latency is measured from the
+scheduled send time, so queueing delay is not hidden). The target is any
+running server (--url) or, with --in-process, the app served from this
+process on a private database, with speech recognition and the YouTube API
+replaced by local stand-ins.
+
+    python benchmarks/loadtest.py --in-process --concurrency 8 --duration 30
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --rate 20 --duration 60
+    python benchmarks/loadtest.py --in-process --mix mix.json --output results.json
+
+A mix file maps endpoint names (see ENDPOINTS) to relative weights; endpoints
+left out are not exercised.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+TRANSCRIPT = (
+    "In this Python programming tutorial we build a Flask web application step by step. "
+    "You will learn how to design routes, connect a database and deploy the app with Docker. "
+    "Google and Microsoft both publish great guides, but this lesson focuses on simple, practical code. "
+    "By the end you can build and ship your own project, and we review the best tips for beginners."
+)
+
+# Relative request frequencies of the default mix: text generation dominates real traffic
+ENDPOINTS = {
+    'index': 2,
+    'manual': 1,
+    'generate_title': 10,
+    'enhance_description': 8,
+    'analyze_content': 4,
+    'generate_tags': 8,
+    'suggest_category': 4,
+    'analyze_tags_content': 3,
+    'assign_playlist': 6,
+    'analyze_playlist_content': 3,
+    'generate_number': 4,
+    'transcribe': 3,
+    'detect_language': 1,
+    'process_video': 2,
+    'upload_video': 1,
+    'job_status': 2,
+    'scene_index': 1,
+    'storyboard': 1,
+    'generate_thumbnail_from_video': 3,
+    'generate_thumbnail_variants': 1,
+    'generate_custom_thumbnail': 6,
+    'thumbnail_url': 1,
+    'metrics': 1,
+    'cache_stats': 1,
+    'events_stats': 1,
+}
+
+
+def synthesize_wav(seconds=3, sample_rate=16000):
+    """Bytes of a mono 16-bit WAV file with a tone"""
+    samples = (np.sin(np.arange(int(seconds * sample_rate)) * 2 * np.pi * 440 / sample_rate) * 8000).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def synthesize_video_bytes(seconds=3):
+    from bench_best_frame import synthesize_video
+
+    path = os.path.join(tempfile.gettempdir(), f'loadtest_video_{seconds}s.mp4')
+    if not os.path.exists(path):
+        synthesize_video(path, seconds, 640, 360, fps=15)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def encode_multipart(fields, files):
+    """multipart/form-data body for `fields` {name: value} and `files` {name: (filename, bytes, mime)}"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, mime_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {mime_type}\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Fixtures:
+    """Request payloads plus state learned during setup (stored video hash, job ids, ...)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.audio = synthesize_wav()
+        self.video = synthesize_video_bytes()
+        self.video_hash = None
+        self.job_ids = []
+        self.thumbnail_urls = []
+
+    def setup(self):
+        """Store the fixture video once so most video requests can refer to it by hash"""
+        body, content_type = encode_multipart({}, {'video': ('fixture.mp4', self.video, 'video/mp4')})
+        status, payload, _ = send(self.base_url, 'POST', '/scene_index', body, content_type)
+        if status != 200 or not payload.get('video_hash'):
+            raise SystemExit(f'Setup failed: could not store the fixture video ({status}: {payload})')
+        self.video_hash = payload['video_hash']
+
+    def request(self, name, rng):
+        """(method, path, body, content type) for one request to endpoint `name`"""
+        words = TRANSCRIPT.split()
+        # Vary the text so response caches and memoization do not turn the run into a cache benchmark
+        content = ' '.join(rng.sample(words, len(words))) + f' Episode {rng.randint(1, 10 ** 6)}.'
+
+        def as_json(path, payload):
+            return 'POST', path, json.dumps(payload).encode(), 'application/json'
+
+        def as_form(path, fields, files=None):
+            body, content_type = encode_multipart(fields, files or {})
+            return 'POST', path, body, content_type
+
+        if name == 'index':
+            return 'GET', '/', None, None
+        if name == 'manual':
+            return 'GET', '/manual', None, None
+        if name == 'generate_title':
+            return as_json('/generate_title', {'content': content, 'options': {}})
+        if name == 'enhance_description':
+            return as_json('/enhance_description', {'content': 'My new video.', 'video_content': content})
+        if name in ('analyze_content', 'suggest_category', 'analyze_tags_content', 'analyze_playlist_content'):
+            return as_json(f'/{name}', {'content': content})
+        if name == 'generate_tags':
+            return as_json('/generate_tags', {'content': content, 'max_tags': 15})
+        if name == 'assign_playlist':
+            return as_json('/assign_playlist', {'content': content, 'options': {}})
+        if name == 'generate_number':
+            video_type, parent_number = rng.choice([('main', None), ('follow_up', '001'), ('clarification', '001.01')])
+            return as_json('/generate_number', {'video_type': video_type, 'parent_number': parent_number})
+        if name == 'transcribe':
+            return as_form('/transcribe', {'language': 'en-US'}, {'audio': ('speech.wav', self.audio, 'audio/wav')})
+        if name == 'detect_language':
+            return as_form('/detect_language', {}, {'audio': ('speech.wav', self.audio, 'audio/wav')})
+        if name == 'process_video':
+            return as_json('/process_video', {'content': content, 'video_hash': self.video_hash})
+        if name == 'upload_video':
+            return as_form('/upload_video', {'title': 'Load test', 'description': content, 'tags': 'a,b',
+                                             'category_id': '27', 'privacy_status': 'private'},
+                           {'video': ('upload.mp4', self.video, 'video/mp4')})
+        if name == 'job_status':
+            job_id = rng.choice(self.job_ids) if self.job_ids else uuid.uuid4().hex
+            return 'GET', f'/jobs/{job_id}', None, None
+        if name == 'scene_index':
+            return as_form('/scene_index', {'video_hash': self.video_hash})
+        if name == 'storyboard':
+            return as_json('/storyboard', {'video_hash': self.video_hash, 'interval': 1})
+        if name == 'generate_thumbnail_from_video':
+            return as_form('/generate_thumbnail_from_video', {
+                'video_hash': self.video_hash, 'title': content[:60], 'mode': rng.choice(['timestamp', 'best']),
+                'format': 'jpeg', 'response': 'url'})
+        if name == 'generate_thumbnail_variants':
+            return as_json('/generate_thumbnail_variants', {'video_hash': self.video_hash, 'response': 'url', 'variants': [
+                {'title': content[:40], 'timestamp': 1.0},
+                {'title': content[:40], 'template': 'blurred_frame', 'timestamp': 2.0}]})
+        if name == 'generate_custom_thumbnail':
+            return as_json('/generate_custom_thumbnail', {
+                'title': content[:50], 'subtitle': 'Load test', 'format': 'jpeg', 'response': 'url',
+                'template': rng.choice(['gradient', 'solid', 'pattern', 'sunset', 'ocean', 'vignette'])})
+        if name == 'thumbnail_url':
+            path = rng.choice(self.thumbnail_urls) if self.thumbnail_urls else '/thumbnails/missing0000000000.jpeg'
+            return 'GET', path, None, None
+        if name == 'metrics':
+            return 'GET', '/metrics', None, None
+        if name == 'cache_stats':
+            return 'GET', '/cache/stats', None, None
+        if name == 'events_stats':
+            return 'GET', '/events/stats', None, None
+        raise ValueError(f'Unknown endpoint {name}')
+
+    def learn(self, name, payload):
+        """Remember ids handed out by responses so follow-up requests hit real resources"""
+        if not isinstance(payload, dict):
+            return
+        if payload.get('job_id') and len(self.job_ids) < 1000:
+            self.job_ids.append(payload['job_id'])
+        if payload.get('url') and len(self.thumbnail_urls) < 1000:
+            self.thumbnail_urls.append(payload['url'])
+
+
+def send(base_url, method, path, body=None, content_type=None, timeout=120, headers=None):
+    """Issue one request; returns (status, parsed JSON or None, byte count)"""
+    request = urllib.request.Request(base_url + path, data=body, method=method, headers=headers or {})
+    if content_type:
+        request.add_header('Content-Type', content_type)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, data, mime = response.status, response.read(), response.headers.get_content_type()
+    except urllib.error.HTTPError as e:
+        status, data, mime = e.code, e.read(), e.headers.get_content_type()
+    payload = None
+    if mime == 'application/json':
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            pass
+    return status, payload, len(data)
+
+
+def is_error(status, payload):
+    # Most routes report failures as a 200 with success false or an error message
+    if status >= 400:
+        return True
+    return isinstance(payload, dict) and (payload.get('success') is False or bool(payload.get('error')))
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, name, latency, error):
+        with self.lock:
+            self.samples.setdefault(name, []).append((latency, error))
+
+    def report(self, elapsed):
+        def summarize(samples):
+            latencies = sorted(latency for latency, _ in samples)
+            errors = sum(1 for _, error in samples if error)
+
+            def percentile(q):
+                return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+            return {
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': round(errors / len(samples), 4),
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'p99_ms': percentile(0.99),
+                'mean_ms': round(statistics.fmean(latencies) * 1000, 2)
+            }
+
+        with self.lock:
+            endpoints = {name: summarize(samples) for name, samples in sorted(self.samples.items())}
+            everything = [sample for samples in self.samples.values() for sample in samples]
+        return {'elapsed_seconds': round(elapsed, 2), 'total': summarize(everything) if everything else None,
+                'endpoints': endpoints}
+
+
+def run_load(base_url, fixtures, mix, args):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    recorder = Recorder()
+    rng_lock = threading.Lock()
+    rng = random.Random(args.seed)
+
+    def one_request(scheduled):
+        with rng_lock:
+            name = rng.choices(names, weights)[0]
+            method, path, body, content_type = fixtures.request(name, rng)
+        try:
+            status, payload, _ = send(base_url, method, path, body, content_type, timeout=args.timeout,
+                                      headers={'X-Priority': args.priority})
+            fixtures.learn(name, payload)
+            error = is_error(status, payload)
+        except Exception:
+            error = True
+        recorder.add(name, time.perf_counter() - scheduled, error)
+
+    started = time.perf_counter()
+    stop_at = started + args.duration
+
+    if args.rate:
+        # Open loop: arrivals follow a Poisson process regardless of how fast responses come back
+        with ThreadPoolExecutor(max_workers=args.max_inflight) as executor:
+            next_at = started
+            while True:
+                next_at += rng.expovariate(args.rate)
+                if next_at >= stop_at:
+                    break
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                executor.submit(one_request, next_at)
+    else:
+        def client():
+            while time.perf_counter() < stop_at:
+                one_request(time.perf_counter())
+
+        threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return recorder.report(time.perf_counter() - started)
+
+
+class FakeYouTube:
+    """Stand-in for the YouTube Data API client: uploads 'complete' in a few chunks"""
+
+    class Insert:
+        def __init__(self):
+            self.chunks = 0
+
+        def next_chunk(self):
+            self.chunks += 1
+            time.sleep(0.05)
+            if self.chunks < 4:
+                return type('Status', (), {'progress': lambda _, c=self.chunks: c / 4})(), None
+            return None, {'id': uuid.uuid4().hex[:11]}
+
+    def videos(self):
+        return self
+
+    def insert(self, **kwargs):
+        return FakeYouTube.Insert()
+
+
+def start_in_process_server():
+    """Serve the app from this process with a private database and local stand-ins"""
+    instance = tempfile.mkdtemp(prefix='loadtest-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(instance, 'loadtest.db')
+    os.environ['JOB_RECOVER_ON_START'] = 'false'
+
+    import speech_recognition as sr
+    from werkzeug.serving import make_server
+
+    from bench_audio_memory import fake_recognize_google
+    import utils
+    from app import app
+
+    sr.Recognizer.recognize_google = fake_recognize_google
+    utils.get_authenticated_service = lambda: FakeYouTube()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def print_report(report):
+    header = f"{'endpoint':32s} {'reqs':>7s} {'err%':>6s} {'rps':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}"
+    print(header)
+    print('-' * len(header))
+    rows = list(report['endpoints'].items()) + ([('TOTAL', report['total'])] if report['total'] else [])
+    for name, row in rows:
+        print(f"{name:32s} {row['requests']:7d} {row['error_rate'] * 100:6.1f} {row['throughput_rps']:8.2f} "
+              f"{row['p50_ms']:9.2f} {row['p95_ms']:9.2f} {row['p99_ms']:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='base URL of a running server')
+    target.add_argument('--in-process', action='store_true', help='serve the app from this process with fakes')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of load')
+    parser.add_argument('--concurrency', type=int, default=8, help='closed-loop clients (ignored with --rate)')
+    parser.add_argument('--rate', type=float, help='open-loop arrival rate in requests per second')
+    parser.add_argument('--max-inflight', type=int, default=256, help='request cap in open-loop mode')
+    parser.add_argument('--mix', help='JSON file of endpoint weights (default: built-in mix of all routes)')
+    parser.add_argument('--endpoints', help='comma-separated subset of the mix to exercise')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--priority', choices=('interactive', 'bulk'), default='interactive',
+                        help='scheduling lane requested with X-Priority')
+    parser.add_argument('--output', help='write the report as JSON')
+    args = parser.parse_args()
+
+    mix = dict(ENDPOINTS)
+    if args.mix:
+        with open(args.mix) as f:
+            mix = json.load(f)
+    if args.endpoints:
+        mix = {name: mix.get(name, 1) for name in args.endpoints.split(',')}
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+
+    server = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if args.in_process:
+        server, base_url = start_in_process_server()
+
+    try:
+        fixtures = Fixtures(base_url)
+        fixtures.setup()
+        mode = f'{args.rate:g} req/s open loop' if args.rate else f'{args.concurrency} concurrent clients'
+        print(f'Load testing {base_url} for {args.duration:g}s with {mode} ...')
+        report = run_load(base_url, fixtures, mix, args)
+        report['config'] = {'target': 'in-process' if args.in_process else base_url, 'duration': args.duration,
+                            'concurrency': None if args.rate else args.concurrency, 'rate': args.rate,
+                            'priority': args.priority, 'mix': mix}
+        print_report(report)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f'Report written to {args.output}')
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Negotiated gzip/brotli compression of response bodies.
+
+Compression is applied in after_request to buffered responses whose type is
+compressible and whose body is at least COMPRESS_MIN_SIZE bytes. Brotli is
+preferred when the client accepts it and the brotli package is installed,
+otherwise gzip. Streamed responses (file downloads, Server-Sent Events) and
+responses that already carry a Content-Encoding are left untouched.
+
+A compressed representation differs byte-for-byte from the original, so a
+strong ETag is turned into a weak one; conditional requests must therefore
+compare ETags weakly (request.if_none_match.contains_weak).
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'application/json',
+    'application/javascript',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/markdown',
+    'text/plain',
+    'image/svg+xml',
+)
+
+
+def compress(data, encoding, level=None):
+    """Compress `data` with 'br' or 'gzip' at `level` (quality for brotli)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=4 if level is None else level)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class ResponseCompressor:
+    """Flask extension compressing large text responses for clients that accept it"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('COMPRESS_ENABLED', True))
+        self.min_size = int(app.config.get('COMPRESS_MIN_SIZE', 1024))
+        self.gzip_level = int(app.config.get('COMPRESS_GZIP_LEVEL', 6))
+        self.brotli_quality = int(app.config.get('COMPRESS_BROTLI_QUALITY', 4))
+        self.mimetypes = set(app.config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES))
+        app.extensions['response_compressor'] = self
+        app.after_request(self._after_request)
+
+    def choose_encoding(self, accept_encodings):
+        """Best supported encoding in an Accept-Encoding header, or None"""
+        best, best_quality = None, 0
+        for encoding in available_encodings():
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def _after_request(self, response):
+        if not self.enabled or request.method == 'HEAD':
+            return response
+        if response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+                or response.status_code < 200 or response.status_code in (204, 206, 304)):
+            return response
+
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        compressed = compress(data, encoding, self.brotli_quality if encoding == 'br' else self.gzip_level)
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
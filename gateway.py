@@ -0,0 +1,267 @@
+"""ASGI front end running the Flask app on a bounded thread pool.
+
+gunicorn's asyncio worker accepts connections and runs the gateway on its
+event loop. Ordinary requests are read off the connection on the loop and
+then handed, with their body, to a pool of `threads` threads that call the
+Flask app through WSGI, so views keep their blocking code. Progress streams
+(Server-Sent Events) are served on the event loop itself: an open stream is a
+coroutine waiting for its channel, not a pool thread, so idle subscribers
+cannot starve the routes that do work.
+
+Routes in an admission class (see admission.py) are admitted on the event
+loop before any thread is taken, and then run on a pool of that class's own,
+sized to its concurrency; all other routes share the pool of `threads`
+threads. A burst of media rendering therefore queues as coroutines and never
+occupies the threads that CPU, I/O or unclassified requests run on.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.datastructures import EnvironHeaders
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+from admission import ADMITTED_ENVIRON_KEY, Overloaded
+from progress import SubscriberLimitReached, format_sse, parse_last_event_id
+
+# Request bodies larger than this are spooled to a temporary file
+BODY_SPOOL_BYTES = 1024 * 1024
+
+
+class Gateway:
+    """ASGI application serving a Flask app; `event_streams` maps endpoints to stream openers.
+
+    An opener is called with the endpoint's view arguments and `last_event_id`, inside
+    an app context, and returns a progress Subscription; it raises LookupError for
+    unknown streams.
+    """
+
+    def __init__(self, app, threads=8, event_streams=None):
+        self.app = app
+        self.threads = max(1, int(threads))
+        self.event_streams = event_streams or {}
+        self.admission = app.extensions.get('admission_controller')
+        self.executors = {}
+        self.pid = None
+
+    def get_executor(self, endpoint_class=None):
+        """Thread pool of an endpoint class, or the shared pool for unclassified routes"""
+        # Created lazily so each forked worker process gets its own threads
+        if self.pid != os.getpid():
+            self.executors = {}
+            self.pid = os.getpid()
+        name = endpoint_class.name if endpoint_class is not None else None
+        executor = self.executors.get(name)
+        if executor is None:
+            executor = self.executors[name] = ThreadPoolExecutor(
+                max_workers=endpoint_class.concurrency if endpoint_class is not None else self.threads,
+                thread_name_prefix=f"app-{name or 'thread'}")
+        return executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'websocket':
+            await receive()
+            await send({'type': 'websocket.close', 'code': 1003})
+        elif scope['type'] == 'http':
+            endpoint, view_args = self._match(scope)
+            if endpoint in self.event_streams and scope['method'] == 'GET':
+                await self._serve_events(scope, receive, send, self.event_streams[endpoint], view_args)
+            else:
+                await self._serve_wsgi(scope, receive, send, self.app.view_functions.get(endpoint))
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for executor in self.executors.values():
+                    executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _match(self, scope):
+        """(endpoint, view arguments) of the Flask route a request maps to, or (None, {})"""
+        adapter = self.app.url_map.bind('localhost')
+        try:
+            return adapter.match(scope['path'], method=scope['method'])
+        except (HTTPException, RequestRedirect):
+            return None, {}
+
+    async def _read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        size = body.tell()
+        body.seek(0)
+        return body, size
+
+    def _environ(self, scope, body, size):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client')
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1] or 80),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0] if client else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+            value = value.decode('latin-1')
+            if key in environ:
+                value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+            environ[key] = value
+        # Chunked bodies have been read in full, so their length is known now
+        if size and 'CONTENT_LENGTH' not in environ:
+            environ['CONTENT_LENGTH'] = str(size)
+        return environ
+
+    async def _serve_wsgi(self, scope, receive, send, view):
+        # The body is read before admission, so a slot is only held while the request runs
+        body, size = await self._read_body(receive)
+        try:
+            environ = self._environ(scope, body, size)
+            endpoint_class = self.admission.endpoint_class_of(view) if self.admission is not None else None
+            if endpoint_class is None:
+                await self._run_app(self.get_executor(), environ, send)
+                return
+            try:
+                async with self.admission.admitted_async(endpoint_class,
+                                                         self.admission.lane_for(EnvironHeaders(environ))):
+                    environ[ADMITTED_ENVIRON_KEY] = True
+                    await self._run_app(self.get_executor(endpoint_class), environ, send)
+            except Overloaded as e:
+                await self._send_error(send, 503, str(e), e.retry_after)
+        finally:
+            body.close()
+
+    async def _run_app(self, executor, environ, send):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, self._call_app, environ, loop, send)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The client went away; keep the admission slot until the thread is free again
+            await asyncio.wait({future})
+            raise
+
+    def _call_app(self, environ, loop, send):
+        """Run the WSGI app on a pool thread, relaying its response to the event loop"""
+        response = {}
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start():
+            if not response.get('sent'):
+                response['sent'] = True
+                emit({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+
+        def write(data):
+            start()
+            emit({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return write
+
+        result = self.app(environ, start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    write(chunk)
+            start()
+            emit({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    def _open_stream(self, opener, view_args, last_event_id):
+        with self.app.app_context():
+            return opener(last_event_id=last_event_id, **view_args)
+
+    async def _send_error(self, send, status, error, retry_after=None):
+        payload = {"success": False, "error": error}
+        headers = [(b'content-type', b'application/json')]
+        if retry_after is not None:
+            payload['retry_after'] = retry_after
+            headers.append((b'retry-after', str(retry_after).encode()))
+        body = self.app.json.dumps(payload).encode('utf-8')
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+    async def _serve_events(self, scope, receive, send, opener, view_args):
+        loop = asyncio.get_running_loop()
+        headers = dict(scope.get('headers', ()))
+        query = dict(pair.partition('=')[::2] for pair in scope.get('query_string', b'').decode('latin-1').split('&'))
+        last_event_id = parse_last_event_id(headers.get(b'last-event-id', b'').decode('latin-1')
+                                             or query.get('last_event_id'))
+        try:
+            # The loop's default executor, so opening a stream never waits behind busy views
+            subscription = await loop.run_in_executor(None, self._open_stream, opener, view_args, last_event_id)
+        except LookupError as e:
+            await self._send_error(send, 404, str(e))
+            return
+        except SubscriberLimitReached as e:
+            await self._send_error(send, 503, str(e), e.retry_after)
+            return
+
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                # Disable response buffering in nginx-style reverse proxies
+                (b'x-accel-buffering', b'no')
+            ]})
+            pump = asyncio.ensure_future(self._pump_events(subscription, send))
+            disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+            done, pending = await asyncio.wait({pump, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if pump in done:
+                pump.result()
+        finally:
+            subscription.close()
+
+    async def _pump_events(self, subscription, send):
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        events = subscription.events_async()
+        try:
+            async for entry in events:
+                text = ": keepalive\n\n" if entry is None else format_sse(*entry)
+                await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+        finally:
+            await events.aclose()
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
@@ -0,0 +1,58 @@
+"""Gunicorn configuration for production deployments.
+
+The app is preloaded in the master (NLTK corpora, Punkt tokenizer, POS tagger,
+stop-word lexicon) and then forked, so workers share those models
+copy-on-write. Workers run gunicorn's asyncio worker with the gateway from
+asgi.py in front of the app: views run on GUNICORN_THREADS threads per worker,
+while progress streams stay on the event loop. Every setting can be overridden
+through the environment.
+"""
+import gc
+import multiprocessing
+import os
+
+# Jobs are recovered per worker after fork (see post_fork), not in the master
+os.environ.setdefault("JOB_RECOVER_ON_START", "false")
+
+wsgi_app = "asgi:application"
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+preload_app = True
+
+# NLP routes are CPU-bound (one worker per core); recognition and uploads mostly
+# wait on the network, which the gateway's threads within each worker cover
+# (GUNICORN_THREADS, read by the app as SERVER_THREADS)
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Every worker renders thumbnail variants on its own process pool (variants.py); split the
+# cores between the workers' pools instead of giving each one a process per core
+os.environ.setdefault("VARIANT_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+worker_class = "asgi"
+# Open connections per worker, including idle progress streams
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# Transcription of long files can legitimately take minutes
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 300))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to contain slow leaks in native libraries
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = 100
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach so the garbage
+    # collector does not write to (and un-share) the preloaded pages in workers
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import app, db, job_queue
+
+    # Connections and threads opened in the master must not be shared with workers
+    with app.app_context():
+        db.engine.dispose()
+    job_queue.after_fork()
+    job_queue.recover()
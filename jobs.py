@@ -0,0 +1,328 @@
+"""Persistent background job queue.
+
+Jobs are stored in the application database (SQLite by default) so queued and
+interrupted work is picked up again after a process restart. Execution happens
+on a bounded thread pool; each job kind is dispatched to a registered handler.
+State changes and progress are also published to an optional progress broker
+under the job id, for streaming to clients.
+
+A running job is leased to the process executing it: the row records the
+owner and a lease expiry that a heartbeat thread renews independently of
+progress reports. Only jobs whose lease has expired (their process died) are
+reclaimed, so a handler that stalls without reporting progress is never run
+a second time while it is still alive.
+
+Progress of jobs running in another process is relayed to this process's
+subscribers by follow(): a single thread polls the rows of every followed job
+with one query per interval, however many clients are subscribed.
+"""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+
+JOB_STATES = ('queued', 'running', 'succeeded', 'failed')
+
+
+class JobQueue:
+    """Database-backed job queue executed on a bounded worker pool"""
+
+    def __init__(self, app=None, db=None, broker=None):
+        self.app = None
+        self.db = db
+        self.broker = broker
+        self.handlers = {}
+        self.executor = None
+        self.running = set()
+        self.running_lock = threading.Lock()
+        self.heartbeat_thread = None
+        self.followed = {}
+        self.follow_lock = threading.Lock()
+        self.follow_thread = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        self.app = app
+        if db is not None:
+            self.db = db
+        self.max_workers = int(app.config.get('JOB_WORKERS', 2))
+        self.lease_seconds = int(app.config.get('JOB_LEASE_SECONDS', 60))
+        self.worker_id = self._new_worker_id()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-worker')
+        app.extensions['job_queue'] = self
+
+    def after_fork(self):
+        """Replace the worker pool in a forked child; the parent's threads do not survive fork"""
+        self.worker_id = self._new_worker_id()
+        self.running = set()
+        self.heartbeat_thread = None
+        self.followed = {}
+        self.follow_thread = None
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-worker')
+
+    @staticmethod
+    def _new_worker_id():
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def handler(self, kind):
+        """Register a function handling jobs of `kind`.
+
+        The handler is called as handler(payload, report_progress) inside an
+        application context and returns a JSON-serialisable result.
+        report_progress(fraction, **details) records progress; the details
+        (e.g. stage, partial output) are only streamed, not persisted.
+        """
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    def submit(self, kind, payload, unique=False):
+        """Persist a new job and schedule it; returns the job id immediately.
+
+        With `unique`, a queued or running job of the same kind and payload (from any
+        process) is reused instead of submitting a duplicate.
+        """
+        from models import Job
+
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+
+        active_key = None
+        if unique:
+            encoded = json.dumps([kind, payload], sort_keys=True).encode('utf-8')
+            active_key = hashlib.sha256(encoded).hexdigest()
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, state='queued', payload=json.dumps(payload), active_key=active_key)
+        self.db.session.add(job)
+        try:
+            self.db.session.commit()
+        except IntegrityError:
+            self.db.session.rollback()
+            existing = Job.query.filter_by(active_key=active_key).first()
+            if existing is None:
+                raise
+            return existing.id
+
+        self._publish(job.id, 'state', {'state': 'queued'})
+        self.executor.submit(self._run, job.id)
+        return job.id
+
+    def _publish(self, job_id, event, data, final=False):
+        if self.broker is not None:
+            self.broker.publish(job_id, event, data, final=final)
+
+    def get(self, job_id):
+        """Return the public view of a job, or None if it does not exist"""
+        from models import Job
+
+        job = self.db.session.get(Job, job_id)
+        if job is None:
+            return None
+
+        result = json.loads(job.result) if job.result else None
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'state': job.state,
+            'progress': round(job.progress or 0.0, 4),
+            'result': result,
+            'error': job.error,
+            'attempts': job.attempts,
+            'created_at': job.created_at.isoformat() + 'Z',
+            'updated_at': job.updated_at.isoformat() + 'Z'
+        }
+
+    def follow(self, job_id, interval=1.0):
+        """Publish a job's state changes to the broker by following its database row.
+
+        For jobs submitted through another server process. The row is polled until the
+        job finishes or no subscriber in this process is left.
+        """
+        with self.follow_lock:
+            self.followed.setdefault(job_id, None)
+            if self.follow_thread is None or not self.follow_thread.is_alive():
+                self.follow_thread = threading.Thread(target=self._follow, args=(interval,),
+                                                      name='job-follower', daemon=True)
+                self.follow_thread.start()
+
+    def _follow(self, interval):
+        from models import Job
+
+        while True:
+            with self.follow_lock:
+                job_ids = list(self.followed)
+                if not job_ids:
+                    self.follow_thread = None
+                    return
+            with self.app.app_context():
+                try:
+                    rows = {job.id: (job.state, round(job.progress or 0.0, 4), job.result, job.error)
+                            for job in Job.query.filter(Job.id.in_(job_ids))}
+                except Exception as e:
+                    print(f"Error following jobs: {str(e)}")
+                    rows = None
+                finally:
+                    self.db.session.remove()
+
+            if rows is not None:
+                for job_id in job_ids:
+                    self._relay(job_id, rows.get(job_id))
+            time.sleep(interval)
+
+    def _relay(self, job_id, row):
+        with self.follow_lock:
+            last = self.followed.get(job_id)
+        done = row is None or row[0] in ('succeeded', 'failed')
+        if row is None:
+            self._publish(job_id, 'error', {'state': 'failed', 'error': 'Job not found'}, final=True)
+        elif row[:2] != last:
+            state, progress, result, error = row
+            if state == 'succeeded':
+                self._publish(job_id, 'result', {'state': state, 'result': json.loads(result) if result else None},
+                              final=True)
+            elif state == 'failed':
+                self._publish(job_id, 'error', {'state': state, 'error': error}, final=True)
+            else:
+                self._publish(job_id, 'progress', {'state': state, 'progress': progress})
+
+        with self.follow_lock:
+            if done or (self.broker is not None and not self.broker.subscriber_count(job_id)):
+                self.followed.pop(job_id, None)
+            elif row is not None:
+                self.followed[job_id] = row[:2]
+
+    def recover(self):
+        """Reschedule jobs left queued, or orphaned while running by a process that died.
+
+        Running jobs are only reclaimed once their lease has expired, i.e. their owner
+        stopped renewing it for `JOB_LEASE_SECONDS`; a live owner renews the lease even
+        while its handler reports no progress, so such jobs are never run twice. Jobs
+        leased to other processes are re-checked after the lease period.
+        """
+        from models import Job
+
+        with self.app.app_context():
+            now = datetime.utcnow()
+            self.db.session.execute(
+                update(Job)
+                .where(Job.state == 'running', or_(
+                    Job.lease_expires_at < now,
+                    # Rows written before leases existed
+                    and_(Job.lease_expires_at.is_(None),
+                         Job.updated_at < now - timedelta(seconds=self.lease_seconds))))
+                .values(state='queued', lease_owner=None, lease_expires_at=None)
+            )
+            self.db.session.commit()
+
+            queued = [job.id for job in Job.query.filter_by(state='queued').order_by(Job.created_at)]
+            leased_elsewhere = Job.query.filter(Job.state == 'running', Job.lease_owner != self.worker_id).count()
+
+        for job_id in queued:
+            self.executor.submit(self._run, job_id)
+
+        if leased_elsewhere:
+            timer = threading.Timer(self.lease_seconds, self.recover)
+            timer.daemon = True
+            timer.start()
+
+        return len(queued)
+
+    def _claim(self, job_id):
+        """Atomically move a job from queued to running; False if someone else got it"""
+        from models import Job
+
+        claimed = self.db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.state == 'queued')
+            .values(state='running', attempts=Job.attempts + 1, updated_at=datetime.utcnow(),
+                    lease_owner=self.worker_id,
+                    lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+        )
+        self.db.session.commit()
+        return claimed.rowcount == 1
+
+    def _start_heartbeat(self):
+        with self.running_lock:
+            if self.heartbeat_thread is None or not self.heartbeat_thread.is_alive():
+                self.heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+                self.heartbeat_thread.start()
+
+    def _heartbeat(self):
+        """Renew the leases of the jobs running in this process until none are left"""
+        from models import Job
+
+        while True:
+            with self.running_lock:
+                job_ids = list(self.running)
+                if not job_ids:
+                    self.heartbeat_thread = None
+                    return
+            with self.app.app_context():
+                try:
+                    self.db.session.execute(
+                        update(Job)
+                        .where(Job.id.in_(job_ids), Job.lease_owner == self.worker_id)
+                        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                    )
+                    self.db.session.commit()
+                except Exception as e:
+                    print(f"Error renewing job leases: {str(e)}")
+                    self.db.session.rollback()
+                finally:
+                    self.db.session.remove()
+            time.sleep(self.lease_seconds / 3)
+
+    def _set(self, job_id, **values):
+        from models import Job
+
+        values['updated_at'] = datetime.utcnow()
+        self.db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+        self.db.session.commit()
+
+    def _run(self, job_id):
+        from models import Job
+
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+                with self.running_lock:
+                    self.running.add(job_id)
+                self._start_heartbeat()
+                self._publish(job_id, 'state', {'state': 'running'})
+
+                job = self.db.session.get(Job, job_id)
+                handler = self.handlers.get(job.kind)
+                if handler is None:
+                    raise ValueError(f"No handler registered for job kind '{job.kind}'")
+                payload = json.loads(job.payload)
+
+                def report_progress(fraction, **details):
+                    progress = max(0.0, min(1.0, float(fraction)))
+                    self._set(job_id, progress=progress)
+                    self._publish(job_id, 'progress', dict(details, progress=progress))
+
+                result = handler(payload, report_progress)
+                self._set(job_id, state='succeeded', progress=1.0, result=json.dumps(result),
+                          active_key=None, lease_owner=None, lease_expires_at=None)
+                self._publish(job_id, 'result', {'state': 'succeeded', 'result': result}, final=True)
+            except Exception as e:
+                print(f"Error running job {job_id}: {str(e)}")
+                self.db.session.rollback()
+                self._set(job_id, state='failed', error=str(e), active_key=None,
+                          lease_owner=None, lease_expires_at=None)
+                self._publish(job_id, 'error', {'state': 'failed', 'error': str(e)}, final=True)
+            finally:
+                with self.running_lock:
+                    self.running.discard(job_id)
+                self.db.session.remove()
@@ -0,0 +1,125 @@
+"""Content-addressed storage for uploaded media.
+
+Uploads are stored once under their SHA-256 so later requests can refer to a
+video by hash instead of re-uploading it, and derived data (scene indexes,
+storyboards, ...) can be persisted next to the file it was computed from.
+
+It also holds short-lived rendered outputs that are handed out by URL
+instead of being inlined into JSON responses.
+"""
+import glob
+import hashlib
+import os
+import re
+import secrets
+import tempfile
+import time
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}\.[a-z0-9]{1,8}$')
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def is_valid_hash(media_hash):
+    return bool(media_hash) and bool(HASH_PATTERN.match(media_hash))
+
+
+def spool_upload(file_storage, media_folder):
+    """Stream an uploaded file into the store, hashing as it goes.
+
+    Returns (media_hash, path). If identical content is already stored the
+    existing file is reused.
+    """
+    os.makedirs(media_folder, exist_ok=True)
+    extension = os.path.splitext(file_storage.filename or '')[1].lower()
+    if not re.match(r'^\.[a-z0-9]{1,8}$', extension):
+        extension = '.bin'
+
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=media_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        media_hash = digest.hexdigest()
+        existing = media_path(media_folder, media_hash)
+        if existing:
+            os.remove(temp_path)
+            return media_hash, existing
+
+        path = os.path.join(media_folder, media_hash + extension)
+        os.replace(temp_path, path)
+        return media_hash, path
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def media_path(media_folder, media_hash):
+    """Path of the stored media for a hash, or None if it is unknown"""
+    if not is_valid_hash(media_hash):
+        return None
+    for path in glob.glob(os.path.join(media_folder, media_hash + '.*')):
+        # Sidecars are named <hash>.<name>.json; the media file has a single extension
+        if os.path.basename(path).count('.') == 1:
+            return path
+    return None
+
+
+def sidecar_path(media_folder, media_hash, name):
+    """Path for derived data stored alongside a media file"""
+    if not is_valid_hash(media_hash):
+        raise ValueError("Invalid media hash")
+    return os.path.join(media_folder, f"{media_hash}.{name}.json")
+
+
+def derived_dir(media_folder, media_hash, name):
+    """Directory for multi-file derived data (e.g. storyboard sheets) of a media file"""
+    if not is_valid_hash(media_hash):
+        raise ValueError("Invalid media hash")
+    return os.path.join(media_folder, f"{media_hash}.{name}.d")
+
+
+def store_temporary(folder, data, extension, ttl_seconds):
+    """Write bytes to a randomly named file and return its token (file name).
+
+    Files older than `ttl_seconds` are purged opportunistically on each call.
+    """
+    os.makedirs(folder, exist_ok=True)
+    purge_expired(folder, ttl_seconds)
+
+    token = f"{secrets.token_urlsafe(18)}.{extension}"
+    path = os.path.join(folder, token)
+    with open(path + '.part', 'wb') as out:
+        out.write(data)
+    os.replace(path + '.part', path)
+    return token
+
+
+def load_temporary(folder, token, ttl_seconds):
+    """Path of an unexpired temporary file, or None"""
+    if not token or not TOKEN_PATTERN.match(token):
+        return None
+    path = os.path.join(folder, token)
+    try:
+        if time.time() - os.path.getmtime(path) > ttl_seconds:
+            return None
+    except OSError:
+        return None
+    return path
+
+
+def purge_expired(folder, ttl_seconds):
+    cutoff = time.time() - ttl_seconds
+    for entry in os.scandir(folder):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            continue
@@ -0,0 +1,278 @@
+"""Lightweight in-process metrics exposed in the Prometheus text format.
+
+Counters, gauges and histograms are kept in plain dicts guarded by one lock
+per metric, so recording a sample costs a dict lookup and a few additions.
+Values that other components already track (cache statistics, ...) are read
+through collector callbacks only when /metrics is scraped.
+
+Metrics are per process; under a multi-worker server each scrape is answered
+by one worker, identified by the process_worker_info metric.
+"""
+import bisect
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-minute uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """Metrics plus collector callbacks rendered together on scrape"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def add_collector(self, name, documentation, kind, labelnames, collect):
+        """Register `collect()` returning {label values tuple: value}, called on each scrape"""
+        with self.lock:
+            self.collectors.append((name, documentation, kind, tuple(labelnames), collect))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics):
+            lines.extend(metric.render())
+        for name, documentation, kind, labelnames, collect in list(self.collectors):
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"Error collecting metric {name}: {str(e)}")
+                continue
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(values.items()):
+                lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Latency of HTTP requests by route',
+                            ('route', 'method', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests currently being handled', ('route',))
+STAGE_SECONDS = Histogram('stage_duration_seconds', 'Latency of processing stages', ('stage',))
+STAGE_ERRORS = Counter('stage_errors_total', 'Processing stage failures, including errors handled by a fallback',
+                       ('stage',))
+STAGES_IN_FLIGHT = Gauge('stages_in_flight', 'Processing stages currently running', ('stage',))
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a block as `stage`; exceptions escaping it are counted as stage errors"""
+    STAGES_IN_FLIGHT.inc(stage=stage)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+        STAGES_IN_FLIGHT.dec(stage=stage)
+
+
+def timed(stage):
+    """Decorator form of stage_timer()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Stages that fell back to a default value in the current fallbacks() block
+_FALLBACKS = contextvars.ContextVar('fallbacks', default=None)
+
+
+def record_error(stage):
+    """Count a failure that was handled in place (logged and replaced by a fallback value)"""
+    STAGE_ERRORS.inc(stage=stage)
+    note_fallbacks([stage])
+
+
+def note_fallbacks(stages):
+    """Report fallbacks taken on this block's behalf elsewhere (e.g. by a shared computation)"""
+    collected = _FALLBACKS.get()
+    if collected is not None:
+        collected.extend(stages)
+
+
+@contextmanager
+def fallbacks():
+    """Collect the stages that fell back to a default value (record_error) inside the block.
+
+    A result computed in such a block is degraded if the list is not empty, and should
+    not be cached as the answer for its input. Nested blocks also report to the
+    enclosing one. Only the current thread is covered.
+    """
+    outer = _FALLBACKS.get()
+    collected = []
+    token = _FALLBACKS.set(collected)
+    try:
+        yield collected
+    finally:
+        _FALLBACKS.reset(token)
+        if outer is not None:
+            outer.extend(collected)
+
+
+def lru_cache_collector(caches):
+    """Collector reporting hits and misses of functools.lru_cache functions by name"""
+    def collect():
+        values = {}
+        for name, func in caches.items():
+            info = func.cache_info()
+            values[(name, 'hit')] = info.hits
+            values[(name, 'miss')] = info.misses
+        return values
+    return collect
+
+
+def instrument_app(app):
+    """Record latency, status and in-flight count of every request, labelled by route rule"""
+    # Imported here so render processes that only record metrics do not load Flask
+    from flask import g, request
+
+    def route_label():
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_route = route_label()
+        REQUESTS_IN_FLIGHT.inc(route=g.metrics_route)
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route=g.metrics_route,
+                                    method=request.method, status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        # after_request is skipped when a view raises; record those requests as 500s here
+        started = g.pop('metrics_started', None)
+        route = g.pop('metrics_route', None)
+        if route is None:
+            return
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method, status=500)
+        REQUESTS_IN_FLIGHT.dec(route=route)
+
+    # Read at scrape time: with preload_app this runs in the master, before workers are forked
+    REGISTRY.add_collector('process_worker_info', 'Server worker process reporting these metrics', 'gauge',
+                           ('worker',), lambda: {(str(os.getpid()),): 1})
@@ -1,3 +1,8 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
 from app import db
 
 class Video(db.Model):
@@ -8,6 +13,99 @@ class Video(db.Model):
     summary = db.Column(db.Text)
     playlist = db.Column(db.String(100))
     hierarchical_number = db.Column(db.String(20), unique=True, nullable=False)
+    # SHA-256 of the submitted media/text and the options that shaped the results
+    content_hash = db.Column(db.String(64), unique=True, index=True)
+    source = db.Column(db.String(20))
+    tags = db.Column(db.Text)
+    category_id = db.Column(db.String(10))
+    # Public results of every pipeline stage run for this content, as JSON
+    results = db.Column(db.Text)
+    # Only loaded when accessed, so looking up stored results never reads the image
+    thumbnail = db.deferred(db.Column(db.LargeBinary))
+    thumbnail_mime_type = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def stage_results(self):
+        return json.loads(self.results) if self.results else {}
 
     def __repr__(self):
         return f'<Video {self.title}>'
+
+class ContentResult(db.Model):
+    """Results of the editor routes (title, tags, thumbnail, ...) cached by content hash.
+
+    Unlike a Video these are not catalog entries: caching a result takes no
+    hierarchical number.
+    """
+    __tablename__ = 'content_result'
+    id = db.Column(db.Integer, primary_key=True)
+    # SHA-256 of the submitted media/text and the options that shaped the results
+    content_hash = db.Column(db.String(64), unique=True, index=True, nullable=False)
+    source = db.Column(db.String(20))
+    # Public results by stage, as JSON, in the same form as Video.results
+    results = db.Column(db.Text)
+    thumbnail = db.deferred(db.Column(db.LargeBinary))
+    thumbnail_mime_type = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def stage_results(self):
+        return json.loads(self.results) if self.results else {}
+
+    def __repr__(self):
+        return f'<ContentResult {self.content_hash}>'
+
+class NumberSequence(db.Model):
+    """Last hierarchical number handed out in one scope (see numbering.py)"""
+    __tablename__ = 'number_sequence'
+    name = db.Column(db.String(100), primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<NumberSequence {self.name} {self.last_value}>'
+
+class Job(db.Model):
+    """A unit of background work (e.g. a YouTube upload) persisted so it survives restarts"""
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    state = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    payload = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # Hash of kind and payload while a job submitted as unique is queued or running
+    active_key = db.Column(db.String(64), unique=True, index=True)
+    # Process running the job and until when its claim holds unless renewed (see jobs.py)
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Job {self.kind} {self.id} {self.state}>'
+
+def add_missing_columns(engine):
+    """Add columns (and their indexes) that create_all() does not add to existing tables.
+
+    New columns must be nullable; unique columns get a unique index rather than a
+    constraint, which SQLite cannot add to an existing table.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        added = [column for column in table.columns if column.name not in existing]
+        if not added:
+            continue
+        with engine.begin() as connection:
+            for column in added:
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            for index in table.indexes:
+                if any(column.name in index.columns for column in added):
+                    index.create(connection, checkfirst=True)
+        print(f"Added columns to {table.name}: {', '.join(column.name for column in added)}")
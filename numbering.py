@@ -0,0 +1,116 @@
+"""Sequence-based allocation of hierarchical video numbers.
+
+Numbers look like 007 (main video), 007.03 (third follow-up of 007) and
+007.03B (second clarification of 007.03). Each scope (all main videos, the
+follow-ups of one main video, the clarifications of one follow-up) has a row
+in number_sequence holding the last number handed out. Allocating increments
+that row with a single UPDATE inside the caller's transaction: the row lock
+(PostgreSQL) or database write lock (SQLite) serializes concurrent allocators
+until the caller commits, so numbers are never handed out twice and a
+rolled-back insert gives its number back, without retries.
+
+A scope's row is created on first use (the only time the video table is
+scanned), starting after the highest number already present there, so catalogs numbered before sequences
+existed continue without collisions.
+"""
+import re
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+MAIN_PATTERN = re.compile(r'^(\d+)$')
+
+
+def letters(value):
+    """1 -> A, 26 -> Z, 27 -> AA, ... (spreadsheet-style column letters)"""
+    result = ''
+    while value > 0:
+        value, remainder = divmod(value - 1, 26)
+        result = chr(65 + remainder) + result
+    return result
+
+
+def letters_value(text):
+    """Inverse of letters()"""
+    value = 0
+    for char in text:
+        value = value * 26 + ord(char) - 64
+    return value
+
+
+def number_scope(video_type, parent_number=None):
+    """(sequence name, format function, pattern of existing numbers in the scope)"""
+    parent_number = (parent_number or '').strip().upper()
+    if video_type == 'main':
+        return 'main', lambda value: f"{value:03d}", MAIN_PATTERN
+
+    if video_type == 'follow_up':
+        # A follow-up of a follow-up or clarification belongs to the same main video
+        match = re.match(r'^(\d+)', parent_number)
+        if not match:
+            raise ValueError("A follow-up needs the number of its main video")
+        main = f"{int(match.group(1)):03d}"
+        pattern = re.compile(rf'^{main}\.(\d+)$')
+        return f"follow_up:{main}", lambda value: f"{main}.{value:02d}", pattern
+
+    if video_type == 'clarification':
+        match = re.match(r'^(\d+)\.(\d+)', parent_number)
+        if not match:
+            raise ValueError("A clarification needs the number of a follow-up video (e.g. 007.03)")
+        parent = f"{int(match.group(1)):03d}.{int(match.group(2)):02d}"
+        pattern = re.compile(rf'^{re.escape(parent)}([A-Z]+)$')
+        return f"clarification:{parent}", lambda value: f"{parent}{letters(value)}", pattern
+
+    raise ValueError(f"Unknown video type '{video_type}'")
+
+
+def highest_existing(session, pattern, prefix):
+    """Highest number in a scope among videos numbered before its sequence existed"""
+    from models import Video
+
+    query = select(Video.hierarchical_number)
+    if prefix:
+        query = query.where(Video.hierarchical_number.like(prefix + '%'))
+    highest = 0
+    for (number,) in session.execute(query):
+        match = pattern.match(number or '')
+        if match:
+            suffix = match.group(1)
+            highest = max(highest, int(suffix) if suffix.isdigit() else letters_value(suffix))
+    return highest
+
+
+def _insert_ignore(session, values):
+    from models import NumberSequence
+
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(NumberSequence).values(**values).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(NumberSequence).values(**values).on_conflict_do_nothing()
+    else:
+        if session.get(NumberSequence, values['name']) is not None:
+            return
+        statement = NumberSequence.__table__.insert().values(**values)
+    session.execute(statement)
+
+
+def allocate_hierarchical_number(session, video_type, parent_number=None):
+    """Next free number for `video_type` under `parent_number`, reserved in the session's transaction.
+
+    The caller commits (or rolls back to give the number back). Raises ValueError for an
+    unknown type or a malformed parent number.
+    """
+    from models import NumberSequence
+
+    name, format_number, pattern = number_scope(video_type, parent_number)
+    increment = update(NumberSequence).where(NumberSequence.name == name).values(
+        last_value=NumberSequence.last_value + 1)
+
+    if session.execute(increment).rowcount == 0:
+        prefix = '' if video_type == 'main' else name.split(':', 1)[1]
+        _insert_ignore(session, {'name': name, 'last_value': highest_existing(session, pattern, prefix)})
+        session.execute(increment)
+
+    value = session.execute(select(NumberSequence.last_value).where(NumberSequence.name == name)).scalar_one()
+    return format_number(value)
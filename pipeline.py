@@ -0,0 +1,114 @@
+"""Dependency-graph execution of multi-stage processing requests.
+
+Stages are registered with the names of the stages they consume. A run
+resolves the requested stages plus everything they depend on and executes
+each stage on a shared thread pool as soon as its dependencies have finished,
+so independent stages overlap. Failures are isolated: a failed stage only
+skips the stages that depend on it.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import fallbacks
+
+
+class Pipeline:
+    """Registry of named stages executed as a DAG on a bounded worker pool"""
+
+    def __init__(self, app=None, max_workers=None):
+        self.stages = {}
+        self.max_workers = max_workers
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.max_workers is None:
+            self.max_workers = int(app.config.get('PIPELINE_WORKERS', 8))
+        # Worker threads are only started on first use, so this is safe to create before fork
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pipeline')
+
+    def stage(self, name, requires=()):
+        """Register a stage function called as func(inputs, results).
+
+        `results` maps each name in `requires` to that stage's return value.
+        """
+        def decorator(func):
+            for dependency in requires:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage '{name}' requires unknown stage '{dependency}'")
+            self.stages[name] = {'func': func, 'requires': tuple(requires)}
+            return func
+        return decorator
+
+    def resolve(self, requested):
+        """Requested stages plus their transitive dependencies, in registration order"""
+        needed = set()
+        pending = list(requested)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage '{name}'")
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name]['requires'])
+        return [name for name in self.stages if name in needed]
+
+    def _call(self, name, inputs, results):
+        started = time.perf_counter()
+        stage = self.stages[name]
+        with fallbacks() as degraded:
+            value = stage['func'](inputs, {dependency: results[dependency] for dependency in stage['requires']})
+        return value, (time.perf_counter() - started) * 1000, bool(degraded)
+
+    def run(self, requested, inputs, on_event=None):
+        """Execute `requested` stages (and their dependencies) with `inputs`.
+
+        Returns (results, timings_ms, errors, degraded): the first three are keyed by
+        stage name, and `degraded` is the set of stages that fell back to a default
+        value somewhere (see metrics.fallbacks) or consumed a degraded result. Stages
+        whose dependencies failed are reported in `errors` and never started. If given,
+        on_event(stage, state, details) is called from the calling thread as stages
+        start and finish; details of a finished stage include its result.
+        """
+        def notify(name, state, **details):
+            if on_event is not None:
+                on_event(name, state, details)
+
+        order = self.resolve(requested)
+        results, timings, errors, degraded = {}, {}, {}, set()
+        running = {}
+        waiting = list(order)
+
+        while waiting or running:
+            for name in list(waiting):
+                requires = self.stages[name]['requires']
+                failed = [dependency for dependency in requires if dependency in errors]
+                if failed:
+                    errors[name] = f"Skipped: '{failed[0]}' failed"
+                    waiting.remove(name)
+                    notify(name, 'skipped', error=errors[name])
+                elif all(dependency in results for dependency in requires):
+                    running[self.executor.submit(self._call, name, inputs, results)] = name
+                    waiting.remove(name)
+                    notify(name, 'started')
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name], elapsed_ms, fell_back = future.result()
+                    timings[name] = round(elapsed_ms, 2)
+                    if fell_back or any(dependency in degraded for dependency in self.stages[name]['requires']):
+                        degraded.add(name)
+                    notify(name, 'finished', result=results[name], elapsed_ms=timings[name],
+                           completed=len(results), total=len(order))
+                except Exception as e:
+                    print(f"Error in pipeline stage {name}: {str(e)}")
+                    errors[name] = str(e)
+                    notify(name, 'failed', error=errors[name])
+
+        return results, timings, errors, degraded
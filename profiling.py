@@ -0,0 +1,192 @@
+"""Opt-in sampling profiler for individual requests.
+
+While a profiled request runs, a background thread samples the stack of the
+thread serving it at a fixed interval and counts identical stacks. The result
+is written in the collapsed-stack format understood by flamegraph.pl,
+speedscope and similar tools ("root;caller;callee <samples>" per line), next
+to a small JSON record with the route, status and duration of the request.
+
+Requests are profiled when an admin asks for it (header or query flag plus
+the admin token header) or, for background capture, at random with
+PROFILING_SAMPLE_RATE. Only the newest PROFILING_KEEP profiles are kept.
+"""
+import collections
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from flask import g, request
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class StackSampler:
+    """Count the stacks of one thread, sampled every `interval` seconds"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Flask extension profiling admin-flagged and randomly sampled requests"""
+
+    def __init__(self, app=None):
+        self.folder = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.config.get('PROFILING_FOLDER', os.path.join(app.instance_path, 'profiles'))
+        self.token = app.config.get('PROFILING_TOKEN') or ''
+        self.sample_rate = float(app.config.get('PROFILING_SAMPLE_RATE', 0.0))
+        self.interval = float(app.config.get('PROFILING_INTERVAL', 0.005))
+        self.keep = int(app.config.get('PROFILING_KEEP', 200))
+        self.lock = threading.Lock()
+        app.extensions['request_profiler'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def is_admin(self):
+        """True if the request carries the admin token (profiling is disabled without one).
+
+        The token is only read from the X-Admin-Token header: query strings end up in access logs.
+        """
+        supplied = request.headers.get('X-Admin-Token') or ''
+        return bool(self.token) and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def _wants_profile(self):
+        flag = request.headers.get('X-Profile') or request.args.get('profile')
+        if flag and flag.lower() in ('1', 'true', 'yes') and self.is_admin():
+            return 'requested'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def _before_request(self):
+        reason = self._wants_profile()
+        if reason is None:
+            return
+        # Only admins may name their profile; sampled requests never overwrite another one
+        request_id = request.headers.get('X-Request-ID', '') if reason == 'requested' else ''
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.profile = {
+            'request_id': request_id,
+            'reason': reason,
+            'started': time.perf_counter(),
+            'sampler': StackSampler(threading.get_ident(), self.interval).start()
+        }
+
+    def _after_request(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        sampler = profile['sampler'].stop()
+        record = {
+            'request_id': profile['request_id'],
+            'reason': profile['reason'],
+            'route': request.url_rule.rule if request.url_rule is not None else request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - profile['started']) * 1000, 2),
+            'samples': sampler.samples,
+            'interval_ms': self.interval * 1000,
+            'created_at': time.time()
+        }
+        try:
+            self._save(record, sampler.collapsed())
+            response.headers['X-Request-ID'] = record['request_id']
+            response.headers['X-Profile-ID'] = record['request_id']
+        except OSError as e:
+            print(f"Error saving profile: {str(e)}")
+        return response
+
+    def _teardown_request(self, exc):
+        # A view that raised skips after_request; the sampler must still be stopped
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile['sampler'].stop()
+
+    def _save(self, record, collapsed):
+        os.makedirs(self.folder, exist_ok=True)
+        base = os.path.join(self.folder, record['request_id'])
+        with open(base + '.collapsed', 'w') as f:
+            f.write(collapsed)
+        with open(base + '.json.tmp', 'w') as f:
+            json.dump(record, f)
+        os.replace(base + '.json.tmp', base + '.json')
+        with self.lock:
+            self._prune()
+
+    def _prune(self):
+        records = sorted(self._record_paths(), key=os.path.getmtime, reverse=True)
+        for path in records[self.keep:]:
+            for stale in (path, path[:-len('.json')] + '.collapsed'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def _record_paths(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return [entry.path for entry in os.scandir(self.folder) if entry.name.endswith('.json')]
+
+    def list_profiles(self, sort='slowest', limit=20, route=None):
+        """Metadata of stored profiles, slowest or most recent first"""
+        records = []
+        for path in self._record_paths():
+            try:
+                with open(path) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if route is None or record['route'] == route:
+                records.append(record)
+        key = 'created_at' if sort == 'recent' else 'duration_ms'
+        records.sort(key=lambda record: record[key], reverse=True)
+        return records[:limit]
+
+    def collapsed_path(self, request_id):
+        """Path of a stored collapsed-stack profile, or None"""
+        if not REQUEST_ID_PATTERN.match(request_id or ''):
+            return None
+        path = os.path.join(self.folder, request_id + '.collapsed')
+        return path if os.path.exists(path) else None
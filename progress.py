@@ -0,0 +1,241 @@
+"""In-process publish/subscribe of progress events, streamed as Server-Sent Events.
+
+Every long-running operation (a background job, or a request tagged with an
+operation id issued by POST /operations) publishes events to a channel named
+after it. Each channel keeps a short history, so subscribers that connect late
+or reconnect with Last-Event-ID catch up, and wakes its subscribers instead of
+having them poll: threads wait on the channel's condition variable, event-loop
+subscribers are woken through a callback.
+
+Only ids that have a channel (registered operations, jobs) can be subscribed
+to, and each process serves at most `max_subscribers` streams at a time.
+
+Channels live in the memory of one process: with several server processes a
+subscriber must reach the process running the operation (sticky routing), or
+fall back to the /jobs status endpoint.
+"""
+import asyncio
+import collections
+import json
+import re
+import threading
+import time
+import uuid
+
+OPERATION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def is_valid_operation_id(operation_id):
+    return bool(operation_id) and bool(OPERATION_ID_PATTERN.match(operation_id))
+
+
+def parse_last_event_id(value):
+    """Event id a reconnecting client has already seen (0 if missing or malformed)"""
+    try:
+        return max(0, int(value or 0))
+    except ValueError:
+        return 0
+
+
+def format_sse(event_id, event, data):
+    """Encode one event in text/event-stream framing"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class SubscriberLimitReached(Exception):
+    """Raised when a process already serves its maximum number of progress streams"""
+
+    def __init__(self, limit, retry_after=5):
+        super().__init__(f"Too many open progress streams ({limit}), retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ProgressChannel:
+    """Event history and wake-up condition of one operation"""
+
+    def __init__(self, history):
+        self.condition = threading.Condition()
+        self.events = collections.deque(maxlen=history)
+        self.next_id = 1
+        self.closed = False
+        self.subscribers = 0
+        # Wake-up callbacks of event-loop subscribers, called on every publish
+        self.listeners = set()
+        self.updated = time.monotonic()
+
+
+class Subscription:
+    """One subscriber's position in a channel.
+
+    Iterate it from a thread, or iterate `events_async()` on an event loop; either
+    way it yields (event_id, event, data) tuples, None whenever `keepalive_seconds`
+    pass without an event, and ends after the final event. close() frees the
+    subscriber slot and is safe to call more than once.
+    """
+
+    def __init__(self, broker, channel, last_event_id, keepalive_seconds):
+        self.broker = broker
+        self.channel = channel
+        self.position = last_event_id
+        self.keepalive_seconds = keepalive_seconds
+        self.closed = False
+
+    def _pending(self):
+        return [entry for entry in self.channel.events if entry[0] > self.position]
+
+    def __iter__(self):
+        channel = self.channel
+        try:
+            while True:
+                with channel.condition:
+                    pending = self._pending()
+                    if not pending and not channel.closed:
+                        channel.condition.wait(self.keepalive_seconds)
+                        pending = self._pending()
+                    finished = channel.closed
+
+                if not pending and not finished:
+                    yield None
+                for entry in pending:
+                    self.position = entry[0]
+                    yield entry
+                if finished:
+                    return
+        finally:
+            self.close()
+
+    async def events_async(self):
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        channel = self.channel
+
+        def notify():
+            loop.call_soon_threadsafe(wakeup.set)
+
+        with channel.condition:
+            channel.listeners.add(notify)
+        try:
+            while True:
+                wakeup.clear()
+                with channel.condition:
+                    pending = self._pending()
+                    finished = channel.closed
+                if not pending and not finished:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), self.keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        yield None
+                    continue
+                for entry in pending:
+                    self.position = entry[0]
+                    yield entry
+                if finished:
+                    return
+        finally:
+            with channel.condition:
+                channel.listeners.discard(notify)
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with self.channel.condition:
+            self.channel.subscribers -= 1
+            self.channel.updated = time.monotonic()
+        with self.broker.lock:
+            self.broker.subscribers -= 1
+
+
+class ProgressBroker:
+    """Registry of progress channels; finished channels are dropped after `ttl_seconds`"""
+
+    def __init__(self, history=256, ttl_seconds=300, max_subscribers=500):
+        self.history = history
+        self.ttl_seconds = ttl_seconds
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.subscribers = 0
+
+    def _channel(self, operation_id, create=True):
+        with self.lock:
+            self._purge()
+            channel = self.channels.get(operation_id)
+            if channel is None and create:
+                channel = self.channels[operation_id] = ProgressChannel(self.history)
+            return channel
+
+    def _purge(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, channel in self.channels.items()
+                   if channel.updated < cutoff and (channel.closed or not channel.subscribers)]
+        for key in expired:
+            del self.channels[key]
+
+    def register(self):
+        """Issue a new operation id that requests can publish to and clients can subscribe to"""
+        operation_id = uuid.uuid4().hex
+        self._channel(operation_id)
+        return operation_id
+
+    def is_known(self, operation_id):
+        """True if the operation was registered, or published to, in this process (and not yet purged)"""
+        return self._channel(operation_id, create=False) is not None
+
+    def publish(self, operation_id, event, data=None, final=False):
+        """Append an event to an operation's channel and wake its subscribers.
+
+        A `final` event closes the channel: subscribers receive it and then their
+        streams end.
+        """
+        if not operation_id:
+            return
+        channel = self._channel(operation_id)
+        with channel.condition:
+            if channel.closed:
+                return
+            channel.events.append((channel.next_id, event, data if data is not None else {}))
+            channel.next_id += 1
+            channel.closed = final
+            channel.updated = time.monotonic()
+            channel.condition.notify_all()
+            for notify in list(channel.listeners):
+                try:
+                    notify()
+                except RuntimeError:
+                    # The subscriber's event loop has been closed
+                    channel.listeners.discard(notify)
+
+    def has_events(self, operation_id):
+        """True if anything was published for the operation in this process (and not yet purged)"""
+        channel = self._channel(operation_id, create=False)
+        return channel is not None and channel.next_id > 1
+
+    def subscriber_count(self, operation_id):
+        channel = self._channel(operation_id, create=False)
+        return channel.subscribers if channel is not None else 0
+
+    def subscribe(self, operation_id, last_event_id=0, keepalive_seconds=15):
+        """Open a Subscription to an operation's events after `last_event_id`.
+
+        Raises SubscriberLimitReached when this process already serves
+        `max_subscribers` streams.
+        """
+        with self.lock:
+            if self.subscribers >= self.max_subscribers:
+                raise SubscriberLimitReached(self.max_subscribers)
+            self.subscribers += 1
+        channel = self._channel(operation_id)
+        with channel.condition:
+            channel.subscribers += 1
+        return Subscription(self, channel, last_event_id, keepalive_seconds)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'channels': len(self.channels),
+                'open_channels': sum(1 for channel in self.channels.values() if not channel.closed),
+                'subscribers': self.subscribers,
+                'max_subscribers': self.max_subscribers
+            }
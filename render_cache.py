@@ -0,0 +1,118 @@
+"""Content-addressed on-disk cache for rendered thumbnails.
+
+Entries are keyed by a hash of everything that determines the output bytes
+(renderer version, template, text, size, format, source frame, ...). The
+cache is bounded by total size; the least recently used entries (by file
+mtime, refreshed on every hit) are evicted first.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+class RenderCache:
+    """LRU-by-mtime cache of encoded renders stored as files under `folder`"""
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = None
+
+    @staticmethod
+    def make_key(**parts):
+        """Stable hex key for a set of render inputs"""
+        encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], key)
+
+    def get(self, key):
+        """Return (data, meta) cached for `key`, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                header_length = int.from_bytes(f.read(4), 'big')
+                meta = json.loads(f.read(header_length))
+                data = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return data, meta
+
+    def put(self, key, data, meta=None):
+        """Store bytes plus a small JSON-serialisable metadata dict under `key`"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = json.dumps(meta or {}).encode('utf-8')
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(len(header).to_bytes(4, 'big'))
+            out.write(header)
+            out.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += 4 + len(header) + len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is back under 90% of its cap"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                continue
+        self.total_bytes = total
+
+    def stats(self):
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
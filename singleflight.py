@@ -0,0 +1,123 @@
+"""Coalescing of identical in-flight computations ("singleflight").
+
+When several threads ask for the same computation at the same time (the same
+operation on the same content and options), the first one computes it and
+the others wait for and share its result instead of repeating the work.
+Nothing is cached once the computation finishes; combine with
+functools.lru_cache where results should also be reused later.
+
+Followers receive their own deep copies of the result, taken before the
+leader returns, so every caller can keep modifying what it gets back. When
+the computation fails each follower raises its own copy of the exception,
+chained to the leader's, because raising one exception object from several
+threads at once interleaves their tracebacks on it. Fallbacks the leader
+recorded (metrics.record_error) are reported to each follower's own
+metrics.fallbacks() block, so no caller mistakes a degraded shared result
+for a storable one.
+"""
+import copy
+import functools
+import hashlib
+import json
+import threading
+
+from metrics import Counter, fallbacks, note_fallbacks
+
+CALLS = Counter('singleflight_calls_total', 'Coalescable calls by operation and role (leader computes, follower waits)',
+                ('operation', 'role'))
+SAVED = Counter('singleflight_saved_computations_total', 'Computations avoided by sharing an in-flight result',
+                ('operation',))
+
+
+class SharedCallError(Exception):
+    """Raised to followers when the leader's exception cannot be copied"""
+
+
+def follower_error(error):
+    """A fresh exception equivalent to `error`, for one follower to raise"""
+    try:
+        clone = copy.copy(error)
+    except Exception:
+        clone = None
+    if type(clone) is not type(error):
+        clone = SharedCallError(f"{type(error).__name__}: {error}")
+    return clone
+
+
+def call_key(operation, args, kwargs):
+    """Operation name plus a hash of the call's arguments"""
+    encoded = json.dumps([args, kwargs], sort_keys=True, default=repr).encode('utf-8')
+    return operation, hashlib.sha256(encoded).hexdigest()
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.fallbacks = []
+        self.followers = 0
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time; concurrent callers share its outcome"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        operation = key[0] if isinstance(key, tuple) else key
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            CALLS.inc(operation=operation, role='follower')
+            SAVED.inc(operation=operation)
+            call.done.wait()
+            if call.error is not None:
+                raise follower_error(call.error) from call.error
+            # A fallback the leader took makes the shared result degraded for followers too
+            note_fallbacks(call.fallbacks)
+            return copy.deepcopy(call.result)
+
+        CALLS.inc(operation=operation, role='leader')
+        result = None
+        collected = []
+        try:
+            with fallbacks() as collected:
+                result = func(*args, **kwargs)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            if call.followers:
+                # Snapshot before the leader's caller can touch the result
+                call.result = copy.deepcopy(result)
+                call.fallbacks = list(collected)
+            call.done.set()
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+
+GROUP = SingleFlight()
+
+
+def coalesce(operation):
+    """Decorator sharing one execution among concurrent calls with equal arguments"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return GROUP.do(call_key(operation, args, kwargs), func, *args, **kwargs)
+        return wrapper
+    return decorator
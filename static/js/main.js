@@ -57,10 +57,18 @@ document.addEventListener('DOMContentLoaded', function() {
         hideTranscriptionResults();
         
         const formData = new FormData();
-        formData.append('audio', audioFile);
+        // Videos are sent as-is; the server streams their audio track for transcription
+        formData.append(audioFile.type.startsWith('video/') ? 'video' : 'audio', audioFile);
         formData.append('language', language);
         formData.append('auto_detect', autoDetect.toString());
         
+        // Follow progress and partial transcripts while the request runs
+        const operationId = await registerOperation();
+        if (operationId) {
+            formData.append('operation_id', operationId);
+        }
+        const progressStream = operationId ? followTranscriptionProgress(operationId) : null;
+        
         try {
             const response = await fetch('/transcribe', {
                 method: 'POST',
@@ -78,6 +86,10 @@ document.addEventListener('DOMContentLoaded', function() {
             console.error('Error:', error);
             showTranscriptionError('Error during transcription. Please try again.');
         } finally {
+            if (progressStream) {
+                progressStream.close();
+            }
+            document.getElementById('transcription-progress').style.display = 'none';
             showTranscriptionLoading(false);
         }
     });
@@ -346,6 +358,10 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify({video_type: videoType, parent_number: parentNumber})
         });
         const data = await response.json();
+        if (!data.number) {
+            document.getElementById('generated-number').textContent = data.error || 'Error generating number';
+            return;
+        }
         document.getElementById('generated-number').textContent = data.number;
         updateHierarchyVisualization(data.number);
     });
@@ -366,12 +382,64 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         const data = await response.json();
         if (data.success) {
-            document.getElementById('upload-result').textContent = `Video uploaded successfully. Video ID: ${data.video_id}`;
+            document.getElementById('upload-result').textContent = 'Upload queued...';
+            followUploadJob(data.job_id);
         } else {
             document.getElementById('upload-result').textContent = `Failed to upload video: ${data.error}`;
         }
     });
 
+    // Stream upload progress over Server-Sent Events, falling back to polling
+    function followUploadJob(jobId) {
+        const uploadResult = document.getElementById('upload-result');
+        if (!window.EventSource) {
+            pollUploadJob(jobId);
+            return;
+        }
+
+        const source = new EventSource(`/events/${jobId}`);
+        source.addEventListener('progress', function(e) {
+            const event = JSON.parse(e.data);
+            uploadResult.textContent = `Uploading... ${Math.round((event.progress || 0) * 100)}%`;
+        });
+        source.addEventListener('result', function(e) {
+            const event = JSON.parse(e.data);
+            source.close();
+            uploadResult.textContent = `Video uploaded successfully. Video ID: ${event.result.video_id}`;
+        });
+        source.addEventListener('error', function(e) {
+            source.close();
+            if (e.data) {
+                uploadResult.textContent = `Failed to upload video: ${JSON.parse(e.data).error}`;
+            } else {
+                // Connection lost rather than a job failure
+                pollUploadJob(jobId);
+            }
+        });
+    }
+
+    // Poll a background upload job until it finishes
+    async function pollUploadJob(jobId) {
+        const uploadResult = document.getElementById('upload-result');
+        try {
+            const response = await fetch(`/jobs/${jobId}`);
+            const job = await response.json();
+
+            if (job.state === 'succeeded') {
+                uploadResult.textContent = `Video uploaded successfully. Video ID: ${job.video_id}`;
+            } else if (job.state === 'failed' || !job.success) {
+                uploadResult.textContent = `Failed to upload video: ${job.error}`;
+            } else {
+                const percent = Math.round((job.progress || 0) * 100);
+                uploadResult.textContent = job.state === 'running' ? `Uploading... ${percent}%` : 'Upload queued...';
+                setTimeout(() => pollUploadJob(jobId), 2000);
+            }
+        } catch (error) {
+            console.error('Error:', error);
+            setTimeout(() => pollUploadJob(jobId), 5000);
+        }
+    }
+
     // Video Tags and Category Management handlers
     const tagsForm = document.getElementById('tags-form');
     const tagsCountSlider = document.getElementById('tags-count');
@@ -737,12 +805,12 @@ function exportTitleData() {
             const response = await fetch('/generate_custom_thumbnail', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({title: title, subtitle: subtitle, template: template})
+                body: JSON.stringify({title: title, subtitle: subtitle, template: template, format: 'jpeg', size_budget: true, response: 'url'})
             });
             const data = await response.json();
             
             if (data.success) {
-                showThumbnail(data.thumbnail);
+                showThumbnail(data.url, data.format);
             } else {
                 showThumbnailError(data.error || 'Failed to generate custom thumbnail');
             }
@@ -772,6 +840,12 @@ function exportTitleData() {
         if (timestamp) {
             formData.append('timestamp', timestamp);
         }
+        if (document.getElementById('best-frame').checked) {
+            formData.append('mode', 'best');
+        }
+        formData.append('format', 'jpeg');
+        formData.append('size_budget', 'true');
+        formData.append('response', 'url');
         
         try {
             const response = await fetch('/generate_thumbnail_from_video', {
@@ -781,7 +855,7 @@ function exportTitleData() {
             const data = await response.json();
             
             if (data.success) {
-                showThumbnail(data.thumbnail);
+                showThumbnail(data.url, data.format);
             } else {
                 showThumbnailError(data.error || 'Failed to generate thumbnail from video');
             }
@@ -796,7 +870,7 @@ function exportTitleData() {
         const img = document.getElementById('thumbnail-image');
         const link = document.createElement('a');
         link.href = img.src;
-        link.download = 'youtube-thumbnail.png';
+        link.download = `youtube-thumbnail.${img.dataset.format || 'png'}`;
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
@@ -1010,6 +1084,43 @@ function hideTagsResults() {
 }
 
 // Transcription helper functions
+async function registerOperation() {
+    // The server only streams progress for operation ids it issued
+    try {
+        const response = await fetch('/operations', {method: 'POST'});
+        const data = await response.json();
+        return data.success ? data.operation_id : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function followTranscriptionProgress(operationId) {
+    if (!window.EventSource) {
+        return null;
+    }
+    const container = document.getElementById('transcription-progress');
+    const bar = document.getElementById('transcription-progress-bar');
+    const partial = document.getElementById('partial-transcription');
+    bar.style.width = '0%';
+    partial.textContent = '';
+    container.style.display = 'block';
+
+    const source = new EventSource(`/events/${operationId}`);
+    source.addEventListener('progress', function(e) {
+        const event = JSON.parse(e.data);
+        if (event.progress !== null) {
+            bar.style.width = `${Math.round(event.progress * 100)}%`;
+        }
+        if (event.partial_transcript) {
+            partial.textContent = `${partial.textContent} ${event.partial_transcript}`.trim();
+        }
+    });
+    source.addEventListener('result', () => source.close());
+    source.addEventListener('error', () => source.close());
+    return source;
+}
+
 function showTranscriptionLoading(isLoading) {
     const spinner = document.getElementById('transcription-spinner');
     const submitBtn = document.querySelector('#transcription-form button[type="submit"]');
@@ -1143,12 +1254,13 @@ function downloadAsFile(content, filename, contentType) {
 }
 
 // Thumbnail helper functions
-function showThumbnail(base64Image) {
+function showThumbnail(imageUrl, format) {
     const thumbnailPreview = document.getElementById('thumbnail-preview');
     const thumbnailImage = document.getElementById('thumbnail-image');
     const thumbnailError = document.getElementById('thumbnail-error');
     
-    thumbnailImage.src = `data:image/png;base64,${base64Image}`;
+    thumbnailImage.src = imageUrl;
+    thumbnailImage.dataset.format = format || 'png';
     thumbnailPreview.style.display = 'block';
     thumbnailError.style.display = 'none';
 }
@@ -0,0 +1,435 @@
+"""Thumbnail rendering: text layout, template backgrounds and encoding.
+
+Kept free of the NLP and web imports in utils so the variant render processes
+(see variants.py) only load what drawing a thumbnail needs.
+"""
+import base64
+import functools
+import hashlib
+import io
+import json
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from metrics import Counter, timed, record_error
+
+BOLD_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+REGULAR_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+MIN_FONT_SIZE = 14
+
+@functools.lru_cache(maxsize=128)
+def get_font(path, size):
+    """Load a font once per process for each (path, size)"""
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=8192)
+def _text_width(path, size, text):
+    return get_font(path, size).getlength(text)
+
+@functools.lru_cache(maxsize=256)
+def _line_height(path, size):
+    font = get_font(path, size)
+    if hasattr(font, 'getmetrics'):
+        ascent, descent = font.getmetrics()
+        return ascent + descent
+    bbox = font.getbbox("Ag")
+    return bbox[3] - bbox[1]
+
+def _wrap_words(words, path, size, max_width):
+    """Greedy word wrap using cached per-word widths"""
+    space = _text_width(path, size, " ")
+    lines = []
+    current = []
+    current_width = 0.0
+    for word in words:
+        word_width = _text_width(path, size, word)
+        if current and current_width + space + word_width > max_width:
+            lines.append((" ".join(current), current_width))
+            current = [word]
+            current_width = word_width
+        else:
+            current_width = word_width if not current else current_width + space + word_width
+            current.append(word)
+    if current:
+        lines.append((" ".join(current), current_width))
+    return lines
+
+def _layout_fits(lines, path, size, box_width, box_height, max_lines, line_spacing):
+    if len(lines) > max_lines:
+        return False
+    if any(line_width > box_width for _, line_width in lines):
+        return False
+    return text_block_height((size, lines, _line_height(path, size)), line_spacing) <= box_height
+
+def _truncate_line(line, path, size, max_width):
+    ellipsis = "…"
+    while line and _text_width(path, size, line + ellipsis) > max_width:
+        line = line[:-1]
+    return line.rstrip() + ellipsis
+
+@functools.lru_cache(maxsize=1024)
+def fit_text_layout(text, font_path, box_width, box_height, max_size, min_size=MIN_FONT_SIZE, max_lines=3, line_spacing=1.1):
+    """Wrap `text` and find the largest font size (binary search) whose layout fits the box.
+
+    Returns (font_size, lines, line_height) with lines as a tuple of (text, width).
+    Results are memoised, so re-rendering the same title in the same box is nearly free.
+    If the text cannot fit even at `min_size`, the last line is truncated with an ellipsis.
+    """
+    words = text.split()
+    if not words:
+        return max_size, (), _line_height(font_path, max_size)
+
+    low, high = min_size, max(min_size, max_size)
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        lines = _wrap_words(words, font_path, size, box_width)
+        if _layout_fits(lines, font_path, size, box_width, box_height, max_lines, line_spacing):
+            best = (size, lines)
+            low = size + 1
+        else:
+            high = size - 1
+
+    if best is None:
+        size = min_size
+        lines = _wrap_words(words, font_path, size, box_width)
+        line_height = _line_height(font_path, size)
+        max_fitting = max(1, min(max_lines, int((box_height / line_height - 1) / line_spacing) + 1))
+        if len(lines) > max_fitting or any(width > box_width for _, width in lines):
+            lines = lines[:max_fitting]
+            clipped = []
+            for line, width in lines[:-1]:
+                if width > box_width:
+                    line = _truncate_line(line, font_path, size, box_width)
+                clipped.append((line, _text_width(font_path, size, line)))
+            last = _truncate_line(lines[-1][0], font_path, size, box_width)
+            clipped.append((last, _text_width(font_path, size, last)))
+            lines = clipped
+        best = (size, lines)
+
+    size, lines = best
+    return size, tuple(lines), _line_height(font_path, size)
+
+def text_block_height(layout, line_spacing=1.1):
+    """Height in pixels of a fit_text_layout() result"""
+    _, lines, line_height = layout
+    if not lines:
+        return 0
+    return line_height * (1 + (len(lines) - 1) * line_spacing)
+
+def draw_text_layout(draw, layout, font_path, box, fill, shadow_fill, shadow_offset, valign="middle", line_spacing=1.1):
+    """Draw a fit_text_layout() result centred horizontally within box=(x, y, width, height).
+
+    Returns the y coordinate just below the last line.
+    """
+    size, lines, line_height = layout
+    if not lines:
+        return box[1]
+
+    font = get_font(font_path, size)
+    box_x, box_y, box_width, box_height = box
+    step = line_height * line_spacing
+    block_height = text_block_height(layout, line_spacing)
+
+    if valign == "top":
+        y = box_y
+    elif valign == "bottom":
+        y = box_y + box_height - block_height
+    else:
+        y = box_y + (box_height - block_height) / 2
+
+    for line, line_width in lines:
+        x = box_x + (box_width - line_width) / 2
+        draw.text((x + shadow_offset, y + shadow_offset), line, font=font, fill=shadow_fill)
+        draw.text((x, y), line, font=font, fill=fill)
+        y += step
+
+    return int(y - step + line_height)
+
+@timed('render')
+def create_thumbnail_from_frame(frame, title="", width=1280, height=720):
+    """Create a YouTube thumbnail from a video frame"""
+    try:
+        # Convert numpy array to PIL Image
+        pil_image = Image.fromarray(frame)
+        
+        # Resize to YouTube thumbnail dimensions
+        pil_image = pil_image.resize((width, height), Image.Resampling.LANCZOS)
+        
+        # Create overlay for title
+        if title:
+            overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(overlay)
+            
+            # Wrap and size the title to fit the lower third of the frame
+            margin = width // 20
+            box = (margin, int(height * 0.6) - 50, width - 2 * margin, int(height * 0.4))
+            layout = fit_text_layout(title, BOLD_FONT_PATH, box[2], box[3], min(width // 20, 60))
+            draw_text_layout(draw, layout, BOLD_FONT_PATH, box, (255, 255, 255, 255), (0, 0, 0, 180), 2, valign="bottom")
+            
+            # Composite overlay onto image
+            pil_image = Image.alpha_composite(pil_image.convert('RGBA'), overlay)
+            pil_image = pil_image.convert('RGB')
+        
+        return pil_image
+    except Exception as e:
+        print(f"Error creating thumbnail: {str(e)}")
+        record_error('render')
+        return None
+
+# Built-in background templates for create_custom_thumbnail. Parameters can be
+# overridden per request through template_options.
+THUMBNAIL_TEMPLATES = {
+    'gradient': {'type': 'linear_gradient', 'angle': 90, 'stops': [[0.0, [30, 30, 30]], [1.0, [200, 100, 200]]]},
+    'solid': {'type': 'solid', 'color': [64, 128, 255]},
+    'pattern': {'type': 'checker', 'cell_size': 100, 'colors': [[30, 30, 30], [50, 50, 80]]},
+    'sunset': {'type': 'linear_gradient', 'angle': 90, 'stops': [[0.0, [255, 94, 77]], [0.5, [255, 154, 0]], [1.0, [60, 20, 90]]]},
+    'ocean': {'type': 'linear_gradient', 'angle': 135, 'stops': [[0.0, [0, 180, 219]], [0.6, [0, 83, 159]], [1.0, [10, 20, 60]]]},
+    'vignette': {'type': 'vignette', 'inner_color': [70, 70, 110], 'outer_color': [10, 10, 20], 'falloff': 1.8},
+    'blurred_frame': {'type': 'blurred_frame', 'blur_radius': 12, 'darken': 0.55}
+}
+
+MAX_GRADIENT_STOPS = 8
+# Backdrops derived from video frames are blurred at this width and scaled up, which keeps
+# their cost fixed regardless of output size and within the per-render latency budget
+BACKDROP_WORK_WIDTH = 320
+RENDER_BUDGET_MS = 50
+RENDER_BUDGET_OVERRUNS = Counter('render_budget_overruns_total',
+                                 f'Custom thumbnail renders slower than the {RENDER_BUDGET_MS} ms budget', ('template',))
+
+def _template_spec(template, template_options=None):
+    spec = dict(THUMBNAIL_TEMPLATES.get(template, {'type': 'solid', 'color': [30, 30, 30]}))
+    if template_options:
+        spec.update(template_options)
+    return spec
+
+def _gradient_array(width, height, stops, angle):
+    """Multi-stop linear gradient as a (height, width, 3) uint8 array"""
+    stops = sorted(stops, key=lambda stop: stop[0])[:MAX_GRADIENT_STOPS]
+    positions = np.array([float(stop[0]) for stop in stops])
+    colors = np.array([stop[1] for stop in stops], dtype=np.float32)
+
+    # Project each pixel onto the gradient direction (90 degrees = top to bottom)
+    radians = np.deg2rad(angle)
+    dx, dy = np.cos(radians), np.sin(radians)
+    xs = np.arange(width, dtype=np.float32) / width
+    ys = np.arange(height, dtype=np.float32) / height
+    projection = xs[np.newaxis, :] * dx + ys[:, np.newaxis] * dy
+    low = min(0.0, dx) + min(0.0, dy)
+    high = max(0.0, dx) + max(0.0, dy)
+    t = (projection - low) / (high - low)
+
+    channels = [np.interp(t, positions, colors[:, c]) for c in range(3)]
+    return np.stack(channels, axis=-1).astype(np.uint8)
+
+def _vignette_array(width, height, inner_color, outer_color, falloff):
+    xs = np.linspace(-1.0, 1.0, width, dtype=np.float32)
+    ys = np.linspace(-1.0, 1.0, height, dtype=np.float32)
+    distance = np.sqrt(xs[np.newaxis, :] ** 2 + ys[:, np.newaxis] ** 2) / np.sqrt(2.0)
+    weight = np.clip(distance, 0.0, 1.0) ** float(falloff)
+    inner = np.array(inner_color, dtype=np.float32)
+    outer = np.array(outer_color, dtype=np.float32)
+    return (inner + (outer - inner) * weight[:, :, np.newaxis]).astype(np.uint8)
+
+def _checker_array(width, height, cell_size, colors):
+    cell_size = max(1, int(cell_size))
+    xs = np.arange(width) // cell_size
+    ys = np.arange(height) // cell_size
+    mask = ((xs[np.newaxis, :] + ys[:, np.newaxis]) % 2).astype(bool)
+    palette = np.array(colors[:2], dtype=np.uint8)
+    return palette[mask.astype(np.uint8)]
+
+def _blurred_frame_array(frame, width, height, blur_radius, darken):
+    """Blurred, darkened backdrop from a video frame, processed at a fixed small size"""
+    work_height = max(1, BACKDROP_WORK_WIDTH * height // width)
+    small = cv2.resize(frame, (BACKDROP_WORK_WIDTH, work_height), interpolation=cv2.INTER_AREA)
+    kernel = int(blur_radius) * 2 + 1
+    small = cv2.GaussianBlur(small, (kernel, kernel), 0)
+    small = (small.astype(np.float32) * float(darken)).astype(np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+@functools.lru_cache(maxsize=64)
+def _cached_background(spec_key, width, height):
+    spec = json.loads(spec_key)
+    kind = spec.get('type')
+
+    if kind == 'linear_gradient':
+        pixels = _gradient_array(width, height, spec['stops'], spec.get('angle', 90))
+    elif kind == 'vignette':
+        pixels = _vignette_array(width, height, spec['inner_color'], spec['outer_color'], spec.get('falloff', 1.8))
+    elif kind == 'checker':
+        pixels = _checker_array(width, height, spec.get('cell_size', 100), spec['colors'])
+    else:
+        color = np.array(spec.get('color', [30, 30, 30]), dtype=np.uint8)
+        pixels = np.broadcast_to(color, (height, width, 3))
+
+    return Image.fromarray(np.ascontiguousarray(pixels), 'RGB')
+
+def render_thumbnail_background(template, width, height, template_options=None, frame=None):
+    """Render a template background as a new PIL image.
+
+    Static backgrounds are generated once per (template, options, size) with vectorised
+    NumPy operations and memoised; callers receive a copy they may draw on.
+    """
+    spec = _template_spec(template, template_options)
+
+    if spec.get('type') == 'blurred_frame':
+        if frame is None:
+            raise ValueError("The blurred_frame template requires a video frame")
+        pixels = _blurred_frame_array(frame, width, height, spec.get('blur_radius', 12), spec.get('darken', 0.55))
+        return Image.fromarray(pixels, 'RGB')
+
+    spec_key = json.dumps(spec, sort_keys=True)
+    return _cached_background(spec_key, width, height).copy()
+
+@timed('render')
+def create_custom_thumbnail(title, subtitle="", template="gradient", width=1280, height=720, template_options=None, frame=None):
+    """Create a custom thumbnail with text and background"""
+    try:
+        started = time.perf_counter()
+        # Create base image from the (memoised) template background
+        img = render_thumbnail_background(template, width, height, template_options, frame)
+        draw = ImageDraw.Draw(img)
+        
+        margin = width // 20
+        text_width = width - 2 * margin
+        text_bottom = height // 2
+        
+        # Add title text, wrapped and sized to fit the upper part of the canvas
+        if title:
+            title_layout = fit_text_layout(title, BOLD_FONT_PATH, text_width, int(height * 0.55), min(width // 15, 80))
+            # Centre the title block on the canvas, keeping it below the top margin
+            block_height = text_block_height(title_layout)
+            title_y = max(height // 8, height // 2 - block_height / 2)
+            title_box = (margin, title_y, text_width, block_height)
+            text_bottom = draw_text_layout(draw, title_layout, BOLD_FONT_PATH, title_box, (255, 255, 255), (0, 0, 0, 200), 3, valign="top")
+        
+        # Add subtitle below the title
+        if subtitle:
+            subtitle_top = text_bottom + 20
+            subtitle_box = (margin, subtitle_top, text_width, max(0, height - margin - subtitle_top))
+            subtitle_layout = fit_text_layout(subtitle, REGULAR_FONT_PATH, subtitle_box[2], subtitle_box[3], min(width // 25, 40), max_lines=2)
+            draw_text_layout(draw, subtitle_layout, REGULAR_FONT_PATH, subtitle_box, (220, 220, 220), (0, 0, 0, 150), 2, valign="top")
+        
+        # Render latency itself is in stage_duration_seconds{stage="render"}
+        if (time.perf_counter() - started) * 1000 > RENDER_BUDGET_MS:
+            RENDER_BUDGET_OVERRUNS.inc(template=template if template in THUMBNAIL_TEMPLATES else 'other')
+        
+        return img
+    except Exception as e:
+        print(f"Error creating custom thumbnail: {str(e)}")
+        record_error('render')
+        return None
+
+# Part of every render cache key; bump whenever rendering output changes
+THUMBNAIL_RENDERER_VERSION = 1
+
+def frame_fingerprint(frame):
+    """Stable hash of a decoded frame's pixels, used to key cached renders"""
+    digest = hashlib.sha1(str(frame.shape).encode())
+    digest.update(np.ascontiguousarray(frame).data)
+    return digest.hexdigest()
+
+# Output formats for rendered thumbnails: name -> (PIL format, MIME type)
+THUMBNAIL_FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp')
+}
+# YouTube rejects custom thumbnails larger than 2 MB
+YOUTUBE_THUMBNAIL_MAX_BYTES = 2 * 1024 * 1024
+MIN_THUMBNAIL_QUALITY = 30
+# Named output sizes; everything is downscaled from the single full-size render
+THUMBNAIL_SIZES = {
+    'maxres': (1280, 720),
+    'standard': (640, 360),
+    'medium': (320, 180),
+    'small': (168, 94)
+}
+
+def _encode_image(image, pil_format, quality):
+    buffer = io.BytesIO()
+    if pil_format == 'PNG':
+        image.save(buffer, format='PNG', optimize=True)
+    elif pil_format == 'JPEG':
+        image.convert('RGB').save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, format=pil_format, quality=quality, method=4)
+    return buffer.getvalue()
+
+@timed('encode')
+def encode_thumbnail(thumbnail_image, fmt='jpeg', quality=90, max_bytes=None):
+    """Encode a thumbnail as PNG, JPEG or WebP.
+
+    With `max_bytes`, lossy formats binary-search the highest quality (between
+    MIN_THUMBNAIL_QUALITY and `quality`) whose output fits the budget; a PNG that does not
+    fit is re-encoded as JPEG. Returns (data, fmt, mime_type, quality_used).
+    """
+    fmt = (fmt or 'jpeg').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f"Unsupported thumbnail format '{fmt}'")
+    quality = max(MIN_THUMBNAIL_QUALITY, min(100, int(quality)))
+
+    pil_format, mime_type = THUMBNAIL_FORMATS[fmt]
+    data = _encode_image(thumbnail_image, pil_format, quality)
+    if not max_bytes or len(data) <= max_bytes:
+        return data, fmt, mime_type, quality if fmt != 'png' else None
+
+    if fmt == 'png':
+        return encode_thumbnail(thumbnail_image, 'jpeg', quality, max_bytes)
+
+    # Highest quality that fits; fall back to the minimum if nothing does
+    best = None
+    low, high = MIN_THUMBNAIL_QUALITY, quality - 1
+    while low <= high:
+        candidate_quality = (low + high) // 2
+        candidate = _encode_image(thumbnail_image, pil_format, candidate_quality)
+        if len(candidate) <= max_bytes:
+            best = (candidate, candidate_quality)
+            low = candidate_quality + 1
+        else:
+            high = candidate_quality - 1
+
+    if best is None:
+        best = (_encode_image(thumbnail_image, pil_format, MIN_THUMBNAIL_QUALITY), MIN_THUMBNAIL_QUALITY)
+    return best[0], fmt, mime_type, best[1]
+
+def resize_thumbnail_variants(thumbnail_image, size_names):
+    """Downscale one full-size render into the named THUMBNAIL_SIZES"""
+    variants = {}
+    for name in size_names:
+        if name not in THUMBNAIL_SIZES:
+            raise ValueError(f"Unknown thumbnail size '{name}'")
+        size = THUMBNAIL_SIZES[name]
+        if thumbnail_image.size == size:
+            variants[name] = thumbnail_image
+        else:
+            variants[name] = thumbnail_image.resize(size, Image.Resampling.LANCZOS)
+    return variants
+
+def thumbnail_to_base64(thumbnail_image, fmt='png', quality=90, max_bytes=None):
+    """Convert PIL Image to base64 string for web display"""
+    try:
+        data = encode_thumbnail(thumbnail_image, fmt, quality, max_bytes)[0]
+        return base64.b64encode(data).decode()
+    except Exception as e:
+        print(f"Error converting thumbnail to base64: {str(e)}")
+        return None
+
+# Memoized helpers whose hit rates are exported as metrics (merged into utils.MEMO_CACHES)
+THUMBNAIL_MEMO_CACHES = {
+    'font': get_font,
+    'text_layout': fit_text_layout,
+    'background': _cached_background
+}
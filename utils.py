@@ -3,16 +3,21 @@ from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize, sent_tokenize
 import random
 import speech_recognition as sr
-from pydub import AudioSegment
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
+from googleapiclient.http import MediaFileUpload
 from google.oauth2.credentials import Credentials
 import os
 import cv2
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-import io
-import base64
+from PIL import Image
+import heapq
+import json
+import functools
+from audio_stream import iter_pcm_blocks, SAMPLE_RATE, SAMPLE_WIDTH
+from metrics import timed, record_error
+from singleflight import coalesce
+from thumbnails import THUMBNAIL_MEMO_CACHES
 
 # Download required NLTK data
 try:
@@ -24,6 +29,43 @@ try:
 except Exception as e:
     print(f"Error downloading NLTK data: {str(e)}")
 
+@functools.lru_cache(maxsize=None)
+def get_stop_words():
+    """English stop words, loaded from the corpus once per process"""
+    return frozenset(stopwords.words('english'))
+
+@functools.lru_cache(maxsize=32)
+@coalesce('tokenize')
+@timed('tokenize')
+def tokenize_words(text, lowercase=False):
+    """Word tokens of `text`, memoized so every analysis of the same text tokenizes it once"""
+    return tuple(word_tokenize(text.lower() if lowercase else text))
+
+@functools.lru_cache(maxsize=32)
+@coalesce('pos_tag')
+@timed('pos_tag')
+def pos_tag_words(text):
+    """Part-of-speech tags for the word tokens of `text`, memoized like tokenize_words()"""
+    return tuple(nltk.pos_tag(list(tokenize_words(text))))
+
+def warm_nlp_models():
+    """Load NLTK corpora, tokenizers and the POS tagger into memory.
+
+    Called in the server's master process before workers are forked, so every
+    worker shares the loaded models copy-on-write instead of loading its own.
+    """
+    try:
+        get_stop_words()
+        sent_tokenize("Warm up the sentence tokenizer. It loads Punkt parameters.")
+        tokens = word_tokenize("Warm up the word tokenizer and the tagger")
+        nltk.pos_tag(tokens)
+        return True
+    except Exception as e:
+        print(f"Error preloading NLP models: {str(e)}")
+        return False
+
+@coalesce('generate_title')
+@timed('title_generation')
 def generate_title(content, title_options=None):
     """Generate compelling YouTube-optimized titles with multiple variations for maximum engagement"""
     try:
@@ -166,6 +208,7 @@ def generate_title(content, title_options=None):
         
     except Exception as e:
         print(f"Error generating title: {str(e)}")
+        record_error('title_generation')
         return {
             'titles': ["Amazing Content You Need to See"],
             'analysis': {'error': str(e)},
@@ -355,11 +398,11 @@ def analyze_content_for_title_generation(content):
     """Analyze content specifically for title generation"""
     try:
         # Tokenize and process
-        words = word_tokenize(content.lower())
+        words = tokenize_words(content, lowercase=True)
         sentences = sent_tokenize(content)
         
         # Remove stop words and extract keywords
-        stop_words = set(stopwords.words('english'))
+        stop_words = get_stop_words()
         filtered_words = [word for word in words if word.isalnum() and word not in stop_words and len(word) > 2]
         
         # Get word frequency
@@ -370,7 +413,8 @@ def analyze_content_for_title_generation(content):
         entities = extract_named_entities(content)
         
         # Determine primary topic
-        primary_topic = categorize_content(content)[0] if categorize_content(content) else 'general'
+        topics = categorize_content(content)
+        primary_topic = topics[0] if topics else 'general'
         
         # Content metrics
         word_count = len(words)
@@ -388,6 +432,7 @@ def analyze_content_for_title_generation(content):
         }
         
     except Exception as e:
+        record_error('title_generation')
         return {
             'keywords': [],
             'entities': [],
@@ -435,83 +480,152 @@ def generate_title_recommendations(analysis, titles):
         return recommendations[:4]  # Return top 4 recommendations
         
     except Exception as e:
+        record_error('title_generation')
         return [f"Error generating recommendations: {str(e)}"]
 
-def transcribe_audio(audio_file, language='en-US', enable_confidence=True):
-    """Enhanced audio transcription with confidence scores and language support"""
+# Seconds of 16 kHz mono PCM held in memory at a time by the streaming audio stages
+AUDIO_BLOCK_SECONDS = 30
+# Loudness reported for digital silence: below the quietest non-silent 16-bit signal
+# (about -96 dBFS), and unlike -inf it is valid JSON
+SILENCE_DBFS = -120.0
+
+class PCMMeter:
+    """Running duration and loudness of a stream of 16 kHz mono s16le PCM blocks"""
+
+    def __init__(self):
+        self.total_samples = 0
+        self.sum_squares = 0.0
+
+    def add(self, block):
+        samples = np.frombuffer(block, dtype=np.int16).astype(np.float64)
+        self.total_samples += samples.size
+        self.sum_squares += float(np.dot(samples, samples))
+
+    def duration_seconds(self):
+        return self.total_samples / SAMPLE_RATE
+
+    def features(self, stream_info, source=None):
+        """Feature dict in the shape returned by extract_audio_features"""
+        duration = self.duration_seconds()
+        sample_rate = stream_info.get('sample_rate') or SAMPLE_RATE
+        channels = stream_info.get('channels') or 1
+        rms = np.sqrt(self.sum_squares / self.total_samples) if self.total_samples else 0.0
+
+        name = getattr(source, 'filename', None) or (source if isinstance(source, str) else '')
+        return {
+            'duration_seconds': duration,
+            'sample_rate': sample_rate,
+            'channels': channels,
+            'format': name.split('.')[-1] if '.' in name else 'unknown',
+            # Size of the decoded 16-bit PCM at the source rate and channel count
+            'file_size_mb': duration * sample_rate * channels * SAMPLE_WIDTH / (1024 * 1024),
+            'average_loudness': max(SILENCE_DBFS, float(20 * np.log10(rms / 32768.0))) if rms > 0 else SILENCE_DBFS
+        }
+
+@timed('recognition')
+def recognize_with_confidence(recognizer, audio_data, language='en-US', enable_confidence=True):
+    """Run Google recognition on AudioData and return (text, confidence); ('', 0.0) if nothing was recognised"""
     try:
-        # Convert audio to appropriate format
-        audio = AudioSegment.from_file(audio_file)
-        
-        # Normalize audio (improve quality)
-        audio = audio.set_frame_rate(16000)
-        audio = audio.set_channels(1)
+        # Primary transcription with Google
+        transcription = recognizer.recognize_google(
+            audio_data, 
+            language=language,
+            show_all=enable_confidence
+        )
         
-        # Export to temporary file
-        temp_file = "temp_audio.wav"
-        audio.export(temp_file, format="wav")
+        if enable_confidence and isinstance(transcription, dict):
+            # Extract best alternative
+            if 'alternative' in transcription and transcription['alternative']:
+                best_result = transcription['alternative'][0]
+                return best_result.get('transcript', ''), best_result.get('confidence', 0.0)
+            return '', 0.0
+        
+        transcription_text = transcription if isinstance(transcription, str) else ''
+        return transcription_text, 0.85 if transcription_text else 0.0  # Default confidence for simple mode
+        
+    except sr.UnknownValueError:
+        return '', 0.0
+    except sr.RequestError as e:
+        print(f"Google Speech Recognition service error: {e}")
+        record_error('recognition')
+        return '', 0.0
 
+@timed('transcription')
+def transcribe_stream(source, language='en-US', enable_confidence=True, block_seconds=AUDIO_BLOCK_SECONDS, audio_features=None, progress_callback=None):
+    """Transcribe the audio track of any audio or video source while it is being decoded.
+
+    The audio is demuxed and resampled to 16 kHz mono by an ffmpeg pipe and recognised
+    block by block, so recognition of early audio starts before the whole track is decoded
+    and no intermediate file is written. If `audio_features` is a dict it is filled with
+    the same features as extract_audio_features, measured from the same stream.
+
+    `progress_callback(fraction, text)` is called after each block with the fraction of
+    the track processed (None if the duration is unknown) and that block's transcript.
+    """
+    try:
+        # No adjust_for_ambient_noise: its energy threshold only drives listen()'s voice
+        # detection, which recognition of whole blocks never uses, and calibrating on a
+        # file consumes (drops) its first second of speech
         recognizer = sr.Recognizer()
-        recognizer.energy_threshold = 300
-        recognizer.dynamic_energy_threshold = True
-        recognizer.pause_threshold = 0.8
-        
-        transcription_data = {}
-        
-        with sr.AudioFile(temp_file) as source:
-            # Adjust for ambient noise
-            recognizer.adjust_for_ambient_noise(source, duration=1)
-            audio_data = recognizer.record(source)
-            
-            try:
-                # Primary transcription with Google
-                transcription = recognizer.recognize_google(
-                    audio_data, 
-                    language=language,
-                    show_all=enable_confidence
-                )
-                
-                if enable_confidence and isinstance(transcription, dict):
-                    # Extract best alternative
-                    if 'alternative' in transcription and transcription['alternative']:
-                        best_result = transcription['alternative'][0]
-                        transcription_text = best_result.get('transcript', '')
-                        confidence = best_result.get('confidence', 0.0)
-                    else:
-                        transcription_text = ''
-                        confidence = 0.0
-                else:
-                    transcription_text = transcription if isinstance(transcription, str) else ''
-                    confidence = 0.85  # Default confidence for simple mode
-                
-            except sr.UnknownValueError:
-                transcription_text = ''
-                confidence = 0.0
-            except sr.RequestError as e:
-                print(f"Google Speech Recognition service error: {e}")
-                transcription_text = ''
-                confidence = 0.0
-        
-        # Clean up temp file
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-        
+        texts = []
+        confidences = []
+        meter = PCMMeter()
+        stream_info = {}
+
+        for block in iter_pcm_blocks(source, block_seconds, stream_info=stream_info):
+            meter.add(block)
+
+            audio_data = sr.AudioData(block, SAMPLE_RATE, SAMPLE_WIDTH)
+            text, confidence = recognize_with_confidence(recognizer, audio_data, language, enable_confidence)
+            if text:
+                texts.append(text)
+                confidences.append(confidence)
+
+            if progress_callback:
+                duration = stream_info.get('duration')
+                fraction = min(1.0, meter.duration_seconds() / duration) if duration else None
+                progress_callback(fraction, text)
+
+        duration_seconds = meter.duration_seconds()
+        if audio_features is not None:
+            audio_features.update(meter.features(stream_info, source))
+
+        transcription_text = " ".join(texts)
         if not transcription_text:
-            return "Unable to transcribe audio - no speech detected", "No summary available", 0.0
-        
-        # Generate intelligent summary
+            return "Unable to transcribe audio - no speech detected", "No summary available", 0.0, 0, duration_seconds
+
         summary = generate_intelligent_summary(transcription_text)
-        
-        # Extract metadata
-        word_count = len(transcription_text.split())
-        duration_seconds = len(audio) / 1000.0
-        
-        return transcription_text, summary, confidence, word_count, duration_seconds
-        
+        confidence = sum(confidences) / len(confidences)
+        return transcription_text, summary, confidence, len(transcription_text.split()), duration_seconds
+
     except Exception as e:
-        print(f"Error transcribing audio: {str(e)}")
+        print(f"Error transcribing stream: {str(e)}")
+        record_error('transcription')
         return "Unable to transcribe audio", "No summary available", 0.0, 0, 0
 
+@timed('language_detection')
+def detect_language_from_stream(source, sample_seconds=AUDIO_BLOCK_SECONDS):
+    """Detect the spoken language from the first `sample_seconds` of any audio or video source"""
+    try:
+        blocks = iter_pcm_blocks(source, sample_seconds)
+        block = next(blocks, None)
+        blocks.close()
+        if not block:
+            return 'en-US'
+        return detect_language_from_audio_data(sr.Recognizer(), sr.AudioData(block, SAMPLE_RATE, SAMPLE_WIDTH))
+    except Exception as e:
+        print(f"Error detecting language: {str(e)}")
+        record_error('language_detection')
+        return 'en-US'
+
+def transcribe_audio(audio_file, language='en-US', enable_confidence=True):
+    """Enhanced audio transcription with confidence scores and language support.
+
+    The file is decoded by a streaming ffmpeg pipe, so memory stays bounded by one
+    block of 16 kHz mono PCM regardless of the file's length, rate or channel count.
+    """
+    return transcribe_stream(audio_file, language=language, enable_confidence=enable_confidence)
+
 def generate_intelligent_summary(text, max_sentences=3):
     """Generate an intelligent summary using sentence scoring"""
     try:
@@ -525,8 +639,8 @@ def generate_intelligent_summary(text, max_sentences=3):
             return text
         
         # Calculate sentence scores
-        words = word_tokenize(text.lower())
-        stop_words = set(stopwords.words('english'))
+        words = tokenize_words(text, lowercase=True)
+        stop_words = get_stop_words()
         word_freq = {}
         
         # Calculate word frequencies
@@ -563,61 +677,46 @@ def generate_intelligent_summary(text, max_sentences=3):
         
     except Exception as e:
         print(f"Error generating summary: {str(e)}")
+        record_error('summarization')
         # Fallback to simple truncation
         words = text.split()
         return " ".join(words[:50]) + "..." if len(words) > 50 else text
 
 def detect_language_from_audio(audio_file):
     """Attempt to detect language from audio content"""
-    try:
-        audio = AudioSegment.from_file(audio_file)
-        temp_file = "temp_lang_detect.wav"
-        audio.export(temp_file, format="wav")
-        
-        recognizer = sr.Recognizer()
-        
-        # Try multiple languages
-        languages = ['en-US', 'es-ES', 'fr-FR', 'de-DE', 'it-IT', 'pt-BR', 'ja-JP', 'ko-KR', 'zh-CN']
-        
-        with sr.AudioFile(temp_file) as source:
-            audio_data = recognizer.record(source)
-            
-            for lang in languages:
-                try:
-                    result = recognizer.recognize_google(audio_data, language=lang)
-                    if result and len(result) > 10:  # Reasonable transcription length
-                        os.remove(temp_file)
-                        return lang
-                except:
-                    continue
-        
-        os.remove(temp_file)
-        return 'en-US'  # Default fallback
-        
-    except Exception as e:
-        print(f"Error detecting language: {str(e)}")
-        return 'en-US'
+    return detect_language_from_stream(audio_file)
+
+def detect_language_from_audio_data(recognizer, audio_data):
+    """Try recognition in several languages and return the first that yields a reasonable transcript"""
+    # Try multiple languages
+    languages = ['en-US', 'es-ES', 'fr-FR', 'de-DE', 'it-IT', 'pt-BR', 'ja-JP', 'ko-KR', 'zh-CN']
+    
+    for lang in languages:
+        try:
+            result = recognizer.recognize_google(audio_data, language=lang)
+            if result and len(result) > 10:  # Reasonable transcription length
+                return lang
+        except:
+            continue
+    
+    return 'en-US'  # Default fallback
 
 def extract_audio_features(audio_file):
-    """Extract basic audio features for analysis"""
+    """Extract basic audio features for analysis in one streaming pass with bounded memory"""
     try:
-        audio = AudioSegment.from_file(audio_file)
-        
-        features = {
-            'duration_seconds': len(audio) / 1000.0,
-            'sample_rate': audio.frame_rate,
-            'channels': audio.channels,
-            'format': audio_file.filename.split('.')[-1] if hasattr(audio_file, 'filename') else 'unknown',
-            'file_size_mb': len(audio.raw_data) / (1024 * 1024),
-            'average_loudness': audio.dBFS
-        }
+        meter = PCMMeter()
+        stream_info = {}
+        for block in iter_pcm_blocks(audio_file, AUDIO_BLOCK_SECONDS, stream_info=stream_info):
+            meter.add(block)
         
-        return features
+        return meter.features(stream_info, audio_file)
         
     except Exception as e:
         print(f"Error extracting audio features: {str(e)}")
         return {}
 
+@coalesce('enhance_description')
+@timed('description_generation')
 def enhance_description(content, video_content, enhancement_options=None):
     """Enhanced description generation with SEO optimization and structure"""
     try:
@@ -672,8 +771,11 @@ def enhance_description(content, video_content, enhancement_options=None):
         
     except Exception as e:
         print(f"Error enhancing description: {str(e)}")
+        record_error('description_generation')
         return content
 
+@coalesce('extract_advanced_keywords')
+@timed('keyword_extraction')
 def extract_advanced_keywords(text, max_keywords=10):
     """Extract keywords using advanced NLP techniques"""
     try:
@@ -681,8 +783,8 @@ def extract_advanced_keywords(text, max_keywords=10):
             return []
         
         # Tokenize and clean
-        words = word_tokenize(text.lower())
-        stop_words = set(stopwords.words('english'))
+        words = tokenize_words(text, lowercase=True)
+        stop_words = get_stop_words()
         
         # Filter meaningful words
         meaningful_words = []
@@ -708,8 +810,11 @@ def extract_advanced_keywords(text, max_keywords=10):
         
     except Exception as e:
         print(f"Error extracting advanced keywords: {str(e)}")
+        record_error('keyword_extraction')
         return []
 
+@coalesce('extract_named_entities')
+@timed('entity_extraction')
 def extract_named_entities(text):
     """Extract named entities like people, organizations, locations"""
     try:
@@ -717,8 +822,7 @@ def extract_named_entities(text):
             return []
         
         # Use NLTK's named entity recognition
-        tokens = word_tokenize(text)
-        pos_tags = nltk.pos_tag(tokens)
+        pos_tags = pos_tag_words(text)
         
         # Extract proper nouns as potential entities
         entities = []
@@ -732,8 +836,10 @@ def extract_named_entities(text):
         
     except Exception as e:
         print(f"Error extracting named entities: {str(e)}")
+        record_error('entity_extraction')
         return []
 
+@coalesce('categorize_content')
 def categorize_content(text):
     """Categorize content into topics"""
     try:
@@ -764,6 +870,7 @@ def categorize_content(text):
         
     except Exception as e:
         print(f"Error categorizing content: {str(e)}")
+        record_error('categorization')
         return []
 
 def generate_seo_content(keywords, topics, category):
@@ -801,6 +908,7 @@ def generate_seo_content(keywords, topics, category):
         
     except Exception as e:
         print(f"Error generating SEO content: {str(e)}")
+        record_error('description_generation')
         return ""
 
 def generate_structured_content(video_content, keywords, topics):
@@ -828,6 +936,7 @@ def generate_structured_content(video_content, keywords, topics):
         
     except Exception as e:
         print(f"Error generating structured content: {str(e)}")
+        record_error('description_generation')
         return ""
 
 def generate_call_to_action(target_audience='general'):
@@ -856,6 +965,7 @@ def generate_call_to_action(target_audience='general'):
         
     except Exception as e:
         print(f"Error generating call-to-action: {str(e)}")
+        record_error('description_generation')
         return "👍 Like, subscribe, and share if you found this helpful!"
 
 def generate_relevant_hashtags(keywords, topics, category, max_hashtags=10):
@@ -896,6 +1006,7 @@ def generate_relevant_hashtags(keywords, topics, category, max_hashtags=10):
         
     except Exception as e:
         print(f"Error generating hashtags: {str(e)}")
+        record_error('description_generation')
         return "#Content #Video #YouTube"
 
 def generate_social_media_section():
@@ -912,6 +1023,7 @@ def generate_social_media_section():
         
     except Exception as e:
         print(f"Error generating social media section: {str(e)}")
+        record_error('description_generation')
         return "📱 Follow us on social media for more content!"
 
 def generate_additional_text(video_content):
@@ -923,12 +1035,15 @@ def generate_additional_text(video_content):
         return f"This video covers topics such as: {', '.join(keywords[:5])}. Learn more about these topics in our other videos!"
     except Exception as e:
         print(f"Error generating additional text: {str(e)}")
+        record_error('description_generation')
         return ""
 
 def extract_keywords(text):
     """Legacy function for backward compatibility"""
     return extract_advanced_keywords(text, max_keywords=5)
 
+@coalesce('assign_playlist')
+@timed('playlist_assignment')
 def assign_playlist(transcription, options=None):
     """Enhanced playlist assignment with SEO optimization and content analysis"""
     try:
@@ -1053,8 +1168,10 @@ def assign_playlist(transcription, options=None):
         
     except Exception as e:
         print(f"Error in enhanced playlist assignment: {str(e)}")
+        record_error('playlist_assignment')
         return generate_error_playlist_assignment(str(e))
 
+@coalesce('analyze_content_for_playlists')
 def analyze_content_for_playlists(content):
     """Analyze content specifically for playlist assignment"""
     try:
@@ -1077,6 +1194,7 @@ def analyze_content_for_playlists(content):
         }
     except Exception as e:
         print(f"Error analyzing content for playlists: {str(e)}")
+        record_error('playlist_assignment')
         return {"keywords": [], "entities": [], "topics": ["general"], "word_count": 0, "complexity_score": 0, "primary_topic": "general"}
 
 def calculate_topic_relevance(content_analysis, playlist_keywords):
@@ -1099,6 +1217,7 @@ def calculate_topic_relevance(content_analysis, playlist_keywords):
         return relevance_score
     except Exception as e:
         print(f"Error calculating topic relevance: {str(e)}")
+        record_error('playlist_assignment')
         return 0
 
 def calculate_content_complexity(content):
@@ -1116,6 +1235,7 @@ def calculate_content_complexity(content):
         return min(complexity / 10, 1)  # Normalize to 0-1
     except Exception as e:
         print(f"Error calculating content complexity: {str(e)}")
+        record_error('playlist_assignment')
         return 0
 
 def generate_playlist_seo_insights(playlist_scores, best_playlist):
@@ -1143,6 +1263,7 @@ def generate_playlist_seo_insights(playlist_scores, best_playlist):
         return " • ".join(insights)
     except Exception as e:
         print(f"Error generating playlist SEO insights: {str(e)}")
+        record_error('playlist_assignment')
         return "📈 Basic playlist assignment completed"
 
 def generate_playlist_recommendations(playlist_scores, best_playlist, confidence):
@@ -1170,6 +1291,7 @@ def generate_playlist_recommendations(playlist_scores, best_playlist, confidence
         return recommendations
     except Exception as e:
         print(f"Error generating playlist recommendations: {str(e)}")
+        record_error('playlist_assignment')
         return ["📋 Standard playlist assignment completed"]
 
 def generate_default_playlist_assignment(content):
@@ -1197,6 +1319,7 @@ def generate_default_playlist_assignment(content):
         }
     except Exception as e:
         print(f"Error generating default playlist assignment: {str(e)}")
+        record_error('playlist_assignment')
         return {"error": "Could not generate playlist assignment"}
 
 def generate_error_playlist_assignment(error_message):
@@ -1210,19 +1333,8 @@ def generate_error_playlist_assignment(error_message):
         "recommendations": ["🔧 Check content format", "📞 Contact support if issue persists"]
     }
 
-def generate_hierarchical_number(video_type, parent_number=None):
-    try:
-        if video_type == "main":
-            return f"{random.randint(1, 999):03d}"
-        elif video_type == "follow_up":
-            main_number, *_ = parent_number.split('.')
-            return f"{main_number}.{random.randint(1, 99):02d}"
-        elif video_type == "clarification":
-            main_number, sub_number = parent_number.split('.')
-            return f"{main_number}.{sub_number}{chr(random.randint(65, 90))}"
-    except Exception as e:
-        print(f"Error generating hierarchical number: {str(e)}")
-        return "000"
+# Resumable upload chunk size; must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
 
 def get_authenticated_service():
     try:
@@ -1237,7 +1349,9 @@ def get_authenticated_service():
         print(f"Error getting authenticated service: {str(e)}")
         return None
 
-def upload_video(title, description, tags, category_id, privacy_status, file_path):
+@timed('upload')
+def upload_video(title, description, tags, category_id, privacy_status, file_path, progress_callback=None):
+    """Upload a video with a resumable, chunked request, reporting progress as a 0-1 fraction"""
     try:
         youtube = get_authenticated_service()
         
@@ -1253,16 +1367,26 @@ def upload_video(title, description, tags, category_id, privacy_status, file_pat
             }
         }
 
-        response = youtube.videos().insert(
+        media = MediaFileUpload(file_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+        insert_request = youtube.videos().insert(
             part='snippet,status',
             body=request_body,
-            media_body=file_path
-        ).execute()
+            media_body=media
+        )
+
+        response = None
+        while response is None:
+            status, response = insert_request.next_chunk()
+            if status and progress_callback:
+                progress_callback(status.progress())
+
         return response['id']
     except Exception as e:
         print(f"An error occurred while uploading video: {e}")
+        record_error('upload')
         return None
 
+@timed('frame_decode')
 def extract_video_frame(video_file_path, timestamp=None):
     """Extract a frame from video at specified timestamp (in seconds)"""
     try:
@@ -1286,133 +1410,354 @@ def extract_video_frame(video_file_path, timestamp=None):
             raise Exception("Unable to extract frame from video")
     except Exception as e:
         print(f"Error extracting video frame: {str(e)}")
+        record_error('frame_decode')
         return None
 
-def create_thumbnail_from_frame(frame, title="", width=1280, height=720):
-    """Create a YouTube thumbnail from a video frame"""
+def score_frame_quality(frame, analysis_width=320):
+    """Score an RGB frame for thumbnail suitability using sharpness, exposure and colorfulness.
+
+    All metrics are computed on a downscaled copy so scoring cost does not grow with resolution.
+    """
+    height, width = frame.shape[:2]
+    if width > analysis_width:
+        scaled_height = max(1, int(height * analysis_width / width))
+        small = cv2.resize(frame, (analysis_width, scaled_height), interpolation=cv2.INTER_AREA)
+    else:
+        small = frame
+
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+    # Sharpness: variance of the Laplacian, squashed into 0-1
+    laplacian_var = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    sharpness = laplacian_var / (laplacian_var + 100.0)
+
+    # Exposure: prefer mid-tone brightness and penalise clipped shadows/highlights
+    mean_brightness = float(gray.mean()) / 255.0
+    clipped = float(np.count_nonzero((gray < 10) | (gray > 245))) / gray.size
+    exposure = max(0.0, 1.0 - abs(mean_brightness - 0.5) * 2.0 - clipped)
+
+    # Colorfulness (Hasler & Suesstrunk), squashed into 0-1
+    rgb = small.astype(np.float32)
+    rg = rgb[:, :, 0] - rgb[:, :, 1]
+    yb = 0.5 * (rgb[:, :, 0] + rgb[:, :, 1]) - rgb[:, :, 2]
+    colorfulness_raw = float(np.sqrt(rg.std() ** 2 + yb.std() ** 2) + 0.3 * np.sqrt(rg.mean() ** 2 + yb.mean() ** 2))
+    colorfulness = min(1.0, colorfulness_raw / 100.0)
+
+    score = 0.5 * sharpness + 0.3 * exposure + 0.2 * colorfulness
+
+    return {
+        'score': round(score, 4),
+        'sharpness': round(sharpness, 4),
+        'exposure': round(exposure, 4),
+        'colorfulness': round(colorfulness, 4)
+    }
+
+# Stored videos are named by content hash, so the path identifies the video
+@coalesce('select_best_frames')
+@timed('frame_decode')
+def select_best_frames(video_file_path, num_candidates=24, top_k=3):
+    """Sample candidate frames in one forward pass and return the top-k by quality score.
+
+    Frames between candidates are skipped with grab() so they are never converted or copied.
+    Only the current top-k frames are kept in memory. Returns a list of dicts with
+    'frame' (RGB array), 'timestamp', 'frame_index' and the quality metrics, best first.
+    """
+    cap = None
     try:
-        # Convert numpy array to PIL Image
-        pil_image = Image.fromarray(frame)
-        
-        # Resize to YouTube thumbnail dimensions
-        pil_image = pil_image.resize((width, height), Image.Resampling.LANCZOS)
-        
-        # Create overlay for title
-        if title:
-            overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay)
-            
-            # Try to use a bold font, fallback to default
-            try:
-                font_size = min(width // 20, 60)
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
-            
-            # Add text with shadow effect
-            text_bbox = draw.textbbox((0, 0), title, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-            
-            # Position text at bottom
-            x = (width - text_width) // 2
-            y = height - text_height - 50
-            
-            # Draw shadow
-            draw.text((x + 2, y + 2), title, font=font, fill=(0, 0, 0, 180))
-            # Draw main text
-            draw.text((x, y), title, font=font, fill=(255, 255, 255, 255))
-            
-            # Composite overlay onto image
-            pil_image = Image.alpha_composite(pil_image.convert('RGBA'), overlay)
-            pil_image = pil_image.convert('RGB')
-        
-        return pil_image
+        cap = cv2.VideoCapture(video_file_path)
+        if not cap.isOpened():
+            raise Exception("Unable to open video file")
+
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if total_frames <= 0:
+            raise Exception("Unable to determine video length")
+
+        # Evenly spaced candidates, skipping the very start and end (fades, black frames)
+        num_candidates = max(1, min(num_candidates, total_frames))
+        margin = total_frames * 0.05
+        span = total_frames - 2 * margin
+        targets = sorted({int(margin + span * (i + 0.5) / num_candidates) for i in range(num_candidates)})
+
+        best = []  # heap of (score, frame_index, candidate)
+        frame_index = 0
+        for target in targets:
+            while frame_index < target:
+                if not cap.grab():
+                    break
+                frame_index += 1
+            if frame_index < target:
+                break
+
+            ret, frame = cap.read()
+            frame_index += 1
+            if not ret:
+                break
+
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            metrics = score_frame_quality(rgb)
+            candidate = dict(metrics, frame=rgb, frame_index=target, timestamp=round(target / fps, 3))
+
+            entry = (metrics['score'], target, candidate)
+            if len(best) < top_k:
+                heapq.heappush(best, entry)
+            elif entry[0] > best[0][0]:
+                heapq.heapreplace(best, entry)
+
+        return [entry[2] for entry in sorted(best, key=lambda e: e[0], reverse=True)]
+    except Exception as e:
+        print(f"Error selecting best frames: {str(e)}")
+        record_error('frame_decode')
+        return []
+    finally:
+        if cap is not None:
+            cap.release()
+
+def iter_sampled_frames(video_file_path, interval_seconds):
+    """Yield (timestamp, RGB frame) every `interval_seconds` in one sequential decode.
+
+    Frames between samples are skipped with grab(), so no seeking or colour conversion
+    happens for them and only one frame is held in memory at a time.
+    """
+    cap = cv2.VideoCapture(video_file_path)
+    try:
+        if not cap.isOpened():
+            raise Exception("Unable to open video file")
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_index = 0
+        sample_number = 0
+        while True:
+            target = int(round(sample_number * interval_seconds * fps))
+            while frame_index < target:
+                if not cap.grab():
+                    return
+                frame_index += 1
+
+            ret, frame = cap.read()
+            if not ret:
+                return
+            frame_index += 1
+
+            yield target / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            sample_number += 1
+    finally:
+        cap.release()
+
+@timed('storyboard')
+def generate_storyboard(video_file_path, output_dir, interval_seconds=10, tile_width=160, columns=10, rows=10, quality=80, progress_callback=None):
+    """Build tiled storyboard sprite sheets from frames sampled every `interval_seconds`.
+
+    Sheets are written to `output_dir` as soon as they fill up, so memory stays bounded by
+    a single sheet regardless of video length. Returns the JSON-serialisable index with
+    per-sheet file names and the timestamp and tile position of every sampled frame.
+
+    `progress_callback(fraction, sheets)` is called after each sheet is written with the
+    fraction of the video covered so far (None if its duration is unknown).
+    """
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        cap = cv2.VideoCapture(video_file_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        cap.release()
+        tiles_per_sheet = columns * rows
+        tile_height = None
+        sheet = None
+        sheets = []
+        frames = []
+
+        def flush(count):
+            # Trim unused rows on the final, partially filled sheet
+            used_rows = (count + columns - 1) // columns
+            name = f"sheet_{len(sheets):04d}.jpg"
+            Image.fromarray(sheet[:used_rows * tile_height]).save(os.path.join(output_dir, name), format='JPEG', quality=quality)
+            sheet_frames = frames[-count:]
+            sheets.append({
+                'file': name,
+                'start': sheet_frames[0]['timestamp'],
+                'end': sheet_frames[-1]['timestamp'],
+                'count': count
+            })
+            if progress_callback:
+                progress_callback(min(1.0, sheets[-1]['end'] / duration) if duration > 0 else None, len(sheets))
+
+        count = 0
+        for timestamp, frame in iter_sampled_frames(video_file_path, interval_seconds):
+            if tile_height is None:
+                tile_height = max(1, int(round(frame.shape[0] * tile_width / frame.shape[1])))
+            if sheet is None:
+                sheet = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+
+            row, column = divmod(count, columns)
+            tile = cv2.resize(frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA)
+            sheet[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width] = tile
+            frames.append({
+                'timestamp': round(timestamp, 3),
+                'sheet': len(sheets),
+                'x': column * tile_width,
+                'y': row * tile_height
+            })
+
+            count += 1
+            if count == tiles_per_sheet:
+                flush(count)
+                sheet = None
+                count = 0
+
+        if count:
+            flush(count)
+
+        return {
+            'interval_seconds': interval_seconds,
+            'tile_width': tile_width,
+            'tile_height': tile_height,
+            'columns': columns,
+            'rows': rows,
+            'sheets': sheets,
+            'frames': frames
+        }
     except Exception as e:
-        print(f"Error creating thumbnail: {str(e)}")
+        print(f"Error generating storyboard: {str(e)}")
+        record_error('storyboard')
         return None
 
-def create_custom_thumbnail(title, subtitle="", template="gradient", width=1280, height=720):
-    """Create a custom thumbnail with text and background"""
+# Scene index format version; bump when detection parameters or output change
+SCENE_INDEX_VERSION = 1
+
+def hsv_histogram(frame, analysis_width=160, bins=(16, 4, 4)):
+    """Normalised joint HSV histogram of a downscaled RGB frame, computed with NumPy"""
+    height, width = frame.shape[:2]
+    if width > analysis_width:
+        scaled_height = max(1, int(height * analysis_width / width))
+        frame = cv2.resize(frame, (analysis_width, scaled_height), interpolation=cv2.INTER_AREA)
+
+    hsv = cv2.cvtColor(frame, cv2.COLOR_RGB2HSV)
+    h_bins, s_bins, v_bins = bins
+    h = (hsv[:, :, 0].astype(np.int32) * h_bins) // 180
+    s = (hsv[:, :, 1].astype(np.int32) * s_bins) // 256
+    v = (hsv[:, :, 2].astype(np.int32) * v_bins) // 256
+
+    joint = (h * s_bins + s) * v_bins + v
+    histogram = np.bincount(joint.ravel(), minlength=h_bins * s_bins * v_bins).astype(np.float32)
+    return histogram / histogram.sum()
+
+@timed('scene_detection')
+def detect_scenes(video_file_path, sample_interval=0.5, threshold=0.35):
+    """Detect scene boundaries by comparing HSV histograms of frames sampled every `sample_interval` seconds.
+
+    Runs as a single forward pass (skipped frames are only grabbed). The distance between
+    consecutive samples is the total variation distance of their histograms (0-1); a
+    boundary is recorded when it exceeds `threshold`. Each scene keeps the timestamp of
+    its best-scoring sampled frame as its representative.
+    """
+    cap = None
     try:
-        # Create base image
-        img = Image.new('RGB', (width, height), color=(30, 30, 30))
-        draw = ImageDraw.Draw(img)
-        
-        if template == "gradient":
-            # Create gradient background
-            for y in range(height):
-                r = int(30 + (200 - 30) * y / height)
-                g = int(30 + (100 - 30) * y / height)
-                b = int(30 + (200 - 30) * y / height)
-                draw.line([(0, y), (width, y)], fill=(r, g, b))
-        elif template == "solid":
-            # Solid color background
-            draw.rectangle([0, 0, width, height], fill=(64, 128, 255))
-        elif template == "pattern":
-            # Simple pattern
-            for x in range(0, width, 100):
-                for y in range(0, height, 100):
-                    if (x // 100 + y // 100) % 2:
-                        draw.rectangle([x, y, x + 100, y + 100], fill=(50, 50, 80))
-        
-        # Add title text
-        if title:
-            try:
-                title_font_size = min(width // 15, 80)
-                title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", title_font_size)
-            except:
-                title_font = ImageFont.load_default()
-            
-            # Calculate text position
-            title_bbox = draw.textbbox((0, 0), title, font=title_font)
-            title_width = title_bbox[2] - title_bbox[0]
-            title_height = title_bbox[3] - title_bbox[1]
-            
-            title_x = (width - title_width) // 2
-            title_y = height // 2 - title_height // 2
-            
-            # Draw title with shadow
-            draw.text((title_x + 3, title_y + 3), title, font=title_font, fill=(0, 0, 0, 200))
-            draw.text((title_x, title_y), title, font=title_font, fill=(255, 255, 255))
-        
-        # Add subtitle
-        if subtitle:
-            try:
-                subtitle_font_size = min(width // 25, 40)
-                subtitle_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", subtitle_font_size)
-            except:
-                subtitle_font = ImageFont.load_default()
-            
-            subtitle_bbox = draw.textbbox((0, 0), subtitle, font=subtitle_font)
-            subtitle_width = subtitle_bbox[2] - subtitle_bbox[0]
-            subtitle_height = subtitle_bbox[3] - subtitle_bbox[1]
-            
-            subtitle_x = (width - subtitle_width) // 2
-            subtitle_y = title_y + title_height + 20
-            
-            # Draw subtitle with shadow
-            draw.text((subtitle_x + 2, subtitle_y + 2), subtitle, font=subtitle_font, fill=(0, 0, 0, 150))
-            draw.text((subtitle_x, subtitle_y), subtitle, font=subtitle_font, fill=(220, 220, 220))
-        
-        return img
+        cap = cv2.VideoCapture(video_file_path)
+        if not cap.isOpened():
+            raise Exception("Unable to open video file")
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, int(round(fps * sample_interval)))
+
+        scenes = []
+        current = None
+        previous_histogram = None
+        frame_index = 0
+
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            small = cv2.resize(rgb, (160, max(1, rgb.shape[0] * 160 // rgb.shape[1])), interpolation=cv2.INTER_AREA)
+            histogram = hsv_histogram(small)
+            timestamp = frame_index / fps
+
+            distance = 1.0 if previous_histogram is None else 0.5 * float(np.abs(histogram - previous_histogram).sum())
+            previous_histogram = histogram
+
+            if current is None or distance > threshold:
+                if current is not None:
+                    scenes.append(current)
+                current = {
+                    'start': round(timestamp, 3),
+                    'start_frame': frame_index,
+                    'representative_timestamp': round(timestamp, 3),
+                    'representative_frame': frame_index,
+                    'score': -1.0
+                }
+
+            score = score_frame_quality(small)['score']
+            if score > current['score']:
+                current['score'] = score
+                current['representative_timestamp'] = round(timestamp, 3)
+                current['representative_frame'] = frame_index
+
+            current['end'] = round(timestamp + step / fps, 3)
+            current['end_frame'] = frame_index + step - 1
+
+            # Skip to the next sample without decoding frames into images
+            frame_index += 1
+            skipped = 1
+            while skipped < step and cap.grab():
+                frame_index += 1
+                skipped += 1
+
+        if current is not None:
+            scenes.append(current)
+
+        duration = total_frames / fps if total_frames > 0 else frame_index / fps
+        for number, scene in enumerate(scenes):
+            scene['index'] = number
+            scene['end'] = round(min(scene['end'], duration), 3)
+            scene['end_frame'] = min(scene['end_frame'], max(frame_index - 1, 0))
+
+        return {
+            'version': SCENE_INDEX_VERSION,
+            'fps': fps,
+            'duration_seconds': round(duration, 3),
+            'sample_interval': sample_interval,
+            'threshold': threshold,
+            'scenes': scenes
+        }
     except Exception as e:
-        print(f"Error creating custom thumbnail: {str(e)}")
+        print(f"Error detecting scenes: {str(e)}")
+        record_error('scene_detection')
         return None
+    finally:
+        if cap is not None:
+            cap.release()
 
-def thumbnail_to_base64(thumbnail_image):
-    """Convert PIL Image to base64 string for web display"""
+@coalesce('scene_index')
+def load_or_build_scene_index(video_file_path, index_path, sample_interval=0.5, threshold=0.35):
+    """Return the persisted scene index for a video, building and saving it on first use"""
     try:
-        buffer = io.BytesIO()
-        thumbnail_image.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue())
-        return img_str.decode()
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            if (index.get('version') == SCENE_INDEX_VERSION
+                    and index.get('sample_interval') == sample_interval
+                    and index.get('threshold') == threshold):
+                return index
+
+        index = detect_scenes(video_file_path, sample_interval, threshold)
+        if index is not None:
+            temp_path = index_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(temp_path, index_path)
+        return index
     except Exception as e:
-        print(f"Error converting thumbnail to base64: {str(e)}")
+        print(f"Error loading scene index: {str(e)}")
         return None
 
 # Video Tags and Category Management Functions
 
+@coalesce('generate_video_tags')
+@timed('tag_generation')
 def generate_video_tags(content, options=None):
     """Generate intelligent video tags based on content analysis"""
     if options is None:
@@ -1482,6 +1827,7 @@ def generate_video_tags(content, options=None):
         
     except Exception as e:
         print(f"Error generating tags: {str(e)}")
+        record_error('tag_generation')
         # Fallback to basic keyword extraction
         basic_keywords = extract_keywords(content)
         return {
@@ -1594,6 +1940,7 @@ def generate_tag_insights(tags, topics, entities):
     
     return ' • '.join(insights)
 
+@coalesce('suggest_youtube_category')
 def suggest_youtube_category(content, topics=None):
     """Suggest appropriate YouTube category based on content analysis"""
     if topics is None:
@@ -1671,6 +2018,7 @@ def suggest_youtube_category(content, topics=None):
         'reason': 'General content category recommended'
     }
 
+@coalesce('analyze_content_for_tags')
 def analyze_content_for_tags(content):
     """Analyze content specifically for tag generation insights"""
     try:
@@ -1699,6 +2047,7 @@ def analyze_content_for_tags(content):
         
     except Exception as e:
         print(f"Error analyzing content for tags: {str(e)}")
+        record_error('tag_generation')
         return {
             'keywords': [],
             'entities': [],
@@ -1763,4 +2112,12 @@ def determine_content_type(content):
         if any(indicator in content_lower for indicator in indicators):
             return content_type
     
-    return 'general'
\ No newline at end of file
+    return 'general'
+
+# Memoized helpers whose hit rates are exported as metrics
+MEMO_CACHES = {
+    'stop_words': get_stop_words,
+    'tokenize': tokenize_words,
+    'pos_tag': pos_tag_words,
+    **THUMBNAIL_MEMO_CACHES
+}
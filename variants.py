@@ -0,0 +1,159 @@
+"""Parallel rendering of thumbnail A/B variants.
+
+Source frames are decoded once in the parent, copied into shared memory and
+rendered by a persistent process pool; workers attach to the shared buffers
+instead of receiving pickled copies of every frame. Workers only import
+thumbnails.py, not the NLP and web modules of the server process.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAX_VARIANTS = 24
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process pool shared by all variant requests, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # gunicorn.conf.py lowers the default so all server workers' pools together fit the cores
+            max_workers = int(os.environ.get("VARIANT_WORKERS", os.cpu_count() or 2))
+            # Spawned workers do not inherit the web server's threads or open connections
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _share_frame(frame):
+    shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+    view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=shm.buf)
+    view[:] = frame
+    return shm, {'name': shm.name, 'shape': frame.shape, 'dtype': str(frame.dtype)}
+
+
+def _attach_frame(ref):
+    shm = shared_memory.SharedMemory(name=ref['name'])
+    try:
+        # The parent owns the segment; stop this process's tracker from unlinking it on exit
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm, np.ndarray(ref['shape'], dtype=np.dtype(ref['dtype']), buffer=shm.buf)
+
+
+def crop_frame(frame, crop):
+    """Crop a frame by fractional box [left, top, right, bottom] (0-1)"""
+    if not crop:
+        return frame
+    height, width = frame.shape[:2]
+    left, top, right, bottom = [min(1.0, max(0.0, float(value))) for value in crop]
+    x0, x1 = int(left * width), max(int(left * width) + 1, int(right * width))
+    y0, y1 = int(top * height), max(int(top * height) + 1, int(bottom * height))
+    return frame[y0:y1, x0:x1]
+
+
+def _render_variant(frame_ref, spec):
+    """Worker entry point: render and encode one variant from a shared frame"""
+    from thumbnails import create_custom_thumbnail, create_thumbnail_from_frame, encode_thumbnail
+
+    started = time.perf_counter()
+    shm = None
+    try:
+        frame = None
+        if frame_ref is not None:
+            shm, shared = _attach_frame(frame_ref)
+            frame = np.ascontiguousarray(crop_frame(shared, spec.get('crop')))
+
+        template = spec.get('template')
+        if template:
+            image = create_custom_thumbnail(spec.get('title', ''), spec.get('subtitle', ''), template,
+                                            template_options=spec.get('template_options'), frame=frame)
+        else:
+            image = create_thumbnail_from_frame(frame, spec.get('title', ''))
+        if image is None:
+            raise Exception("Failed to render variant")
+
+        data, fmt, mime_type, quality = encode_thumbnail(image, spec.get('format', 'jpeg'),
+                                                         spec.get('quality', 90), spec.get('max_bytes'))
+        return {
+            'data': data,
+            'format': fmt,
+            'mime_type': mime_type,
+            'quality': quality,
+            'render_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    finally:
+        if shm is not None:
+            shm.close()
+
+
+def validate_specs(specs):
+    """Raise ValueError unless `specs` is a list of at most MAX_VARIANTS variant dicts.
+
+    Cheap enough to run before any frame is decoded, so oversized or malformed requests
+    are rejected without paying for the decode.
+    """
+    if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+        raise ValueError("Variants must be a list of objects")
+    if not specs:
+        raise ValueError("At least one variant is required")
+    if len(specs) > MAX_VARIANTS:
+        raise ValueError(f"At most {MAX_VARIANTS} variants can be rendered per request")
+    for number, spec in enumerate(specs):
+        try:
+            if spec.get('scene') is not None:
+                int(spec['scene'])
+            if spec.get('timestamp') is not None:
+                float(spec['timestamp'])
+        except (TypeError, ValueError):
+            raise ValueError(f"Variant {number} has an invalid scene or timestamp")
+
+
+def render_variants(frames, specs):
+    """Render variant specs in parallel.
+
+    `frames` maps a frame key to a decoded RGB frame; each spec names its source with
+    'frame' (a key of `frames`, optional for pure template variants). Returns one result
+    dict per spec, in order, with either encoded 'data' or an 'error'.
+    """
+    validate_specs(specs)
+
+    segments = {}
+    try:
+        refs = {}
+        for key, frame in frames.items():
+            shm, ref = _share_frame(np.ascontiguousarray(frame))
+            segments[key] = shm
+            refs[key] = ref
+
+        executor = get_executor()
+        futures = []
+        for spec in specs:
+            frame_key = spec.get('frame')
+            if frame_key is not None and frame_key not in refs:
+                futures.append(None)
+                continue
+            futures.append(executor.submit(_render_variant, refs.get(frame_key), spec))
+
+        results = []
+        for spec, future in zip(specs, futures):
+            if future is None:
+                results.append({'error': f"Unknown source frame '{spec.get('frame')}'"})
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({'error': str(e)})
+        return results
+    finally:
+        for shm in segments.values():
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,14 @@
+"""WSGI entry point for the production server.
+
+Importing this module loads the Flask app and preloads the NLP models, so with
+gunicorn's preload_app the work happens once in the master and is shared by
+all forked workers. Run with:
+
+    gunicorn -c gunicorn.conf.py
+"""
+from app import app
+from utils import warm_nlp_models
+
+warm_nlp_models()
+
+application = app